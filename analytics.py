@@ -0,0 +1,103 @@
+"""
+Kick Chat Monitor - Chat Analytics
+Streaming per-room statistics in bounded memory, for /api/stats
+
+For every chat message a room updates:
+    top chatters            SpaceSaving over usernames
+    top trigger users       SpaceSaving over usernames, one per trigger
+    messages per user       CountMinSketch, for any user (not just the top ones)
+    message rate            EWMA over 1 and 5 minutes
+    messages per minute     the last hour, one bucket per minute
+
+Recording is O(1) per message and a snapshot is O(capacity), however long
+the stream has run.
+"""
+
+import threading
+import time
+
+from rolling_counters import EWMARate, RollingCounter
+from sketches import CountMinSketch, SpaceSaving
+
+RATE_WINDOWS = (('1m', 60), ('5m', 300))
+
+
+class RoomAnalytics:
+    """Sketches for one room; guarded by ChatAnalytics' lock"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.messages = 0
+        self.chatters = SpaceSaving(capacity)
+        self.trigger_users = {}  # trigger name -> SpaceSaving
+        self.per_user = CountMinSketch()
+        self.rates = [EWMARate(tau) for _, tau in RATE_WINDOWS]
+        self.per_minute = RollingCounter(60, 60)
+
+    def record(self, now, username, triggers):
+        self.messages += 1
+        self.chatters.add(username)
+        self.per_user.add(username)
+        for rate in self.rates:
+            rate.add(now)
+        self.per_minute.add(now)
+        for name in triggers:
+            users = self.trigger_users.get(name)
+            if users is None:
+                users = self.trigger_users[name] = SpaceSaving(self.capacity)
+            users.add(username)
+
+
+def _ranking(sketch, k):
+    return [{'username': key, 'count': count, 'error': error} for key, count, error in sketch.top(k)]
+
+
+class ChatAnalytics:
+    """Thread-safe analytics for any number of rooms"""
+
+    def __init__(self, capacity=1000, clock=time.time):
+        self.capacity = capacity  # Users tracked per ranking; more is more accurate
+        self.clock = clock
+        self._rooms = {}
+        self._empty = RoomAnalytics(1)  # Stands in for rooms with no messages yet
+        self._lock = threading.Lock()
+
+    def record(self, room, username, triggers=()):
+        now = self.clock()
+        with self._lock:
+            analytics = self._rooms.get(room)
+            if analytics is None:
+                analytics = self._rooms[room] = RoomAnalytics(self.capacity)
+            analytics.record(now, username, triggers)
+
+    def rooms(self):
+        return list(self._rooms)
+
+    def snapshot(self, room, k=10, user=None):
+        """Rankings, rates and the per-minute histogram for one room"""
+        now = self.clock()
+        with self._lock:
+            analytics = self._rooms.get(room, self._empty)
+            stats = {
+                'room': room,
+                'messages': analytics.messages,
+                'rate_per_second': {label: round(rate.rate(now), 3)
+                                    for (label, _), rate in zip(RATE_WINDOWS, analytics.rates)},
+                'messages_per_minute': analytics.per_minute.series(now),
+                'top_chatters': _ranking(analytics.chatters, k),
+                'top_triggers': sorted(
+                    ({'trigger': name, 'count': users.total, 'top_users': _ranking(users, k)}
+                     for name, users in analytics.trigger_users.items()),
+                    key=lambda entry: entry['count'], reverse=True
+                )
+            }
+            if user is not None:
+                stats['user'] = {'username': user, 'messages_estimate': analytics.per_user.count(user)}
+        return stats
+
+    def clear(self, room=None):
+        with self._lock:
+            if room is None:
+                self._rooms.clear()
+            else:
+                self._rooms.pop(room, None)
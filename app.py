@@ -4,305 +4,336 @@ Kick Chat Monitor - Real-Time Chat Display
 Monitors Kick.com chat via Pusher WebSocket connection
 """
 
+import gzip
+import hashlib
 import json
 import os
+import sqlite3
 import threading
+import time
+import atexit
 from datetime import datetime
-from flask import Flask, request, jsonify
-import websocket
+from flask import Flask, request, jsonify, Response, stream_with_context
+import metrics
+from pusher_client import PusherClient
+from pusher_decoder import FrameDecoder, ModerationEvent, CHAT_MESSAGE_EVENT, MESSAGE_DELETED_EVENT, USER_BANNED_EVENT
+from pathlib import Path
+from analytics import ChatAnalytics
+from chat_archive import ChatArchive, history_lines, parse_time
+from chatrooms import parse_chatrooms, shard_rooms, split_rooms
+from counter_store import CounterStore
+from rolling_counters import WindowedCounters
+from shared_state import IngestLeader, SQLiteState
+from log_config import get_logger
+from sketches import UniqueCounters
+from triggers import TriggerEngine, load_trigger_cooldowns, load_trigger_rules
+
+log = get_logger('app')
 
 app = Flask(__name__)
 
 # Pusher Configuration
 PUSHER_APP_KEY = "32cbd69e4b950bf97679"
 PUSHER_CLUSTER = "us2"
-PUSHER_WS_URL = f"wss://ws-{PUSHER_CLUSTER}.pusher.com/app/{PUSHER_APP_KEY}?protocol=7&client=js&version=8.4.0&flash=false"
+PUSHER_WS_URL = os.environ.get(
+    'PUSHER_WS_URL',
+    f"wss://ws-{PUSHER_CLUSTER}.pusher.com/app/{PUSHER_APP_KEY}?protocol=7&client=js&version=8.4.0&flash=false"
+)
 CHANNEL_NAME = "sam"
 CHATROOM_ID = 328681
+# Monitored chatrooms as "slug:chatroom_id" pairs, e.g. "sam:328681,other:12345"
+KICK_CHATROOMS = os.environ.get('KICK_CHATROOMS', f"{CHANNEL_NAME}:{CHATROOM_ID}")
+MAX_CHAT_MESSAGES = int(os.environ.get('MAX_CHAT_MESSAGES', 5000))  # Per room
+PUSHER_CONNECTIONS = int(os.environ.get('PUSHER_CONNECTIONS', 1))
+# Sharding across processes: this process only ingests its share of the rooms
+SHARD_INDEX = int(os.environ.get('KICK_SHARD_INDEX', 0))
+SHARD_COUNT = int(os.environ.get('KICK_SHARD_COUNT', 1))
+# Append every raw Pusher frame to this file (for benchmarks and replay)
+PUSHER_RECORD_FILE = os.environ.get('PUSHER_RECORD_FILE')
+# Trigger counters are persisted here (one store per shard so processes never share files)
+DATA_DIR = Path(os.environ.get('DATA_DIR', 'data'))
+# On-disk chat history per room for /api/history; oldest segments are dropped past this (0 = off)
+ARCHIVE_MAX_MB = int(os.environ.get('ARCHIVE_MAX_MB', 1024))
+# memory: every worker keeps its own state; sqlite: workers on one host share it
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'memory')
+BEEF_TRIGGER = "beef"         # Trigger counted by the OBS overlay (/api/beef-status)
+LONG_POLL_MAX_WAIT = 30       # Seconds a long-poll request may block
+SSE_HEARTBEAT_SECONDS = 15    # Keep-alive comment interval for idle streams
+HISTORY_MAX_LIMIT = 10000     # Most archived messages one /api/history request returns
+STATS_MAX_K = 100             # Longest ranking /api/stats returns
+STATS_PUBLISH_SECONDS = 2     # How often the ingest leader shares /api/stats with the other workers
+STATUS_PUBLISH_SECONDS = 0.25 # How often it checks whether /api/beef-status changed for them
+SEARCH_MAX_LIMIT = 500        # Most messages one /api/search request returns
 
-# Chat monitoring state (in-memory for simplicity)
-all_chat_messages = []
-websocket_client = None
-connection_status = "Disconnected"
+# Chat monitoring state (per-room in-memory ring buffers, oldest messages roll off)
+rooms = shard_rooms(parse_chatrooms(KICK_CHATROOMS, MAX_CHAT_MESSAGES), SHARD_INDEX, SHARD_COUNT)
+rooms_by_slug = {room.slug: room for room in rooms}
+rooms_by_channel = {room.channel: room for room in rooms}
+state_dir = DATA_DIR / (f"chat-shard-{SHARD_INDEX}" if SHARD_COUNT > 1 else "chat")
+if STATE_BACKEND == 'sqlite':
+    shared_state = SQLiteState(state_dir / 'state.db')
+    counters = shared_state.counter_store()
+    windows = shared_state.windowed_counters()
+    uniques = shared_state.unique_counters()
+    for room in rooms:
+        room.store = shared_state.message_store(room.slug, MAX_CHAT_MESSAGES)
+elif STATE_BACKEND == 'memory':
+    counters = CounterStore(state_dir).load()
+    windows = WindowedCounters()
+    uniques = UniqueCounters()
+else:
+    raise ValueError(f"Unknown STATE_BACKEND {STATE_BACKEND!r}, expected memory or sqlite")
+chat_archive = ChatArchive(state_dir / 'archive', max_bytes=ARCHIVE_MAX_MB * 1024 * 1024) if ARCHIVE_MAX_MB > 0 else None
+for room in rooms:
+    room.counters = counters
+    room.windows = windows
+    room.uniques = uniques
 
-def on_pusher_message(ws, message):
-    """Handle incoming Pusher WebSocket messages"""
-    global all_chat_messages, connection_status
-    
-    try:
-        # Parse Pusher message
-        data = json.loads(message)
-        print(f"📨 Raw Pusher event: {data.get('event')}")  # Debug logging
-        
-        # Handle different Pusher event types
-        if data.get('event') == 'pusher:connection_established':
-            connection_data = json.loads(data.get('data', '{}'))
-            connection_status = "✅ Connected to Pusher"
-            print(f"🔌 Connected to Pusher! Socket ID: {connection_data.get('socket_id', 'unknown')}")
-            
-            # Subscribe to the chatroom channel
-            subscribe_msg = {
-                "event": "pusher:subscribe",
-                "data": {
-                    "channel": f"chatrooms.{CHATROOM_ID}.v2"
-                }
-            }
-            ws.send(json.dumps(subscribe_msg))
-            print(f"📡 Subscribing to channel: chatrooms.{CHATROOM_ID}.v2")
-            
-        elif data.get('event') == 'pusher:subscription_succeeded':
-            print(f"✅ Subscribed to channel: {data.get('channel')}")
-            connection_status = f"✅ Subscribed to chatrooms.{CHATROOM_ID}.v2"
-            
-        elif data.get('event') == 'App\\Events\\ChatMessageEvent':
-            # This is a chat message!
-            print(f"📨 Received chat message event")
-            message_data = json.loads(data.get('data', '{}'))
-            
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            
-            # Extract message info using your provided format
-            message_content = message_data.get('content', '')
-            username = message_data.get('sender', {}).get('username', 'Unknown')
-            user_id = message_data.get('sender', {}).get('id', 0)
-            message_id = message_data.get('id', '')
-            
-            # Store the message
-            chat_entry = {
-                'timestamp': timestamp,
-                'username': username,
-                'message': message_content,
-                'message_id': message_id,
-                'user_id': user_id
-            }
-            
-            all_chat_messages.append(chat_entry)
-            
-            print(f"💬 {username}: {message_content}")
+# Pusher events we decode; everything else is dropped before JSON parsing
+PUSHER_EVENTS = {CHAT_MESSAGE_EVENT, MESSAGE_DELETED_EVENT, USER_BANNED_EVENT}
+chat_decoder = FrameDecoder(PUSHER_EVENTS)
+trigger_engine = TriggerEngine(load_trigger_rules())
+trigger_cooldowns = load_trigger_cooldowns()
+analytics = ChatAnalytics()  # Top chatters, rates etc. for /api/stats (this process's ingest only)
+
+# Hot-path instrumentation served at /metrics (unlabelled series are bound once)
+parse_seconds = metrics.histogram('kick_ingest_parse_seconds', "Time to parse one Pusher event into a chat message").labels()
+trigger_seconds = metrics.histogram('kick_trigger_check_seconds', "Time to match one message against the triggers").labels()
+store_seconds = metrics.histogram('kick_ingest_store_seconds', "Time to store one chat message and count its triggers").labels()
+messages_total = metrics.counter('kick_chat_messages_total', "Chat messages stored by this process", ('room',))
+messages_removed = metrics.counter('kick_chat_messages_removed_total', "Stored messages removed by moderation events",
+                                   ('room', 'event'))
+
+@parse_seconds.time
+def on_pusher_message(event, channel, data):
+    """
+    Parse one Pusher event into a chat message
+
+    Runs on the ingest thread's parse stage; returns the record to store
+    (a ChatMessage, or a ModerationEvent to apply) or None for events we
+    don't keep.
+    """
+    if event == CHAT_MESSAGE_EVENT:
+        room = rooms_by_channel.get(channel)
+        if room is None:
+            return None
         
-        else:
-            # Log other events for debugging
-            print(f"📨 Pusher event: {data.get('event')} on channel {data.get('channel')}")
-            
-    except Exception as e:
-        print(f"❌ Error parsing Pusher message: {e}")
-        print(f"❌ Raw message: {message}")
-
-def on_pusher_error(ws, error):
-    """Handle Pusher WebSocket errors"""
-    global connection_status
-    connection_status = f"❌ Error: {str(error)}"
-    print(f"❌ Pusher WebSocket error: {error}")
-
-def on_pusher_close(ws, close_status_code, close_msg):
-    """Handle Pusher WebSocket close"""
-    global connection_status
-    connection_status = "❌ Disconnected"
-    print(f"🔌 Pusher WebSocket closed: {close_status_code} - {close_msg}")
-
-def on_pusher_open(ws):
-    """Handle Pusher WebSocket open"""
-    global connection_status
-    connection_status = "🔌 Connected, waiting for auth"
-    print("🔌 Pusher WebSocket opened!")
+        # This is a chat message!
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        msg = chat_decoder.decode_chat(data, timestamp, room.slug)
+        start = time.perf_counter()
+        fired = trigger_engine.match(msg.message, room.slug)
+        # Only hits that get past the cooldown are counted (and recorded on the message)
+        msg.triggers = tuple(trigger_cooldowns.filter(fired, msg.user_id, room.slug))
+        trigger_seconds.observe(time.perf_counter() - start)
+        return msg
+    
+    if event == MESSAGE_DELETED_EVENT or event == USER_BANNED_EVENT:
+        room = rooms_by_channel.get(channel)
+        if room is None:
+            return None
+        # Applied by the store stage, so it can't overtake the message it removes
+        return chat_decoder.decode_moderation(event, data, room.slug)
+    
+    return None
+
+@store_seconds.time
+def store_message(msg):
+    """Store a parsed chat message (ingest thread's store stage)"""
+    if type(msg) is ModerationEvent:
+        return apply_moderation(msg)
+    room = rooms_by_slug[msg.room]
+    # Count first so anyone woken by the append already sees the new totals
+    if msg.triggers:
+        msg.counted_at = time.time()
+        room.count_triggers(msg.triggers, msg.user_id, msg.counted_at)
+    room.store.append(msg)
+    analytics.record(msg.room, msg.username, msg.triggers)
+    if chat_archive is not None:
+        chat_archive.append(msg.room, json.dumps(msg.to_dict()))
+    messages_total.labels(msg.room).inc()
+
+def apply_moderation(event):
+    """Remove the deleted message, or a banned user's messages, and take back their trigger hits"""
+    room = rooms_by_slug[event.room]
+    if event.message_id is not None:
+        removed = room.store.remove(event.message_id)
+        removed = [removed] if removed is not None else []
+    else:
+        removed = room.store.remove_user(event.user_id)
+    for msg in removed:
+        room.uncount_triggers(msg.triggers, msg.counted_at)
+    if chat_archive is not None and (event.message_id is not None or event.user_id is not None):
+        chat_archive.remove(room.slug, event.message_id, None if event.message_id is not None else event.user_id)
+    if removed:
+        messages_removed.labels(room.slug, event.event.rsplit('\\', 1)[-1]).inc(len(removed))
+    log.info("🧹 Removed moderated chat", extra={
+        'room': room.slug, 'event': event.event, 'message_id': event.message_id,
+        'user_id': event.user_id, 'username': event.username, 'removed': len(removed),
+        'triggers': sum(len(msg.triggers) for msg in removed)
+    })
+
+# Rooms are multiplexed over as few Pusher connections as possible, each
+# owned by its own asyncio ingest thread
+record_file = open(PUSHER_RECORD_FILE, 'a', encoding='utf-8') if PUSHER_RECORD_FILE else None
+pushers = []
+for room_group in split_rooms(rooms, PUSHER_CONNECTIONS):
+    client = PusherClient(
+        PUSHER_WS_URL,
+        [room.channel for room in room_group],
+        on_event=on_pusher_message,
+        on_record=store_message,
+        decoder=FrameDecoder(PUSHER_EVENTS),
+        record_file=record_file
+    )
+    for room in room_group:
+        room.pusher = client
+    pushers.append(client)
+    atexit.register(client.stop)
+
+def pusher_stat(field):
+    return lambda: {str(n): client.stats()[field] for n, client in enumerate(pushers)}
+
+# Connection counters the clients already keep, read at scrape time
+for name, field, kind, description in (
+    ('kick_pusher_frames_received_total', 'frames_received', 'counter', "WebSocket frames received"),
+    ('kick_pusher_frames_filtered_total', 'frames_filtered', 'counter', "Frames of unwanted events dropped by the decoder"),
+    ('kick_pusher_parse_errors_total', 'parse_errors', 'counter', "Frames that failed to parse"),
+    ('kick_pusher_reconnects_total', 'reconnects', 'counter', "Reconnects after a dropped connection"),
+    ('kick_pusher_queue_depth', 'queued', 'gauge', "Frames and records waiting between ingest stages"),
+    ('kick_pusher_subscribed_channels', 'subscribed', 'gauge', "Channels subscribed on the current socket"),
+):
+    metrics.callback(name, description, pusher_stat(field), ('connection',), kind)
+metrics.callback('kick_trigger_count', "Persisted trigger counts per room",
+                 lambda: {tuple(name.split('/', 1)): value for name, value in counters.items().items() if '/' in name},
+                 ('room', 'trigger'))
+
+def connection_status():
+    """Summary of all Pusher connections in this process"""
+    if ingest_leader is not None and not ingest_leader.is_leader:
+        return f"Ingest runs in worker {ingest_leader.owner()}"
+    if len(pushers) == 1:
+        return pushers[0].status
+    subscribed = sum(len(client.subscribed) for client in pushers)
+    return f"{subscribed}/{len(rooms)} rooms subscribed over {len(pushers)} connections"
 
 def start_pusher_connection():
-    """Start the Pusher WebSocket connection"""
-    global websocket_client, connection_status
-    
-    try:
-        print(f"🔌 Connecting to Pusher: {PUSHER_WS_URL}")
-        
-        websocket.enableTrace(False)
-        
-        websocket_client = websocket.WebSocketApp(
-            PUSHER_WS_URL,
-            header={
-                'Origin': 'https://kick.com',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            },
-            on_message=on_pusher_message,
-            on_error=on_pusher_error,
-            on_close=on_pusher_close,
-            on_open=on_pusher_open
-        )
-        
-        # Run WebSocket in a separate thread
-        def run_websocket():
-            websocket_client.run_forever()
-        
-        ws_thread = threading.Thread(target=run_websocket, daemon=True)
-        ws_thread.start()
-        
-        connection_status = "🔌 Connecting..."
-        print("🔌 Pusher WebSocket connection started in background")
-        return True
-        
-    except Exception as e:
-        connection_status = f"❌ Failed to start: {str(e)}"
-        print(f"❌ Failed to start Pusher connection: {e}")
+    """Start the Pusher WebSocket connections (no-op for ones already running)"""
+    global stats_publisher
+    if ingest_leader is not None and not ingest_leader.is_leader:
+        log.info("🔌 Pusher ingest is owned by another worker", extra={'owner_pid': ingest_leader.owner()})
         return False
+    for client in pushers:
+        if not client.start():
+            log.debug("🔌 Pusher connection already running")
+    if STATE_BACKEND == 'sqlite' and stats_publisher is None:
+        stats_publisher = threading.Thread(target=publish_stats, name="stats-publisher", daemon=True)
+        stats_publisher.start()
+    return True
+
+# Overlay bodies are built once per change, not per request. Counts only change
+# with a trigger hit or when a window's oldest bucket expires, so they are
+# re-read at most once per bucket width unless a hit bumps room.version.
+STATUS_TICK = min(width for _, width, _ in windows.windows)
+beef_status_cache = {}  # room slug -> (version, counts, etag, body)
+
+def beef_status_body(room):
+    """(etag, JSON body) for the room's beef count, rolling window counts and distinct users"""
+    if ingest_leader is not None and not ingest_leader.is_leader:
+        # Counting here would hit the database on every poll; the leader publishes it instead
+        published, _ = shared_state.load_snapshot(f"beef-status/{room.slug}")
+        if published is not None:
+            return published['etag'], published['body']
+    version = (room.version, int(time.time() // STATUS_TICK))
+    cached = beef_status_cache.get(room.slug)
+    if cached is not None and cached[0] == version:
+        return cached[2], cached[3]
+    key = f"{room.slug}/{BEEF_TRIGGER}"
+    count = room.counters.get(key)
+    recent = room.windows.counts(key)
+    unique_users = room.uniques.count(key) if room.uniques is not None else 0
+    counts = (count, *recent.values(), unique_users)
+    if cached is None or cached[1] != counts:
+        body = json.dumps({'room': room.slug, 'beef_count': count, 'windows': recent, 'unique_users': unique_users})
+        etag = '"' + '-'.join([room.slug, *map(str, counts)]) + '"'
+    else:
+        etag, body = cached[2], cached[3]
+    beef_status_cache[room.slug] = (version, counts, etag, body)
+    return etag, body
+
+def publish_stats():
+    """
+    Ingest leader: share every room's analytics and beef status with the
+    other workers, which don't see the messages
+    """
+    published = {}  # room slug -> ETag of the beef status last published
+    next_stats = 0
+    while ingest_leader.is_leader:
+        try:
+            for room in rooms:
+                etag, body = beef_status_body(room)
+                if published.get(room.slug) != etag:
+                    shared_state.save_snapshot(f"beef-status/{room.slug}", {'etag': etag, 'body': body})
+                    published[room.slug] = etag
+            if time.monotonic() >= next_stats:
+                next_stats = time.monotonic() + STATS_PUBLISH_SECONDS
+                for room in rooms:
+                    shared_state.save_snapshot(f"stats/{room.slug}", analytics.snapshot(room.slug, STATS_MAX_K))
+        except sqlite3.Error as e:
+            log.error("❌ Error publishing stats", extra={'error': str(e)})
+        time.sleep(STATUS_PUBLISH_SECONDS)
+
+def published_stats(room, k, user=None):
+    """The ingest leader's last /api/stats snapshot for `room`, cut to `k` entries per ranking"""
+    stats, published_at = shared_state.load_snapshot(f"stats/{room.slug}")
+    if stats is None:
+        return None
+    stats['top_chatters'] = stats['top_chatters'][:k]
+    for entry in stats['top_triggers']:
+        entry['top_users'] = entry['top_users'][:k]
+    if user is not None:
+        # The per-user sketch stays in the leader; only ranked chatters have a count here
+        ranked = next((entry['count'] for entry in stats['top_chatters'] if entry['username'] == user), None)
+        stats['user'] = {'username': user, 'messages_estimate': ranked}
+    stats['published_at'] = published_at
+    return stats
+
+stats_publisher = None
+
+# With shared state only one worker may ingest, or every message would be stored
+# once per worker; the elected one connects right away, the others stand by
+ingest_leader = None
+if STATE_BACKEND == 'sqlite':
+    ingest_leader = IngestLeader(state_dir / 'ingest.lock', on_elected=start_pusher_connection)
+    if not ingest_leader.start():
+        for client in pushers:
+            client.status = "⏸️ Standing by, ingest runs in another worker"
+
+def get_room():
+    """Room selected by the `room` query parameter (defaults to the first room)"""
+    slug = request.args.get('room')
+    if slug is None:
+        return rooms[0] if rooms else None
+    return rooms_by_slug.get(slug)
+
+# The dashboard is a static page that renders from the JSON API; it is read
+# and compressed once, then served as-is (or as a 304) on every view
+DASHBOARD_FILE = Path(__file__).resolve().parent / 'static' / 'dashboard.html'
+dashboard_body = DASHBOARD_FILE.read_bytes()
+dashboard_gzip = gzip.compress(dashboard_body, 9)
+dashboard_etag = f'W/"{hashlib.sha1(dashboard_body).hexdigest()[:16]}"'
 
 @app.route('/')
 def dashboard():
     """Simple real-time chat dashboard"""
-    return f'''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Kick Chat Monitor - Channel: {CHANNEL_NAME}</title>
-        <meta http-equiv="refresh" content="2">
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 20px; background: #1a1a1a; color: white; }}
-            .container {{ max-width: 900px; margin: 0 auto; }}
-            .status {{ background: #333; padding: 15px; border-radius: 8px; margin: 10px 0; }}
-            .log {{ background: #222; padding: 10px; border-radius: 5px; max-height: 600px; overflow-y: auto; margin: 10px 0; }}
-            .message {{ background: #4a2c17; margin: 5px 0; padding: 8px; border-radius: 3px; border-left: 3px solid #D2691E; }}
-            #chat-messages {{ max-height: 550px; overflow-y: auto; }}
-            .message.new-message {{ animation: fadeIn 0.3s ease; }}
-            @keyframes fadeIn {{ from {{ opacity: 0; }} to {{ opacity: 1; }} }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>💬 Kick Chat Monitor</h1>
-            <div class="status">
-                <strong>Channel:</strong> {CHANNEL_NAME} (Chatroom ID: {CHATROOM_ID})<br>
-                <strong>Pusher Connection:</strong> {connection_status}<br>
-                <strong>Total Messages:</strong> {len(all_chat_messages)}<br>
-                <strong>Status:</strong> {"🟢 Online" if request.url_root else "🔴 Offline"}
-            </div>
-            
-            <div class="status">
-                <h3>🔌 Pusher Controls</h3>
-                <button onclick="connectPusher()" style="background: #28a745; color: white; border: none; padding: 8px 15px; border-radius: 3px; cursor: pointer; margin: 5px;">
-                    🔌 Connect to Chat
-                </button>
-                <button onclick="disconnectPusher()" style="background: #dc3545; color: white; border: none; padding: 8px 15px; border-radius: 3px; cursor: pointer; margin: 5px;">
-                    🔌 Disconnect
-                </button>
-                <div id="setup-status" style="margin-top: 10px; padding: 10px; border-radius: 3px; background: #333; display: none;"></div>
-            </div>
-            
-            <div class="log">
-                <h3>💬 Real-Time Chat Messages ({len(all_chat_messages)} total):</h3>
-                <div id="chat-messages">
-                    {''.join([f'<div class="message"><strong>{entry.get("timestamp", "")}</strong> - <span style="color: #00aa00;">{entry.get("username", "")}</span>: {entry.get("message", "")}</div>' for entry in all_chat_messages[-100:]]) if all_chat_messages else '<p>❌ No messages received yet</p>'}
-                </div>
-            </div>
-            
-            <div style="text-align: center; margin-top: 20px;">
-                <button onclick="fetch('/clear-messages', {{method: 'POST'}}).then(() => location.reload())" 
-                        style="background: #6c757d; color: white; border: none; padding: 10px 15px; border-radius: 5px; cursor: pointer; margin: 5px;">
-                    🗑️ Clear Messages
-                </button>
-            </div>
-        </div>
-        
-        <script>
-            function showStatus(message, success) {{
-                const statusDiv = document.getElementById('setup-status');
-                statusDiv.style.display = 'block';
-                statusDiv.style.background = success ? '#2a4a17' : '#4a1717';
-                statusDiv.textContent = message;
-                setTimeout(() => {{ statusDiv.style.display = 'none'; }}, 5000);
-            }}
-            
-            function scrollToBottom() {{
-                const chatMessages = document.getElementById('chat-messages');
-                if (chatMessages) {{
-                    chatMessages.scrollTop = chatMessages.scrollHeight;
-                }}
-            }}
-            
-            function connectPusher() {{
-                showStatus('Connecting to Pusher WebSocket...', true);
-                fetch('/connect-pusher', {{method: 'POST'}})
-                    .then(response => response.json())
-                    .then(data => {{
-                        if (data.success) {{
-                            showStatus('✅ Connected to Kick chat!', true);
-                            setTimeout(() => location.reload(), 2000);
-                        }} else {{
-                            showStatus('❌ Failed to connect: ' + data.error, false);
-                        }}
-                    }})
-                    .catch(err => showStatus('❌ Error: ' + err.message, false));
-            }}
-            
-            function disconnectPusher() {{
-                showStatus('Disconnecting from Pusher...', true);
-                fetch('/disconnect-pusher', {{method: 'POST'}})
-                    .then(response => response.json())
-                    .then(data => {{
-                        showStatus('✅ Disconnected', true);
-                        setTimeout(() => location.reload(), 1000);
-                    }})
-                    .catch(err => showStatus('❌ Error: ' + err.message, false));
-            }}
-            
-            let lastMessageCount = {len(all_chat_messages)};
-            
-            function updateMessages() {{
-                fetch(`/api/messages?last_count=${{lastMessageCount}}`)
-                    .then(response => response.json())
-                    .then(data => {{
-                        if (data.messages && data.messages.length > 0) {{
-                            const chatMessages = document.getElementById('chat-messages');
-                            
-                            // Add new messages
-                            data.messages.forEach(msg => {{
-                                const messageDiv = document.createElement('div');
-                                messageDiv.className = 'message new-message';
-                                messageDiv.innerHTML = `<strong>${{msg.timestamp}}</strong> - <span style="color: #00aa00;">${{msg.username}}</span>: ${{msg.message}}`;
-                                chatMessages.appendChild(messageDiv);
-                                
-                                // Remove animation class after animation completes
-                                setTimeout(() => {{
-                                    messageDiv.classList.remove('new-message');
-                                }}, 300);
-                            }});
-                            
-                            lastMessageCount = data.total_count;
-                            scrollToBottom();
-                            
-                            // Update message count in header
-                            const header = document.querySelector('h3');
-                            if (header) {{
-                                header.textContent = `💬 Real-Time Chat Messages (${{data.total_count}} total):`;
-                            }}
-                        }}
-                        
-                        // Update connection status
-                        const statusElements = document.querySelectorAll('.status');
-                        if (statusElements[0] && data.connection_status) {{
-                            const lines = statusElements[0].innerHTML.split('<br>');
-                            lines[1] = `<strong>Pusher Connection:</strong> ${{data.connection_status}}`;
-                            lines[2] = `<strong>Total Messages:</strong> ${{data.total_count}}`;
-                            statusElements[0].innerHTML = lines.join('<br>');
-                        }}
-                    }})
-                    .catch(error => console.error('Error fetching messages:', error));
-            }}
-            
-            function scrollToBottom() {{
-                const chatMessages = document.getElementById('chat-messages');
-                if (chatMessages) {{
-                    chatMessages.scrollTop = chatMessages.scrollHeight;
-                }}
-            }}
-            
-            // Auto-scroll to bottom when page loads and start real-time updates
-            window.addEventListener('load', function() {{
-                scrollToBottom();
-                
-                // Poll for new messages every 500ms (0.5 seconds)
-                setInterval(updateMessages, 500);
-            }});
-        </script>
-    </body>
-    </html>
-    '''
+    headers = {'ETag': dashboard_etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if request.headers.get('If-None-Match') == dashboard_etag:
+        return Response(status=304, headers=headers)
+    body = dashboard_body
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body = dashboard_gzip
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, mimetype='text/html', headers=headers)
 
 @app.route('/connect-pusher', methods=['POST'])
 def connect_pusher_route():
@@ -310,24 +341,19 @@ def connect_pusher_route():
     success = start_pusher_connection()
     return jsonify({
         'success': success,
-        'status': connection_status,
-        'error': connection_status if not success else None
+        'status': connection_status(),
+        'error': connection_status() if not success else None
     })
 
 @app.route('/disconnect-pusher', methods=['POST'])
 def disconnect_pusher_route():
     """API endpoint to disconnect Pusher WebSocket"""
-    global websocket_client, connection_status
-    
     try:
-        if websocket_client:
-            websocket_client.close()
-            websocket_client = None
-        
-        connection_status = "❌ Disconnected"
+        for client in pushers:
+            client.stop()
         return jsonify({
             'success': True,
-            'status': connection_status
+            'status': connection_status()
         })
     except Exception as e:
         return jsonify({
@@ -337,48 +363,249 @@ def disconnect_pusher_route():
 
 @app.route('/clear-messages', methods=['POST'])
 def clear_messages():
-    """Clear all chat messages"""
-    global all_chat_messages
-    all_chat_messages = []
-    print("🗑️ Chat messages cleared")
-    return jsonify({'status': 'cleared', 'message_count': len(all_chat_messages)})
+    """Clear chat messages for one room (or every room with room=all)"""
+    targets = rooms if request.args.get('room') == 'all' else [get_room()]
+    if targets == [None]:
+        return jsonify({'error': 'Unknown room'}), 404
+    for room in targets:
+        room.store.clear()
+        log.info("🗑️ Chat messages cleared", extra={'room': room.slug})
+    return jsonify({'status': 'cleared', 'rooms': [room.slug for room in targets]})
+
+def messages_payload(room, since_seq, limit=None):
+    """Build the incremental message response shared by polling and streaming"""
+    messages, last_seq, truncated = room.store.since(since_seq, limit)
+    return {
+        'room': room.slug,
+        'messages': [msg.to_dict() for msg in messages],
+        'last_seq': last_seq,
+        'oldest_seq': room.store.oldest_seq,
+        'truncated': truncated,
+        'total_count': len(room.store),
+        'connection_status': room.status
+    }
+
+@app.route('/api/rooms')
+def list_rooms():
+    """Configured rooms handled by this process, with their counters"""
+    return jsonify({
+        'rooms': [room.to_dict() for room in rooms],
+        'shard': {'index': SHARD_INDEX, 'count': SHARD_COUNT},
+        'connections': len(pushers)
+    })
 
 @app.route('/api/messages')
 def get_messages():
-    """API endpoint to get latest chat messages"""
-    last_count = request.args.get('last_count', 0, type=int)
+    """
+    API endpoint to get latest chat messages
+
+    Select the chatroom with `room=<slug>` (defaults to the first room).
+    Pass `since_seq` (the `last_seq` from the previous response) to receive
+    only newer messages. `truncated` is true when the cursor is older than
+    the retention window and some messages were missed.
+
+    With `wait=<seconds>` this becomes a long-poll: the request blocks until
+    a new message arrives or the wait runs out.
+    """
+    room = get_room()
+    if room is None:
+        return jsonify({'error': 'Unknown room'}), 404
+    since_seq = request.args.get('since_seq', 0, type=int)
+    limit = request.args.get('limit', None, type=int)
+    wait = min(request.args.get('wait', 0, type=float), LONG_POLL_MAX_WAIT)
     
-    # Return only new messages since last check
-    if last_count < len(all_chat_messages):
-        new_messages = all_chat_messages[last_count:]
-        return jsonify({
-            'messages': new_messages,
-            'total_count': len(all_chat_messages),
-            'connection_status': connection_status
-        })
+    # A cursor ahead of the store means the server restarted; answer right away
+    if wait > 0 and since_seq <= room.store.last_seq:
+        room.store.wait_for_new(since_seq, wait)
+    
+    return jsonify(messages_payload(room, since_seq, limit))
+
+@app.route('/api/stream')
+def stream_messages():
+    """
+    Server-Sent Events stream of chat messages for one room
+
+    Each event carries the same body as /api/messages. Reconnecting browsers
+    resume from the Last-Event-ID header automatically.
+    """
+    room = get_room()
+    if room is None:
+        return jsonify({'error': 'Unknown room'}), 404
+    since_seq = request.headers.get('Last-Event-ID', type=int)
+    if since_seq is None:
+        since_seq = request.args.get('since_seq', room.store.last_seq, type=int)
+    since_seq = min(since_seq, room.store.last_seq)
+    
+    def generate(cursor):
+        # Tell EventSource how long to wait before reconnecting
+        yield 'retry: 2000\n\n'
+        while True:
+            if room.store.wait_for_new(cursor, SSE_HEARTBEAT_SECONDS):
+                payload = messages_payload(room, cursor)
+                cursor = payload['last_seq']
+                yield f"id: {cursor}\nevent: messages\ndata: {json.dumps(payload)}\n\n"
+            else:
+                yield ': keep-alive\n\n'
+    
+    return Response(
+        stream_with_context(generate(since_seq)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/beef-status')
+def beef_status():
+    """
+    Beef count for the OBS overlay
+
+    Responses carry an ETag, so a poll with a matching If-None-Match gets an
+    empty 304 while the count is unchanged.
+    """
+    room = get_room()
+    if room is None:
+        return jsonify({'error': 'Unknown room'}), 404
+    etag, body = beef_status_body(room)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Access-Control-Allow-Origin': '*'}
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
+
+@app.route('/api/beef-status/stream')
+def beef_status_stream():
+    """Server-Sent Events push of the beef status: one event now, then one per change"""
+    room = get_room()
+    if room is None:
+        return jsonify({'error': 'Unknown room'}), 404
+    
+    def generate():
+        yield 'retry: 2000\n\n'
+        cursor = room.store.last_seq
+        etag, body = beef_status_body(room)
+        yield f"event: status\ndata: {body}\n\n"
+        last_sent = time.monotonic()
+        while True:
+            # Wake at least once a second: window counts also drop as time passes
+            if room.store.wait_for_new(cursor, 1.0):
+                cursor = room.store.last_seq
+            new_etag, body = beef_status_body(room)
+            if new_etag != etag:
+                etag = new_etag
+                last_sent = time.monotonic()
+                yield f"event: status\ndata: {body}\n\n"
+            elif time.monotonic() - last_sent >= SSE_HEARTBEAT_SECONDS:
+                last_sent = time.monotonic()
+                yield ': keep-alive\n\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'Access-Control-Allow-Origin': '*'}
+    )
+
+@app.route('/api/history')
+def get_history():
+    """
+    Archived chat messages for one room, oldest first, as newline-delimited JSON
+
+    `from` / `to` bound the time (Unix seconds or ISO 8601). To page, pass
+    `after=<record>` with the last `record` of the previous response.
+    """
+    room = get_room()
+    if room is None:
+        return jsonify({'error': 'Unknown room'}), 404
+    if chat_archive is None:
+        return jsonify({'error': 'Chat archive is disabled (ARCHIVE_MAX_MB=0)'}), 404
+    try:
+        start = parse_time(request.args.get('from'))
+        end = parse_time(request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'from/to must be Unix timestamps or ISO 8601 dates'}), 400
+    after = request.args.get('after', None, type=int)
+    limit = min(request.args.get('limit', 1000, type=int), HISTORY_MAX_LIMIT)
+    return Response(
+        stream_with_context(history_lines(chat_archive, room.slug, start, end, after, limit)),
+        mimetype='application/x-ndjson'
+    )
+
+@app.route('/api/search')
+def search_messages():
+    """
+    Retained chat messages containing every word of `q` and/or sent by
+    `user` (a user_id, or a username), newest first
+
+    Words match whole and ignore case. `limit` caps the result (default 50).
+    """
+    room = get_room()
+    if room is None:
+        return jsonify({'error': 'Unknown room'}), 404
+    query = request.args.get('q', '')
+    user = request.args.get('user', '')
+    if not query.strip() and not user.strip():
+        return jsonify({'error': 'Pass q and/or user'}), 400
+    limit = max(1, min(request.args.get('limit', 50, type=int), SEARCH_MAX_LIMIT))
+    messages = room.store.search(query, user or None, limit)
+    return jsonify({
+        'room': room.slug,
+        'q': query,
+        'user': user or None,
+        'messages': [msg.to_dict() for msg in messages],
+        'oldest_seq': room.store.oldest_seq,
+        'last_seq': room.store.last_seq
+    })
+
+@app.route('/api/stats')
+def get_stats():
+    """
+    Streaming chat analytics for one room: top chatters, top triggers and who
+    fires them, message rates and messages per minute over the last hour
+
+    `k` sets the length of each ranking and `user=<name>` adds an estimate of
+    that user's message count. Ranked counts may be too high by up to `error`.
+    """
+    room = get_room()
+    if room is None:
+        return jsonify({'error': 'Unknown room'}), 404
+    k = max(1, min(request.args.get('k', 10, type=int), STATS_MAX_K))
+    # Only the worker running the Pusher connections sees the messages
+    ingesting = ingest_leader is None or ingest_leader.is_leader
+    if ingesting:
+        stats = analytics.snapshot(room.slug, k, request.args.get('user'))
     else:
-        return jsonify({
-            'messages': [],
-            'total_count': len(all_chat_messages),
-            'connection_status': connection_status
-        })
+        stats = published_stats(room, k, request.args.get('user'))
+        if stats is None:
+            return jsonify({'error': 'Stats not published yet, try again shortly'}), 503
+    stats['ingesting'] = ingesting
+    return jsonify(stats)
 
 @app.route('/health')
 def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'messages_received': len(all_chat_messages),
-        'connection_status': connection_status,
-        'channel': CHANNEL_NAME
+        'messages_received': sum(room.store.last_seq for room in rooms),
+        'messages_retained': sum(len(room.store) for room in rooms),
+        'connection_status': connection_status(),
+        'rooms': [room.slug for room in rooms],
+        'state_backend': STATE_BACKEND,
+        'trigger_cooldown_suppressed': trigger_cooldowns.suppressed,
+        'ingest_leader': ingest_leader.is_leader if ingest_leader is not None else True,
+        'connections': [client.stats() for client in pushers]
     })
 
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus scrape endpoint: ingest latency histograms and connection counters"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
     print("💬 Starting Kick Chat Monitor...")
-    print(f"Channel: {CHANNEL_NAME} (Chatroom ID: {CHATROOM_ID})")
+    for room in rooms:
+        print(f"Channel: {room.slug} (Chatroom ID: {room.chatroom_id})")
+    print(f"Pusher connections: {len(pushers)} (shard {SHARD_INDEX + 1}/{SHARD_COUNT})")
     print(f"Pusher App Key: {PUSHER_APP_KEY}")
     print(f"WebSocket URL: {PUSHER_WS_URL}")
-    print("📊 Tracking all chat messages (unlimited)")
+    print(f"JSON backend: {chat_decoder.backend}")
+    print(f"📊 Keeping the last {MAX_CHAT_MESSAGES} chat messages per room")
     
     # Auto-start Pusher connection
     print("🔌 Auto-starting Pusher WebSocket connection...")
@@ -391,5 +618,6 @@ if __name__ == '__main__':
     # Get port from environment (for deployment platforms)
     port = int(os.environ.get('PORT', 5000))
     
-    # Run server
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    # Run server. No reloader: its parent process would import this module too and
+    # run a second ingest writing the same archive and counter files.
+    app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the Pusher frame decoder
+
+Replays recorded Pusher frames (one raw frame per line, as written by
+PUSHER_RECORD_FILE) or a synthetic mix, and reports frames/sec for the
+original double json.loads path and for each available decoder backend.
+
+Usage:
+    python benchmarks/bench_decoder.py
+    python benchmarks/bench_decoder.py --frames recorded_frames.txt --repeat 20
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_pusher import COMPACT, chat_frame  # noqa: E402
+from pusher_decoder import BACKENDS, CHAT_MESSAGE_EVENT, FrameDecoder  # noqa: E402
+
+OTHER_EVENTS = [
+    'App\\Events\\ChatroomUpdatedEvent',
+    'App\\Events\\LivestreamUpdated',
+    'App\\Events\\PinnedMessageCreatedEvent',
+    'App\\Events\\GiftedSubscriptionsEvent',
+]
+
+
+def synthetic_frames(count, chat_share=0.8, seed=1):
+    """Chat-heavy mix with other channel events and a few pings"""
+    rng = random.Random(seed)
+    channel = "chatrooms.328681.v2"
+    frames = []
+    for n in range(count):
+        roll = rng.random()
+        if roll < chat_share:
+            words = ' '.join(rng.choice(['hello', 'lol', '$beef', 'KEKW', 'gg', 'nice']) for _ in range(rng.randint(1, 12)))
+            frames.append(chat_frame(channel, f"{n:08x}-msg", f"user{rng.randint(1, 5000)}", rng.randint(1, 10**7), words))
+        elif roll < chat_share + 0.02:
+            frames.append(json.dumps({"event": "pusher:ping", "data": {}}, separators=COMPACT))
+        else:
+            payload = json.dumps({"id": n, "chatroom": {"id": 328681}, "extra": "x" * rng.randint(50, 500)}, separators=COMPACT)
+            frames.append(json.dumps({"event": rng.choice(OTHER_EVENTS), "channel": channel, "data": payload}, separators=COMPACT))
+    return frames
+
+
+def naive_decode(frames):
+    """The original on_pusher_message path: json.loads the frame, then the data"""
+    for raw in frames:
+        msg = json.loads(raw)
+        if msg.get('event') == CHAT_MESSAGE_EVENT:
+            data = json.loads(msg.get('data', '{}'))
+            (data.get('content', ''), data.get('sender', {}).get('username', 'Unknown'),
+             data.get('sender', {}).get('id', 0), data.get('id', ''))
+
+
+def decoder_decode(decoder):
+    def run(frames):
+        decode, decode_chat = decoder.decode, decoder.decode_chat
+        for raw in frames:
+            msg = decode(raw)
+            if msg is not None and msg.event == CHAT_MESSAGE_EVENT:
+                decode_chat(msg.data, '00:00:00')
+    return run
+
+
+def measure(run, frames, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(frames)
+        best = min(best, time.perf_counter() - start)
+    return len(frames) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pusher decoder micro-benchmark")
+    parser.add_argument('--frames', help="file with one raw Pusher frame per line")
+    parser.add_argument('--count', type=int, default=50000, help="synthetic frames to generate")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per variant (best is reported)")
+    args = parser.parse_args()
+
+    if args.frames:
+        with open(args.frames, encoding='utf-8') as f:
+            frames = [line.rstrip('\n') for line in f if line.strip()]
+        source = args.frames
+    else:
+        frames = synthetic_frames(args.count)
+        source = "synthetic"
+    print(f"📊 {len(frames)} frames ({source}), best of {args.repeat}")
+
+    results = [("naive json.loads x2", measure(naive_decode, frames, args.repeat))]
+    for name in BACKENDS:
+        try:
+            decoder = FrameDecoder({CHAT_MESSAGE_EVENT}, backend=name)
+            unfiltered = FrameDecoder(None, backend=name)
+        except ValueError:
+            print(f"   {name}: not installed, skipped")
+            continue
+        results.append((f"{name} filtered", measure(decoder_decode(decoder), frames, args.repeat)))
+        results.append((f"{name} unfiltered", measure(decoder_decode(unfiltered), frames, args.repeat)))
+
+    baseline = results[0][1]
+    for label, rate in results:
+        print(f"   {label:<24} {rate:>12,.0f} frames/sec  ({rate / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the trigger engine as the number of rules grows
+
+Compares TriggerEngine against checking every rule in a Python loop, for
+increasing rule counts, over a synthetic chat corpus.
+
+Usage:
+    python benchmarks/bench_triggers.py
+    python benchmarks/bench_triggers.py --rules 10 100 500 1000 --messages 20000
+"""
+
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from triggers import COMMAND_PREFIX, TriggerEngine  # noqa: E402
+
+CHAT_WORDS = ['hello', 'lol', 'gg', 'nice', 'KEKW', 'pog', 'what', 'is', 'this', 'stream', 'chat', 'W', 'L']
+
+
+def random_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+
+
+def make_rules(count, rng, regexes=3):
+    """
+    Keywords and commands plus a fixed handful of regexes, like a real config
+
+    Literal rules share one trie-shaped pattern, so adding more of them barely
+    changes the cost per message. Each regex rule adds its own cost at every
+    position, which is why the regex count is held constant here.
+    """
+    rules = [{'name': 'beef', 'type': 'command', 'pattern': 'beef'}]
+    while len(rules) < count:
+        n = len(rules)
+        kind = 'regex' if n <= regexes else ('command' if n % 3 == 0 else 'keyword')
+        pattern = rf'{random_word(rng)}\d+' if kind == 'regex' else random_word(rng)
+        rules.append({'name': f'rule{n}', 'type': kind, 'pattern': pattern})
+    return rules
+
+
+def make_messages(count, rules, rng):
+    keywords = [r['pattern'] for r in rules if r['type'] != 'regex']
+    messages = []
+    for _ in range(count):
+        words = [rng.choice(CHAT_WORDS) for _ in range(rng.randint(2, 15))]
+        if rng.random() < 0.1:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        text = ' '.join(words)
+        messages.append(COMMAND_PREFIX + text if rng.random() < 0.1 else text)
+    return messages
+
+
+def naive_matcher(rules):
+    """One check per rule per message"""
+    compiled = []
+    for r in rules:
+        if r['type'] == 'regex':
+            pattern = re.compile(r['pattern'], re.IGNORECASE)
+        elif r['type'] == 'keyword':
+            pattern = re.compile(rf"(?<!\w){re.escape(r['pattern'].lower())}(?!\w)")
+        else:
+            pattern = r['pattern'].lower()
+        compiled.append((r['name'], r['type'], pattern))
+
+    def match(message):
+        text = message.lower()
+        is_command = text.lstrip().startswith(COMMAND_PREFIX)
+        fired = set()
+        for name, kind, pattern in compiled:
+            if kind == 'command':
+                if is_command and pattern in text:
+                    fired.add(name)
+            elif pattern.search(text):
+                fired.add(name)
+        return fired
+    return match
+
+
+def measure(match, messages, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            match(message)
+        best = min(best, time.perf_counter() - start)
+    return len(messages) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trigger engine benchmark")
+    parser.add_argument('--rules', type=int, nargs='+', default=[1, 10, 100, 300, 1000])
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"📊 {args.messages} messages per run, best of {args.repeat}")
+    print(f"   {'rules':>6} {'engine msg/s':>14} {'naive msg/s':>14} {'speedup':>8}")
+    for count in args.rules:
+        rng = random.Random(count)
+        rules = make_rules(count, rng)
+        messages = make_messages(args.messages, rules, rng)
+        engine = TriggerEngine(rules)
+        naive = naive_matcher(rules)
+        # Both must agree before their speed means anything
+        for message in messages[:500]:
+            assert engine.match(message) == naive(message), message
+        fast = measure(engine.match, messages, args.repeat)
+        slow = measure(naive, messages, args.repeat)
+        print(f"   {count:>6} {fast:>14,.0f} {slow:>14,.0f} {fast / slow:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Replay / load generator for both servers
+
+Feeds recorded or synthetic chat at a fixed rate, a raid profile (a steady
+rate with periodic bursts) or as fast as possible, and reports msgs/sec,
+p50/p99 ingest-to-visible latency and RSS growth.
+
+Targets:
+    inproc    call app.on_pusher_message + store_message directly
+    pusher    start a local fake Pusher server and let app.py ingest from it
+    webhook   POST Kick webhook payloads to a running kick-webhook-server.py
+
+Usage:
+    python benchmarks/replay.py --target inproc --count 100000
+    python benchmarks/replay.py --target pusher --rate 500 --duration 30
+    python benchmarks/replay.py --target pusher --profile raid --rate 50 --burst-rate 2000
+    python benchmarks/replay.py --target pusher --frames recorded_frames.txt --rate 0
+    python benchmarks/replay.py --target webhook --url http://localhost:5000/webhook --pid <server pid>
+    python benchmarks/replay.py --target webhook --secret $KICK_WEBHOOK_SECRET
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_pusher import COMPACT, FakePusherServer, chat_frame  # noqa: E402
+
+CHAT_WORDS = ['hello', 'lol', '$beef', 'KEKW', 'gg', 'nice', 'W', 'pog']
+DEFAULT_CHANNEL = "chatrooms.328681.v2"
+
+
+def synthetic_frames(count, channel=DEFAULT_CHANNEL, seed=1):
+    rng = random.Random(seed)
+    for n in range(count):
+        words = ' '.join(rng.choice(CHAT_WORDS) for _ in range(rng.randint(1, 12)))
+        yield chat_frame(channel, f"replay-{n}", f"user{rng.randint(1, 5000)}", rng.randint(1, 10**7), words)
+
+
+def recorded_frames(path, count):
+    """Chat frames from a PUSHER_RECORD_FILE capture, renumbered so each id is unique"""
+    with open(path, encoding='utf-8') as f:
+        frames = [json.loads(line) for line in f if '"App\\\\Events\\\\ChatMessageEvent"' in line]
+    if not frames:
+        sys.exit(f"No chat frames in {path}")
+    for n in range(count):
+        frame = dict(frames[n % len(frames)])
+        data = json.loads(frame['data'])
+        data['id'] = f"replay-{n}"
+        frame['data'] = json.dumps(data, separators=COMPACT)
+        yield json.dumps(frame, separators=COMPACT)
+
+
+def webhook_payloads(count, channel='sam', seed=1):
+    rng = random.Random(seed)
+    for n in range(count):
+        user_id = rng.randint(1, 10**7)
+        yield json.dumps({
+            "event": {
+                "type": "chat.message.sent",
+                "data": {
+                    "message_id": f"replay-{n}",
+                    "content": ' '.join(rng.choice(CHAT_WORDS) for _ in range(rng.randint(1, 12))),
+                    "sender": {"user_id": user_id, "username": f"user{user_id % 5000}"},
+                    "chatroom": {"channel": {"slug": channel}}
+                }
+            }
+        })
+
+
+def schedule(args):
+    """Send offsets in seconds for each message (None = as fast as possible)"""
+    if args.rate <= 0:
+        while True:
+            yield None
+    t = 0.0
+    while True:
+        rate = args.rate
+        if args.profile == 'raid' and t % args.burst_every < args.burst_seconds:
+            rate = args.burst_rate
+        yield t
+        t += 1.0 / rate
+
+
+def rss_bytes(pid='self'):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource  # Peak, not current, but better than nothing off Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Recorder:
+    """Latencies and send counts, plus RSS sampled in the background"""
+
+    def __init__(self, pid='self'):
+        self.pid = pid
+        self.latencies = []
+        self.sent_at = {}  # message id -> perf_counter at send
+        self.sent = 0
+        self.lock = threading.Lock()
+        self.rss_start = self.rss_peak = rss_bytes(pid)
+        self._stop = threading.Event()
+        threading.Thread(target=self._sample, daemon=True).start()
+
+    def _sample(self):
+        while not self._stop.wait(0.5):
+            self.rss_peak = max(self.rss_peak, rss_bytes(self.pid))
+
+    def seen(self, message_id, now):
+        sent = self.sent_at.pop(message_id, None)
+        if sent is not None:
+            with self.lock:
+                self.latencies.append(now - sent)
+
+    def report(self, elapsed):
+        self._stop.set()
+        rss_end = rss_bytes(self.pid)
+        done = sorted(self.latencies)
+
+        def pct(p):
+            return done[min(len(done) - 1, int(len(done) * p))] * 1000 if done else float('nan')
+
+        print(f"📊 sent {self.sent} in {elapsed:.2f}s, {len(done)} visible")
+        print(f"   throughput     {len(done) / elapsed:>12,.0f} msgs/sec")
+        print(f"   latency p50    {pct(0.50):>12.2f} ms")
+        print(f"   latency p99    {pct(0.99):>12.2f} ms")
+        print(f"   latency max    {pct(1.0):>12.2f} ms")
+        print(f"   RSS            {self.rss_start / 2**20:.1f} MB -> {rss_end / 2**20:.1f} MB"
+              f" (peak {self.rss_peak / 2**20:.1f} MB, +{(rss_end - self.rss_start) / 2**20:.1f} MB)")
+
+
+def paced(items, args):
+    """Yield items on schedule, stopping at --duration"""
+    start = time.perf_counter()
+    for item, offset in zip(items, schedule(args)):
+        if offset is not None:
+            if args.duration and offset >= args.duration:
+                return
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        elif args.duration and time.perf_counter() - start >= args.duration:
+            return
+        yield item
+
+
+def frame_source(args):
+    if args.frames:
+        return recorded_frames(args.frames, args.count)
+    return synthetic_frames(args.count)
+
+
+def channels_of(frames):
+    return sorted({json.loads(frame)['channel'] for frame in frames})
+
+
+def import_app(channels, ws_url=None):
+    """Import app.py configured for the replayed channels, with state kept out of the repo"""
+    os.environ['KICK_CHATROOMS'] = ','.join(f"room{c.split('.')[1]}:{c.split('.')[1]}" for c in channels)
+    os.environ.setdefault('DATA_DIR', os.path.join(os.environ.get('TMPDIR', '/tmp'), 'kick-replay'))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    if ws_url:
+        os.environ['PUSHER_WS_URL'] = ws_url
+    import app
+    return app
+
+
+def run_inproc(args):
+    frames = list(frame_source(args))
+    app = import_app(channels_of(frames[:1000]))
+    from pusher_decoder import FrameDecoder
+    decoder = FrameDecoder(app.PUSHER_EVENTS)
+    recorder = Recorder()
+    start = time.perf_counter()
+    for raw in paced(frames, args):
+        sent = time.perf_counter()
+        recorder.sent += 1
+        # Same path as the ingest thread: decode, parse, store
+        frame = decoder.decode(raw)
+        if frame is None:
+            continue
+        msg = app.on_pusher_message(frame.event, frame.channel, frame.data)
+        if msg is not None:
+            app.store_message(msg)
+        recorder.latencies.append(time.perf_counter() - sent)
+    recorder.report(time.perf_counter() - start)
+
+
+def run_pusher(args):
+    frames = list(frame_source(args))
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    server = asyncio.run_coroutine_threadsafe(FakePusherServer(port=0).start(), loop).result()
+    app = import_app(channels_of(frames[:1000]), server.url)
+    app.start_pusher_connection()
+    while any(len(client.subscribed) < len(client.channels) for client in app.pushers):
+        time.sleep(0.05)
+
+    recorder = Recorder()
+    done = threading.Event()
+
+    def watch(room):
+        cursor = room.store.last_seq
+        while not done.is_set():
+            if room.store.wait_for_new(cursor, 0.2):
+                messages, cursor, _ = room.store.since(cursor)
+                now = time.perf_counter()
+                for msg in messages:
+                    recorder.seen(msg.message_id, now)
+
+    watchers = [threading.Thread(target=watch, args=(room,), daemon=True) for room in app.rooms]
+    for watcher in watchers:
+        watcher.start()
+
+    start = time.perf_counter()
+    for raw in paced(frames, args):
+        frame = json.loads(raw)
+        message_id = json.loads(frame['data'])['id']
+        recorder.sent_at[message_id] = time.perf_counter()
+        recorder.sent += 1
+        asyncio.run_coroutine_threadsafe(server.broadcast(frame['channel'], raw), loop).result()
+    # Give the ingest a moment to drain before reporting
+    deadline = time.perf_counter() + 5
+    while recorder.sent_at and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    done.set()
+    recorder.report(elapsed)
+    for client in app.pushers:
+        client.stop()
+
+
+def run_webhook(args):
+    import requests
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=args.concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    recorder = Recorder(args.pid or 'self')
+    errors = []
+
+    def post(body, sent):
+        if sent is None:
+            sent = time.perf_counter()
+        headers = {'Content-Type': 'application/json'}
+        if args.secret:
+            signature = hmac.new(args.secret.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).hexdigest()
+            headers['X-Kick-Signature-256'] = f"sha256={signature}"
+        try:
+            response = session.post(args.url, data=body, headers=headers, timeout=30)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except requests.RequestException as e:
+            errors.append(type(e).__name__)
+        with recorder.lock:
+            recorder.latencies.append(time.perf_counter() - sent)
+        in_flight.release()
+
+    # Never queue more than a couple of requests per worker
+    in_flight = threading.BoundedSemaphore(args.concurrency * 2)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for body in paced(webhook_payloads(args.count), args):
+            in_flight.acquire()
+            recorder.sent += 1
+            # At a fixed rate latency counts from the scheduled send, so
+            # falling behind shows up; flat out it is per request
+            pool.submit(post, body, time.perf_counter() if args.rate > 0 else None)
+    recorder.report(time.perf_counter() - start)
+    if errors:
+        print(f"   errors         {len(errors)} (first: {errors[0]})")
+    if not args.pid:
+        print("   (pass --pid <server pid> to track the server's RSS instead of this process)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat replay / load generator")
+    parser.add_argument('--target', choices=['inproc', 'pusher', 'webhook'], default='inproc')
+    parser.add_argument('--frames', help="PUSHER_RECORD_FILE capture to replay (default: synthetic chat)")
+    parser.add_argument('--count', type=int, default=50000, help="messages to send")
+    parser.add_argument('--duration', type=float, default=0, help="stop after this many seconds")
+    parser.add_argument('--rate', type=float, default=0, help="messages/sec (0 = as fast as possible)")
+    parser.add_argument('--profile', choices=['steady', 'raid'], default='steady')
+    parser.add_argument('--burst-rate', type=float, default=2000, help="raid profile: messages/sec during bursts")
+    parser.add_argument('--burst-every', type=float, default=30, help="raid profile: seconds between burst starts")
+    parser.add_argument('--burst-seconds', type=float, default=5, help="raid profile: length of each burst")
+    parser.add_argument('--url', default='http://localhost:5000/webhook', help="webhook target URL")
+    parser.add_argument('--concurrency', type=int, default=8, help="webhook target: parallel requests")
+    parser.add_argument('--pid', type=int, help="webhook target: server process to sample RSS from")
+    parser.add_argument('--secret', help="webhook target: sign requests with this webhook secret")
+    args = parser.parse_args()
+
+    print(f"🔁 {args.target}: {'as fast as possible' if args.rate <= 0 else f'{args.rate:g} msgs/sec'}"
+          f"{f', raid bursts of {args.burst_rate:g} msgs/sec' if args.profile == 'raid' else ''}")
+    {'inproc': run_inproc, 'pusher': run_pusher, 'webhook': run_webhook}[args.target](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,473 @@
+"""
+Kick Chat Monitor - Chat Archive
+Append-only, compressed on-disk chat history with a sparse index for range reads
+
+Each room gets its own directory of segment files:
+    <first record>.seg   zlib-compressed blocks of "<unix time>\t<record>\t<json>\n" lines
+    <first record>.idx   one fixed-size entry per block (first time, first record, offset, size, count)
+    removed.jsonl        tombstones for moderated chat: {"at": time, "message_id": ...} or {"at": time, "user_id": ...}
+
+Messages are buffered and written as one block every `flush_interval` seconds,
+or sooner once `block_bytes` of text is pending. A segment is closed once it
+reaches `segment_bytes`, and the oldest segments are deleted once a room uses
+more than `max_bytes`. A query binary-searches the index by time or record
+number and decompresses only the blocks it needs, read through mmap.
+
+Blocks are never rewritten, so a deleted message (or everything a banned user
+sent up to the ban) is recorded as a tombstone instead and left out of query
+results. Tombstones older than every archived message are dropped along with
+the segments they refer to.
+
+Any number of processes may query an archive, but only the one holding
+`archive.lock` in its directory appends; another would-be writer logs an
+error and drops its messages rather than interleave blocks with the owner.
+"""
+
+import atexit
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+
+from file_lock import lock_owner, try_lock
+from log_config import get_logger
+
+log = get_logger('archive')
+
+INDEX_ENTRY = struct.Struct('<dQQII')  # first time, first record, offset, compressed size, line count
+# Room names become directory names, so only plain slugs are accepted
+ROOM_NAME = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+
+class _Segment:
+    """One segment's index, loaded incrementally from its .idx file"""
+
+    __slots__ = ('name', 'times', 'records', 'offsets', 'sizes', 'counts', 'index_bytes')
+
+    def __init__(self, name):
+        self.name = name
+        self.times = []
+        self.records = []
+        self.offsets = []
+        self.sizes = []
+        self.counts = []
+        self.index_bytes = 0  # How much of the .idx file has been read
+
+    @property
+    def end(self):
+        """Offset just past the last indexed block"""
+        return self.offsets[-1] + self.sizes[-1] if self.offsets else 0
+
+    @property
+    def next_record(self):
+        return self.records[-1] + self.counts[-1] if self.records else self.name
+
+
+class RoomArchive:
+    """Segments for one room. Any process may read; only one may append."""
+
+    def __init__(self, directory, segment_bytes, block_bytes):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.block_bytes = block_bytes
+        self._segments = []
+        self._pending = []       # Lines not yet handed to the writer
+        self._pending_bytes = 0
+        self._in_flight = []     # Lines being compressed and written right now
+        self._next_record = None  # Set when the first append opens the archive for writing
+        self._tombstones = ({}, {})  # message_id -> removal time, user_id -> latest ban time
+        self._tombstones_version = None  # (inode, size, mtime) of removed.jsonl when last read
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _path(self, name, suffix):
+        return self.directory / f"{name:012d}{suffix}"
+
+    def _sync(self):
+        """Pick up blocks and segments written (or deleted) since the last call"""
+        names = sorted(int(p.stem) for p in self.directory.glob('*.idx')) if self.directory.exists() else []
+        known = {segment.name: segment for segment in self._segments}
+        self._segments = [known.get(name) or _Segment(name) for name in names]
+        for segment in self._segments:
+            try:
+                with open(self._path(segment.name, '.idx'), 'rb') as f:
+                    f.seek(segment.index_bytes)
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            for first_time, first_record, offset, size, count in INDEX_ENTRY.iter_unpack(data[:usable]):
+                segment.times.append(first_time)
+                segment.records.append(first_record)
+                segment.offsets.append(offset)
+                segment.sizes.append(size)
+                segment.counts.append(count)
+            segment.index_bytes += usable
+        # Only the active (last) segment can be empty, between its creation and first block
+        self._segments = [segment for n, segment in enumerate(self._segments) if segment.records or n == len(self._segments) - 1]
+
+    def _open_for_writing(self):
+        """Recover from a crash mid-write: cut anything the index doesn't cover"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._sync()
+        if self._segments:
+            last = self._segments[-1]
+            with open(self._path(last.name, '.idx'), 'r+b') as f:
+                f.truncate(last.index_bytes)
+            seg_path = self._path(last.name, '.seg')
+            if seg_path.exists() and seg_path.stat().st_size > last.end:
+                with open(seg_path, 'r+b') as f:
+                    f.truncate(last.end)
+            self._next_record = last.next_record
+        else:
+            self._next_record = 0
+
+    def append(self, line, ts):
+        """Buffer one JSON line; returns True once a full block is waiting"""
+        with self._lock:
+            if self._next_record is None:
+                self._open_for_writing()
+            entry = b'%.3f\t%d\t%s\n' % (ts, self._next_record, line)
+            self._next_record += 1
+            self._pending.append((ts, entry))
+            self._pending_bytes += len(entry)
+            return self._pending_bytes >= self.block_bytes
+
+    def remove(self, message_id=None, user_id=None, ts=None):
+        """Tombstone one message, or everything `user_id` sent until now"""
+        entry = {'at': time.time() if ts is None else ts}
+        if message_id is not None:
+            entry['message_id'] = str(message_id)
+        else:
+            entry['user_id'] = int(user_id)
+        with self._write_lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / 'removed.jsonl', 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def _sync_tombstones(self):
+        """Re-read removed.jsonl if it changed since the last call"""
+        path = self.directory / 'removed.jsonl'
+        try:
+            st = path.stat()
+            version = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if version == self._tombstones_version:
+                return
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            self._tombstones, self._tombstones_version = ({}, {}), None
+            return
+        messages, users = {}, {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Torn last line of a crashed write
+            if 'message_id' in entry:
+                messages[entry['message_id']] = entry['at']
+            elif 'user_id' in entry:
+                users[entry['user_id']] = max(entry['at'], users.get(entry['user_id'], 0))
+        self._tombstones, self._tombstones_version = (messages, users), version
+
+    @staticmethod
+    def _is_removed(tombstones, ts, line):
+        messages, users = tombstones
+        try:
+            msg = json.loads(line)
+        except ValueError:
+            return False
+        message_id = msg.get('message_id')
+        if message_id is not None and str(message_id) in messages:
+            return True
+        user_id = msg.get('user_id')
+        try:
+            return user_id is not None and ts <= users.get(int(user_id), -1)
+        except (TypeError, ValueError):
+            return False
+
+    def flush(self, max_bytes=None):
+        """Compress pending lines into a block and append it to the active segment"""
+        with self._write_lock:
+            with self._lock:
+                if not self._pending:
+                    return False
+                lines = self._in_flight = self._pending
+                self._pending, self._pending_bytes = [], 0
+            first_time = lines[0][0]
+            first_record = int(lines[0][1].split(b'\t', 2)[1])
+            block = zlib.compress(b''.join(entry for _, entry in lines), 6)
+
+            segment = self._segments[-1] if self._segments else None
+            if segment is None or segment.end >= self.segment_bytes:
+                segment = _Segment(first_record)
+                self._segments.append(segment)
+                self._path(segment.name, '.idx').touch()
+            offset = segment.end
+            with open(self._path(segment.name, '.seg'), 'ab') as f:
+                f.write(block)
+            # The index entry goes last: a block only exists once it is indexed
+            with open(self._path(segment.name, '.idx'), 'ab') as f:
+                f.write(INDEX_ENTRY.pack(first_time, first_record, offset, len(block), len(lines)))
+            with self._lock:
+                self._sync()
+                self._in_flight = []
+            if max_bytes:
+                self._enforce_retention(max_bytes)
+            return True
+
+    def _enforce_retention(self, max_bytes):
+        sizes = [(segment.name, segment.end) for segment in self._segments]
+        total = sum(size for _, size in sizes)
+        deleted = 0
+        for name, size in sizes[:-1]:
+            if total <= max_bytes:
+                break
+            self._path(name, '.idx').unlink(missing_ok=True)
+            self._path(name, '.seg').unlink(missing_ok=True)
+            total -= size
+            deleted += 1
+            log.info("🗑️ Deleted old archive segment", extra={'room': self.directory.name, 'segment': name})
+        if deleted and self._segments[deleted].times:
+            self._prune_tombstones(self._segments[deleted].times[0])
+
+    def _prune_tombstones(self, oldest_time):
+        """Drop tombstones that only cover messages from before `oldest_time` (which are gone)"""
+        path = self.directory / 'removed.jsonl'
+        try:
+            with open(path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+        kept = []
+        for line in lines:
+            try:
+                if json.loads(line)['at'] >= oldest_time:
+                    kept.append(line + '\n')
+            except (ValueError, KeyError):
+                continue
+        if len(kept) < len(lines):
+            tmp = path.with_suffix('.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.writelines(kept)
+            os.replace(tmp, path)
+
+    @staticmethod
+    def _blocks(segments, start, after):
+        """(segment, block index) pairs from the first block that can hold a match onwards"""
+        if after is not None:
+            keys = [segment.records[0] for segment in segments if segment.records]
+            s = max(0, bisect_right(keys, after) - 1)
+            b = max(0, bisect_right(segments[s].records, after) - 1) if segments else 0
+        elif start is not None:
+            keys = [segment.times[0] for segment in segments if segment.times]
+            s = max(0, bisect_right(keys, start) - 1)
+            b = max(0, bisect_right(segments[s].times, start) - 1) if segments else 0
+        else:
+            s = b = 0
+        for segment in segments[s:]:
+            for block in range(b, len(segment.records)):
+                yield segment, block
+            b = 0
+
+    def query(self, start=None, end=None, after=None, limit=None):
+        """
+        Yield (time, record, json bytes) in order, for records with
+        start <= time <= end and record > after.
+        """
+        with self._lock:
+            self._sync()
+            self._sync_tombstones()
+            segments = list(self._segments)
+            recent = self._in_flight + self._pending
+            tombstones = self._tombstones if any(self._tombstones) else None
+        found = 0
+        current, view, handle = None, None, None
+        try:
+            for segment, block in self._blocks(segments, start, after):
+                if end is not None and segment.times[block] > end:
+                    return
+                if segment is not current:
+                    if view is not None:
+                        view.close()
+                        handle.close()
+                    current = segment
+                    handle = open(self._path(segment.name, '.seg'), 'rb')
+                    view = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+                offset = segment.offsets[block]
+                try:
+                    data = zlib.decompress(view[offset:offset + segment.sizes[block]])
+                except zlib.error as e:
+                    log.warning("Skipping corrupt archive block", extra={
+                        'room': self.directory.name, 'segment': segment.name, 'block': block, 'error': str(e)
+                    })
+                    continue
+                for entry in data.splitlines():
+                    record = self._match(entry, start, end, after)
+                    if record is False:
+                        return
+                    if record is not None and not (tombstones and self._is_removed(tombstones, record[0], record[2])):
+                        yield record
+                        found += 1
+                        if limit is not None and found >= limit:
+                            return
+        except FileNotFoundError:
+            pass  # Segment deleted by retention while we were reading
+        finally:
+            if view is not None:
+                view.close()
+                handle.close()
+        last_record = segments[-1].next_record - 1 if segments and segments[-1].records else -1
+        for _, entry in recent:
+            record = self._match(entry.rstrip(b'\n'), start, end, after)
+            if record is False:
+                return
+            if record is not None and record[1] > last_record and not (
+                    tombstones and self._is_removed(tombstones, record[0], record[2])):
+                yield record
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+
+    @staticmethod
+    def _match(entry, start, end, after):
+        """(time, record, json) if the line is in range, None to skip it, False once past the end"""
+        ts, record, line = entry.split(b'\t', 2)
+        ts, record = float(ts), int(record)
+        if end is not None and ts > end:
+            return False
+        if (start is not None and ts < start) or (after is not None and record <= after):
+            return None
+        return ts, record, line
+
+    def stats(self):
+        with self._lock:
+            self._sync()
+            return {
+                'segments': len(self._segments),
+                'blocks': sum(len(segment.records) for segment in self._segments),
+                'records': sum(sum(segment.counts) for segment in self._segments) + len(self._pending),
+                'bytes': sum(segment.end for segment in self._segments)
+            }
+
+
+class ChatArchive:
+    """Per-room archives under one directory, flushed by a background thread"""
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, block_bytes=64 * 1024,
+                 flush_interval=1.0, max_bytes=None):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.block_bytes = block_bytes
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes  # Per room; oldest segments are deleted past this
+        self._rooms = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+        self._writer_lock = None  # Lock file held while this process is the writer
+        self.writable = True
+
+    def room(self, name):
+        if not ROOM_NAME.fullmatch(name or ''):
+            raise ValueError(f"Invalid archive room name {name!r}")
+        archive = self._rooms.get(name)
+        if archive is None:
+            with self._lock:
+                archive = self._rooms.get(name)
+                if archive is None:
+                    archive = self._rooms[name] = RoomArchive(self.directory / name, self.segment_bytes, self.block_bytes)
+        return archive
+
+    def append(self, room, line, ts=None):
+        """Archive one message given as a JSON string or bytes"""
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        try:
+            archive = self.room(room)
+        except ValueError:
+            log.warning("Not archiving message for invalid room name", extra={'room': room})
+            return
+        if self._thread is None:
+            self._start()
+        if not self.writable:
+            return
+        if archive.append(line, time.time() if ts is None else ts):
+            self._wake.set()
+
+    def remove(self, room, message_id=None, user_id=None):
+        """Hide a deleted message, or a banned user's messages so far, from queries"""
+        if self._thread is None:
+            self._start()
+        if not self.writable:
+            return
+        try:
+            self.room(room).remove(message_id, user_id)
+        except (ValueError, OSError) as e:
+            log.error("❌ Error recording archive removal", extra={'room': room, 'error': str(e)})
+
+    def query(self, room, start=None, end=None, after=None, limit=None):
+        return self.room(room).query(start, end, after, limit)
+
+    def flush(self):
+        for archive in list(self._rooms.values()):
+            try:
+                archive.flush(self.max_bytes)
+            except OSError as e:
+                log.error("❌ Error writing chat archive", extra={'room': archive.directory.name, 'error': str(e)})
+
+    def stats(self):
+        return {name: archive.stats() for name, archive in list(self._rooms.items())}
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                lock_path = self.directory / 'archive.lock'
+                self._writer_lock = try_lock(lock_path)
+                if self._writer_lock is None:
+                    self.writable = False
+                    log.error("❌ Chat archive is being written by another process, not archiving here",
+                              extra={'path': str(self.directory), 'owner_pid': lock_owner(lock_path)})
+                self._thread = threading.Thread(target=self._run, name="archive-flush", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the flusher and write everything still pending"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(5)
+        self.flush()
+
+
+def parse_time(value):
+    """Unix timestamp or ISO 8601 date/time (query parameter) -> Unix timestamp; None passes through"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()  # ValueError if neither
+
+
+def history_lines(archive, room, start=None, end=None, after=None, limit=None):
+    """Newline-delimited JSON for /api/history, built without re-encoding the archived messages"""
+    for ts, record, line in archive.query(room, start, end, after, limit):
+        yield b'{"archived_at":%.3f,"record":%d,"message":%s}\n' % (ts, record, line)
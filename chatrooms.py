@@ -0,0 +1,122 @@
+"""
+Kick Chat Monitor - Chatrooms
+Configured chatrooms, their per-room state and how they are sharded
+"""
+
+from message_store import MessageStore
+
+
+class ChatRoom:
+    """One monitored Kick chatroom and its message store"""
+
+    def __init__(self, slug, chatroom_id, capacity=5000):
+        self.slug = slug
+        self.chatroom_id = chatroom_id
+        self.channel = f"chatrooms.{chatroom_id}.v2"
+        self.store = MessageStore(capacity)
+        self.counters = None  # CounterStore holding this room's trigger hits as "slug/trigger"
+        self.windows = None   # WindowedCounters with the same keys, for recent hit rates
+        self.uniques = None   # UniqueCounters with the same keys, for distinct users per trigger
+        self.version = 0      # Bumped whenever this process counts or uncounts a trigger hit
+        self.pusher = None  # PusherClient carrying this room's subscription
+
+    @property
+    def trigger_counts(self):
+        """Hits per trigger name"""
+        return self.counters.items(f"{self.slug}/") if self.counters is not None else {}
+
+    @property
+    def trigger_windows(self):
+        """Recent hits per trigger name, per window (e.g. {'beef': {'10s': 0, '1m': 3, ...}})"""
+        return self.windows.items(f"{self.slug}/") if self.windows is not None else {}
+
+    @property
+    def trigger_unique_users(self):
+        """Estimated distinct users per trigger name"""
+        return self.uniques.items(f"{self.slug}/") if self.uniques is not None else {}
+
+    def count_triggers(self, names, user_id=None, at=None):
+        self.version += 1
+        for name in names:
+            key = f"{self.slug}/{name}"
+            self.counters.incr(key)
+            self.windows.add(key, at=at)
+            if user_id:
+                self.uniques.add(key, user_id)
+
+    def uncount_triggers(self, names, at=None):
+        """
+        Take back the hits of a removed message, counted at time `at`
+
+        Each window only loses the hit while it still covers `at`.
+        Distinct-user estimates can't be reduced.
+        """
+        self.version += 1
+        for name in names:
+            key = f"{self.slug}/{name}"
+            self.counters.incr(key, -1)
+            if at is not None:
+                self.windows.remove(key, at)
+
+    @property
+    def status(self):
+        if self.pusher is None:
+            return "Not assigned to this worker"
+        if self.channel in self.pusher.subscribed:
+            return f"✅ Subscribed to {self.channel}"
+        return self.pusher.status
+
+    def to_dict(self):
+        return {
+            'room': self.slug,
+            'chatroom_id': self.chatroom_id,
+            'channel': self.channel,
+            'messages_received': self.store.last_seq,
+            'messages_retained': len(self.store),
+            'trigger_counts': self.trigger_counts,
+            'trigger_windows': self.trigger_windows,
+            'trigger_unique_users': self.trigger_unique_users,
+            'connection_status': self.status
+        }
+
+
+def parse_chatrooms(spec, capacity=5000):
+    """
+    Parse a chatroom list like "sam:328681,other:12345" into ChatRooms
+
+    Each entry is `slug:chatroom_id`; entries are comma or whitespace separated.
+    """
+    rooms = []
+    seen = set()
+    for entry in spec.replace(',', ' ').split():
+        slug, sep, chatroom_id = entry.partition(':')
+        if not sep or not slug or not chatroom_id.isdigit():
+            raise ValueError(f"Invalid chatroom entry {entry!r}, expected slug:chatroom_id")
+        if slug in seen:
+            raise ValueError(f"Duplicate chatroom slug {slug!r}")
+        seen.add(slug)
+        rooms.append(ChatRoom(slug, int(chatroom_id), capacity))
+    if not rooms:
+        raise ValueError("No chatrooms configured")
+    return rooms
+
+
+def shard_rooms(rooms, shard_index=0, shard_count=1):
+    """Rooms owned by one of `shard_count` worker processes"""
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index {shard_index} out of range for {shard_count} shards")
+    return [room for n, room in enumerate(rooms) if n % shard_count == shard_index]
+
+
+def split_rooms(rooms, connections=1, max_per_connection=100):
+    """
+    Spread rooms across Pusher connections, round-robin
+
+    Uses at least `connections` sockets (if there are enough rooms) and more
+    when needed to keep each socket under `max_per_connection` subscriptions.
+    """
+    if not rooms:
+        return []
+    needed = -(-len(rooms) // max_per_connection)
+    count = max(1, min(len(rooms), max(connections, needed)))
+    return [rooms[n::count] for n in range(count)]
@@ -0,0 +1,231 @@
+"""
+Kick Chat Monitor - Counter Persistence
+Named counters kept in memory and flushed to disk in the background
+
+On disk a store is two files in its directory:
+    counters.json   snapshot, replaced atomically (write temp file + rename)
+    counters.log    append-only batches written since the snapshot
+plus counters.lock, locked by the one process allowed to write them.
+
+Every batch has an increasing id and the snapshot records the last batch it
+includes, so recovery (snapshot + replay of newer log batches) is exact even
+if the process dies between writing a snapshot and truncating the log. A
+torn final log line from a crash mid-write is cut off.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import metrics
+from file_lock import lock_owner, try_lock
+from log_config import get_logger
+
+log = get_logger('counters')
+
+write_seconds = metrics.histogram('kick_counter_write_seconds', "Time to persist one counter change or batch", ('backend',))
+write_errors = metrics.counter('kick_counter_write_errors_total', "Counter batches that failed to persist")
+
+
+def _apply(counts, batch):
+    """Apply one log batch: sets first, then increments made after them"""
+    counts.update(batch.get('set', {}))
+    for name, delta in batch.get('incr', {}).items():
+        counts[name] = counts.get(name, 0) + delta
+
+
+class CounterStore:
+    """
+    Thread-safe named counters with batched, durable persistence.
+
+    `incr()` and `set()` only touch memory. A background thread writes the
+    pending changes as one log batch every `flush_interval` seconds, or
+    sooner once `flush_every` changes are pending, and compacts the log into
+    a new snapshot after `compact_every` batches.
+    """
+
+    def __init__(self, directory, flush_interval=1.0, flush_every=500, compact_every=1000):
+        self.directory = Path(directory)
+        self.snapshot_path = self.directory / 'counters.json'
+        self.log_path = self.directory / 'counters.log'
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.compact_every = compact_every
+        self._counts = {}
+        self._durable = {}        # Counts as of the last batch written to disk
+        self._pending_incr = {}
+        self._pending_set = {}
+        self._pending_ops = 0
+        self._batch_id = 0        # Id of the last batch written
+        self._log_batches = 0     # Batches in the log since the last snapshot
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.flush_errors = 0
+        self._dir_lock = None  # Held from load() on: one writer per directory
+
+    def load(self):
+        """
+        Recover counters from disk and start the background flusher
+
+        Raises RuntimeError if another process already has the directory:
+        two writers would interleave batch ids and corrupt recovery.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lock_path = self.directory / 'counters.lock'
+        self._dir_lock = try_lock(lock_path)
+        if self._dir_lock is None:
+            raise RuntimeError(f"Counters in {self.directory} are in use by process {lock_owner(lock_path)}")
+        counts, self._batch_id, self._log_batches = self._read()
+        with self._lock:
+            self._counts = dict(counts)
+        self._durable = counts
+        log.info("📊 Loaded counters", extra={'counters': len(counts), 'batch': self._batch_id})
+        self._start()
+        return self
+
+    def _read(self):
+        """Return (counts, last batch id, log batches after the snapshot) from disk"""
+        counts, last_batch, log_batches = {}, 0, 0
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            counts, last_batch = snapshot['counts'], snapshot['batch']
+        if self.log_path.exists():
+            with open(self.log_path, 'r+b') as f:
+                valid = 0
+                for line in f:
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        # Cut the torn tail off so new batches aren't appended after it
+                        log.warning("Truncating torn counter log line", extra={'path': str(self.log_path)})
+                        f.truncate(valid)
+                        break
+                    valid += len(line)
+                    if batch['id'] <= last_batch:
+                        continue  # Already folded into the snapshot
+                    _apply(counts, batch)
+                    last_batch = batch['id']
+                    log_batches += 1
+        return counts, last_batch, log_batches
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="counter-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def incr(self, name, amount=1):
+        """Add `amount` to a counter and return the new value"""
+        with self._lock:
+            value = self._counts.get(name, 0) + amount
+            self._counts[name] = value
+            self._pending_incr[name] = self._pending_incr.get(name, 0) + amount
+            self._pending_ops += 1
+            wake = self._pending_ops >= self.flush_every
+        if wake:
+            self._wake.set()
+        return value
+
+    def set(self, name, value):
+        """Overwrite a counter (e.g. reset to 0)"""
+        with self._lock:
+            self._counts[name] = value
+            self._pending_incr.pop(name, None)
+            self._pending_set[name] = value
+            self._pending_ops += 1
+
+    def get(self, name, default=0):
+        return self._counts.get(name, default)
+
+    def items(self, prefix=''):
+        """Counters whose name starts with `prefix`, with the prefix removed"""
+        with self._lock:
+            return {name[len(prefix):]: value for name, value in self._counts.items() if name.startswith(prefix)}
+
+    def __contains__(self, name):
+        return name in self._counts
+
+    def flush(self):
+        """Write pending changes now; returns True if anything was written"""
+        with self._write_lock:
+            with self._lock:
+                if not self._pending_ops:
+                    return False
+                incr, sets = self._pending_incr, self._pending_set
+                self._pending_incr, self._pending_set, self._pending_ops = {}, {}, 0
+                self._batch_id += 1
+                batch_id = self._batch_id
+            batch = {'id': batch_id}
+            if sets:
+                batch['set'] = sets
+            if incr:
+                batch['incr'] = incr
+            start = time.perf_counter()
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(batch, separators=(',', ':')) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                # Put the changes back so the next flush retries them
+                with self._lock:
+                    for name, delta in incr.items():
+                        if name not in self._pending_set:
+                            self._pending_incr[name] = self._pending_incr.get(name, 0) + delta
+                    for name, value in sets.items():
+                        self._pending_set.setdefault(name, value)
+                    self._pending_ops += len(incr) + len(sets)
+                self.flush_errors += 1
+                write_errors.inc()
+                log.error("❌ Error writing counter log", extra={'error': str(e)})
+                return False
+            write_seconds.labels('file').observe(time.perf_counter() - start)
+            _apply(self._durable, batch)
+            self.flushes += 1
+            self._log_batches += 1
+            if self._log_batches >= self.compact_every:
+                self._compact()
+            return True
+
+    def _compact(self):
+        """Replace the snapshot with the durable counts and start a fresh log"""
+        tmp_path = self.snapshot_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'batch': self._batch_id, 'counts': self._durable}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # Safe to drop the log now: every batch in it is <= the snapshot's batch
+        open(self.log_path, 'w').close()
+        self._log_batches = 0
+        log.debug("💾 Compacted counters", extra={'batch': self._batch_id, 'counters': len(self._durable)})
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("❌ Counter flush failed")
+
+    def close(self):
+        """Stop the flusher, write everything still pending and hand the directory back"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(5)
+        self.flush()
+        if self._dir_lock is not None:
+            self._dir_lock.close()
+            self._dir_lock = None
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Kick Chat Monitor - Fake Pusher Server
+Minimal local stand-in for Kick's Pusher endpoint, for testing the ingest
+
+Usage:
+    python fake_pusher.py --port 8765 --rate 20
+    PUSHER_WS_URL=ws://localhost:8765/app/test python app.py
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+
+COMPACT = (',', ':')  # Pusher sends frames without whitespace
+
+
+def chat_frame(channel, message_id, username, user_id, content):
+    """Build a ChatMessageEvent frame the way Kick sends it (data is a JSON string)"""
+    return json.dumps({
+        "event": "App\\Events\\ChatMessageEvent",
+        "channel": channel,
+        "data": json.dumps({
+            "id": message_id,
+            "chatroom_id": int(channel.split('.')[1]) if channel.count('.') >= 2 else 0,
+            "content": content,
+            "type": "message",
+            "sender": {"id": user_id, "username": username, "slug": username.lower()}
+        }, separators=COMPACT)
+    }, separators=COMPACT)
+
+
+class FakePusherServer:
+    """Accepts Pusher clients, acknowledges subscriptions and broadcasts frames"""
+
+    def __init__(self, host='localhost', port=8765, activity_timeout=120, answer_pings=True):
+        self.host = host
+        self.port = port
+        self.activity_timeout = activity_timeout
+        self.answer_pings = answer_pings  # False simulates a silently dead connection
+        self.subscriptions = {}  # websocket -> set of channel names
+        self._server = None
+        self._socket_ids = itertools.count(1)
+
+    async def start(self):
+        self._server = await serve(self._handle, self.host, self.port)
+        # Port 0 picks a free port; report the real one
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/app/test?protocol=7"
+
+    async def _handle(self, ws):
+        self.subscriptions[ws] = set()
+        socket_id = f"{next(self._socket_ids)}.{id(ws) % 1000000}"
+        await ws.send(json.dumps({
+            "event": "pusher:connection_established",
+            "data": json.dumps({"socket_id": socket_id, "activity_timeout": self.activity_timeout})
+        }))
+        try:
+            async for frame in ws:
+                msg = json.loads(frame)
+                if msg.get('event') == 'pusher:subscribe':
+                    channel = msg['data']['channel']
+                    self.subscriptions[ws].add(channel)
+                    await ws.send(json.dumps({
+                        "event": "pusher_internal:subscription_succeeded",
+                        "channel": channel,
+                        "data": "{}"
+                    }))
+                elif msg.get('event') == 'pusher:ping' and self.answer_pings:
+                    await ws.send(json.dumps({"event": "pusher:pong", "data": "{}"}))
+        except ConnectionClosed:
+            pass
+        finally:
+            del self.subscriptions[ws]
+
+    async def broadcast(self, channel, frame):
+        """Send a raw frame to every client subscribed to `channel`"""
+        for ws, channels in list(self.subscriptions.items()):
+            if channel in channels:
+                try:
+                    await ws.send(frame)
+                except ConnectionClosed:
+                    pass
+
+    async def disconnect_all(self):
+        """Drop every client connection (simulates a server-side outage)"""
+        for ws in list(self.subscriptions):
+            await ws.close(4200, "fake outage")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local fake Pusher server")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--chatroom', type=int, default=328681)
+    parser.add_argument('--rate', type=float, default=5, help="chat messages per second")
+    args = parser.parse_args()
+
+    server = await FakePusherServer(args.host, args.port).start()
+    channel = f"chatrooms.{args.chatroom}.v2"
+    print(f"🧪 Fake Pusher listening on {server.url}")
+    print(f"   Sending {args.rate} msg/s to {channel}")
+
+    for n in itertools.count(1):
+        content = "$beef" if n % 10 == 0 else f"test message {n}"
+        await server.broadcast(channel, chat_frame(channel, f"fake-{n}", f"user{n % 50}", n % 50, content))
+        await asyncio.sleep(1 / args.rate)
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
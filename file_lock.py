@@ -0,0 +1,52 @@
+"""
+Kick Chat Monitor - File Locks
+Exclusive, non-blocking locks that mark one process as the owner of a file or directory
+
+The OS drops the lock when the owning process exits, however it exits, so
+there are no stale lock files to clean up.
+"""
+
+import os
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def try_lock(path):
+    """
+    Lock `path` (created if missing) for this process
+
+    Returns the open lock file, which must be kept open for as long as the
+    lock is needed, or None if another process holds it. The file holds the
+    owner's PID.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = open(path, 'a+')
+    try:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    return f
+
+
+def lock_owner(path):
+    """PID written by the process holding the lock on `path`, if known"""
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
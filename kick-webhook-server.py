@@ -5,160 +5,135 @@ Monitors chat messages from Kick.com using official webhooks
 """
 
 import json
-import hmac
-import hashlib
 import time
+from collections import deque
 from datetime import datetime
-from flask import Flask, request, jsonify, redirect, session, url_for
+from flask import Flask, Response, request, jsonify, redirect, session, url_for
 import threading
 import webbrowser
 from pathlib import Path
-import requests
 import secrets
 import base64
+import logging
+import os
+import metrics
+from analytics import ChatAnalytics
+from chat_archive import ChatArchive, history_lines, parse_time
+from counter_store import CounterStore
+from kick_api import KICK_API_BASE, TOKEN_ENDPOINTS, KickAPI
+from log_config import get_logger
+from rolling_counters import WindowedCounters
+from sketches import LRUCache, UniqueCounters
+from triggers import TriggerEngine, load_trigger_cooldowns, load_trigger_rules
+from webhook_events import extract
+from webhook_queue import WebhookQueue
+from webhook_signature import SignatureVerifier
+
+log = get_logger('webhook')
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(32)  # For session management
+app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024  # Webhooks are small; bigger requests get a 413
 
 # Configuration - Kick API Credentials
-CLIENT_ID = "01K49YM1DQK8CMAF1MNRQ6Z781"
-CLIENT_SECRET = "7b67c1efe2608c5050dbbe8ab8267444bbf6ac871ab4ebafe7cdbd78a6b4188f"
-WEBHOOK_SECRET = None  # This will be generated when we set up the webhook
+CLIENT_ID = os.environ.get('KICK_CLIENT_ID', "01K49YM1DQK8CMAF1MNRQ6Z781")
+CLIENT_SECRET = os.environ.get('KICK_CLIENT_SECRET', "7b67c1efe2608c5050dbbe8ab8267444bbf6ac871ab4ebafe7cdbd78a6b4188f")
+# Comma-separated; during a rotation list the new secret first and keep the old one until Kick uses the new
+WEBHOOK_SECRETS = [s.strip() for s in os.environ.get('KICK_WEBHOOK_SECRET', '').split(',') if s.strip()]
+WEBHOOK_SECRET = WEBHOOK_SECRETS[0] if WEBHOOK_SECRETS else None  # Only ever taken from the environment
+webhook_verifier = SignatureVerifier(WEBHOOK_SECRETS)
+# Explicit opt-out for local testing: accept unsigned webhooks when no secret is set
+WEBHOOK_INSECURE = os.environ.get('KICK_WEBHOOK_INSECURE') == '1'
+if not webhook_verifier.enabled:
+    if WEBHOOK_INSECURE:
+        log.warning("⚠️  KICK_WEBHOOK_SECRET not set - webhook signatures are not verified (KICK_WEBHOOK_INSECURE=1)")
+    else:
+        log.error("❌ KICK_WEBHOOK_SECRET not set - webhooks are refused with 503 until it is")
 CHANNEL_NAME = "sam"
-BEEF_COUNT_FILE = Path("beef_count.txt")
+BEEF_COUNT_FILE = Path("beef_count.txt")  # Legacy single-counter file, migrated on first start
+DATA_DIR = Path(os.environ.get('DATA_DIR', 'data'))
+BEEF_TRIGGER = "beef"  # Trigger whose count is persisted and shown on the overlay
+BEEF_KEY = f"{CHANNEL_NAME}/{BEEF_TRIGGER}"  # Counters are keyed "<channel>/<trigger>", like app.py's rooms
+# Webhooks waiting to be processed; beyond this /webhook answers 429
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', 10000))
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 2))
+# Kick redelivers webhooks it thinks failed; IDs seen this recently are dropped
+WEBHOOK_DEDUP_SIZE = int(os.environ.get('WEBHOOK_DEDUP_SIZE', 100000))
+WEBHOOK_DEDUP_TTL = float(os.environ.get('WEBHOOK_DEDUP_TTL', 900))
+ARCHIVE_MAX_MB = int(os.environ.get('ARCHIVE_MAX_MB', 1024))  # 0 turns the archive off
 
-# OAuth and API endpoints
-KICK_API_BASE = "https://api.kick.com/public/v1"
-OAUTH_TOKEN_URL = "https://id.kick.com/OAuth/token"  # Correct OAuth endpoint
-access_token = None
+# OAuth and API endpoints (KICK_TOKEN_URL / KICK_API_URL point them at e.g. a local stub)
+kick_api = KickAPI(
+    CLIENT_ID, CLIENT_SECRET,
+    token_endpoints=[os.environ['KICK_TOKEN_URL']] if os.environ.get('KICK_TOKEN_URL') else TOKEN_ENDPOINTS,
+    api_base=os.environ.get('KICK_API_URL', KICK_API_BASE),
+    cache_file=DATA_DIR / 'webhook' / 'kick_token.json'
+)
 
-# Chat monitoring state
-beef_count = 0
+# Chat monitoring state, keyed "<channel>/<trigger>"
+counters = CounterStore(DATA_DIR / 'webhook')  # Hits per trigger, flushed to disk in the background
+trigger_windows = WindowedCounters()  # Recent hits per trigger (10s/1m/5m/1h)
+trigger_users = UniqueCounters()  # Estimated distinct users per trigger
+trigger_cooldowns = load_trigger_cooldowns()
+chat_archive = ChatArchive(DATA_DIR / 'webhook' / 'archive', max_bytes=ARCHIVE_MAX_MB * 1024 * 1024) if ARCHIVE_MAX_MB > 0 else None
+trigger_engine = TriggerEngine(load_trigger_rules())
+analytics = ChatAnalytics()  # Top chatters, rates etc. per channel for /api/stats
+webhook_seen = LRUCache(WEBHOOK_DEDUP_SIZE, ttl=WEBHOOK_DEDUP_TTL)  # "event:<id>" / "message:<id>" keys
 chat_log = []
-all_chat_messages = []  # Store all chat messages for debugging
+all_chat_messages = []  # Recent WebhookEvent records (chat, follows, subs) for debugging
+unknown_events = deque(maxlen=20)  # Sampled bodies of event types without an extractor
+unknown_event_gate = LRUCache(1000, ttl=60)
+
+# Instrumentation served at /metrics
+webhook_seconds = metrics.histogram('kick_webhook_seconds', "Time to acknowledge one webhook request").labels()
+process_seconds = metrics.histogram('kick_webhook_process_seconds', "Time to process one queued webhook").labels()
+trigger_seconds = metrics.histogram('kick_trigger_check_seconds', "Time to match one message against the triggers").labels()
+webhook_messages = metrics.counter('kick_webhook_messages_total', "Chat messages received by webhook").labels()
+webhook_errors = metrics.counter('kick_webhook_errors_total', "Webhook requests that failed", ('reason',))
+webhook_unknown_events = metrics.counter('kick_webhook_unknown_events_total', "Webhooks of event types without an extractor").labels()
+webhook_duplicates = metrics.counter('kick_webhook_duplicates_total', "Redelivered webhooks dropped, by the ID that matched", ('key',))
+metrics.callback('kick_trigger_count', "Persisted trigger counts per channel",
+                 lambda: {tuple(name.split('/', 1)): value for name, value in counters.items().items() if '/' in name},
+                 ('channel', 'trigger'))
 
 def load_beef_count():
-    """Load existing beef count from file"""
-    global beef_count
-    try:
-        if BEEF_COUNT_FILE.exists():
+    """Load the trigger counters, importing the old beef_count.txt the first time"""
+    counters.load()
+    # Counters saved before they were keyed by channel all belonged to CHANNEL_NAME
+    legacy = {name: value for name, value in counters.items().items() if '/' not in name and value}
+    for name, value in legacy.items():
+        counters.set(f"{CHANNEL_NAME}/{name}", counters.get(f"{CHANNEL_NAME}/{name}") + value)
+        counters.set(name, 0)
+    if BEEF_KEY not in counters and BEEF_COUNT_FILE.exists():
+        try:
             with open(BEEF_COUNT_FILE, 'r') as f:
-                beef_count = int(f.read().strip())
-        else:
-            beef_count = 0
-    except:
-        beef_count = 0
-    print(f"📊 Loaded beef count: {beef_count}")
+                counters.set(BEEF_KEY, int(f.read().strip()))
+        except (OSError, ValueError) as e:
+            log.error("❌ Error migrating beef count", extra={'error': str(e)})
+    counters.flush()
+    log.info("📊 Loaded beef count", extra={'beef_count': counters.get(BEEF_KEY)})
 
-def save_beef_count():
-    """Save beef count to file"""
-    try:
-        with open(BEEF_COUNT_FILE, 'w') as f:
-            f.write(str(beef_count))
-        print(f"💾 Saved beef count: {beef_count}")
-    except Exception as e:
-        print(f"❌ Error saving beef count: {e}")
+def channel_triggers(channel):
+    """Counts, window counts and distinct users per trigger for one channel"""
+    prefix = f"{channel}/"
+    return {
+        'trigger_counts': counters.items(prefix),
+        'trigger_windows': trigger_windows.items(prefix),
+        'trigger_unique_users': trigger_users.items(prefix)
+    }
 
 def verify_webhook_signature(payload_body, signature_header):
     """
     Verify webhook signature from Kick
-    Based on Kick's webhook security documentation
+    `payload_body` is the raw request bytes; the header is "sha256=<hex HMAC>"
     """
-    if not WEBHOOK_SECRET:
-        print("⚠️  Warning: No webhook secret set - signatures not verified")
-        return True
-    
-    try:
-        # Extract signature from header (format: "sha256=<signature>")
-        if not signature_header.startswith('sha256='):
-            return False
-        
-        expected_signature = signature_header[7:]  # Remove "sha256=" prefix
-        
-        # Calculate expected signature
-        calculated_signature = hmac.new(
-            WEBHOOK_SECRET.encode('utf-8'),
-            payload_body.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-        
-        # Compare signatures
-        return hmac.compare_digest(calculated_signature, expected_signature)
-    
-    except Exception as e:
-        print(f"❌ Signature verification error: {e}")
-        return False
+    if not webhook_verifier.enabled:
+        return WEBHOOK_INSECURE  # Warned about once at startup
+    return webhook_verifier.verify(payload_body, signature_header)
 
 def get_client_credentials_token():
-    """Get OAuth token using client credentials flow"""
-    global access_token
-    
-    # Try multiple possible endpoints
-    possible_endpoints = [
-        "https://kick.com/api/oauth/token",
-        "https://api.kick.com/oauth/token", 
-        "https://kick.com/oauth/token",
-        "https://id.kick.com/oauth/token",
-        "https://auth.kick.com/oauth/token"
-    ]
-    
-    for endpoint_url in possible_endpoints:
-        try:
-            print(f"🔐 Trying OAuth endpoint: {endpoint_url}")
-            
-            headers = {
-                'Content-Type': 'application/x-www-form-urlencoded',
-                'Accept': 'application/json'
-            }
-            
-            data = {
-                'grant_type': 'client_credentials',
-                'client_id': CLIENT_ID,
-                'client_secret': CLIENT_SECRET
-            }
-            
-            response = requests.post(endpoint_url, headers=headers, data=data, timeout=10)
-            
-            print(f"   Response: {response.status_code}")
-            
-            if response.status_code == 200:
-                try:
-                    token_data = response.json()
-                    access_token = token_data.get('access_token')
-                    expires_in = token_data.get('expires_in', 3600)
-                    
-                    print(f"✅ OAuth token obtained from {endpoint_url}!")
-                    print(f"   Expires in {expires_in} seconds")
-                    print(f"   Token preview: {access_token[:20]}..." if access_token else "No token in response")
-                    
-                    # Update the working endpoint
-                    global OAUTH_TOKEN_URL
-                    OAUTH_TOKEN_URL = endpoint_url
-                    
-                    return access_token
-                except:
-                    print(f"   Error parsing JSON response")
-                    continue
-            elif response.status_code == 404:
-                print(f"   404 - Endpoint not found")
-                continue
-            elif response.status_code == 401:
-                print(f"   401 - Credentials might be invalid")
-                print(f"   Response: {response.text[:200]}")
-                continue
-            else:
-                print(f"   {response.status_code} - {response.text[:200]}")
-                continue
-                
-        except requests.exceptions.RequestException as e:
-            print(f"   Connection error: {e}")
-            continue
-        except Exception as e:
-            print(f"   Exception: {e}")
-            continue
-    
-    print("❌ All OAuth endpoints failed")
-    return None
+    """Get OAuth token using client credentials flow (reused until shortly before it expires)"""
+    return kick_api.token()
 
 def setup_webhook():
     """Generate webhook configuration info (webhooks must be set up in Kick Developer dashboard)"""
@@ -166,9 +141,9 @@ def setup_webhook():
     try:
         print("🔗 Generating webhook configuration...")
         
-        # Generate webhook secret for security
-        global WEBHOOK_SECRET
-        WEBHOOK_SECRET = secrets.token_hex(32)
+        # Secrets are only trusted from KICK_WEBHOOK_SECRET: this route is unauthenticated,
+        # and a secret Kick doesn't know would make every real webhook fail
+        suggested_secret = None if WEBHOOK_SECRET else secrets.token_hex(32)
         
         webhook_url_local = "http://localhost:5000/webhook"
         webhook_url_ngrok = "https://YOUR_NGROK_URL.ngrok.io/webhook"  # User needs to replace this
@@ -191,161 +166,231 @@ def setup_webhook():
         print("   - chat.message.sent events")
         print("   - follows, subscriptions, etc.")
         print()
-        print(f"🔐 Your webhook secret: {WEBHOOK_SECRET}")
-        print("   (This is stored in the server for signature verification)")
+        if suggested_secret:
+            print(f"🔐 Suggested webhook secret: {suggested_secret}")
+            print("   Enter it in the Kick dashboard, then set KICK_WEBHOOK_SECRET to it and restart")
+        else:
+            print(f"🔐 Webhook secret from KICK_WEBHOOK_SECRET: {WEBHOOK_SECRET[:8]}...")
         print("=" * 60)
         
         return True
             
     except Exception as e:
-        print(f"❌ Webhook setup exception: {e}")
+        log.exception("❌ Webhook setup exception")
         return False
 
-def check_beef_message(message_content, username):
-    """Check if message contains $beef and update counter"""
-    global beef_count
-    
-    message_lower = message_content.lower().strip()
+@trigger_seconds.time
+def check_triggers(message_content, username, channel=None, user_id=None):
+    """Match a message against every trigger and update the counters that fired"""
+    user = user_id or username
+    fired = trigger_cooldowns.filter(trigger_engine.match(message_content, channel), user, channel)
+    if not fired:
+        return fired
     
-    if message_lower.startswith('$') and 'beef' in message_lower:
-        beef_count += 1
-        save_beef_count()
-        
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = {
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    channel = channel or CHANNEL_NAME
+    for name in sorted(fired):
+        key = f"{channel}/{name}"
+        count = counters.incr(key)
+        trigger_windows.add(key)
+        trigger_users.add(key, user)
+        chat_log.append({
             'timestamp': timestamp,
+            'channel': channel,
             'username': username,
             'message': message_content,
-            'beef_count': beef_count
-        }
-        
-        chat_log.append(log_entry)
-        
-        # Keep only last 100 entries
-        if len(chat_log) > 100:
-            chat_log.pop(0)
-        
-        print(f"🥩 BEEF DETECTED! #{beef_count}")
-        print(f"   User: {username}")
-        print(f"   Message: {message_content}")
-        print(f"   Time: {timestamp}")
-        
-        return True
+            'trigger': name,
+            'count': count
+        })
     
-    return False
+    # Keep only last 100 entries
+    del chat_log[:-100]
+    
+    if BEEF_TRIGGER in fired:
+        log.info("🥩 BEEF DETECTED", extra={
+            'channel': channel, 'beef_count': counters.get(f"{channel}/{BEEF_TRIGGER}"), 'username': username
+        })
+    
+    return fired
 
-@app.route('/webhook', methods=['POST'])
-def webhook_handler():
-    """Handle incoming webhooks from Kick"""
-    global all_chat_messages
+@process_seconds.time
+def process_webhook(item):
+    """Parse one queued webhook and count/store its event (worker thread)"""
+    body, event_type = item
     
     try:
-        # Log that we received ANY webhook
-        print(f"🔗 Webhook received! Headers: {dict(request.headers)}")
-        
-        # Get raw payload for debugging
-        raw_payload = request.get_data(as_text=True)
-        print(f"📦 Raw payload: {raw_payload[:500]}...")
-        
-        # Get signature header
-        signature_header = request.headers.get('X-Kick-Signature-256', '')
-        print(f"🔐 Signature header: {signature_header[:20]}..." if signature_header else "🔐 No signature header")
-        
-        # For now, skip signature verification to test webhook delivery
-        # if not verify_webhook_signature(raw_payload, signature_header):
-        #     print("❌ Invalid webhook signature")
-        #     return jsonify({'error': 'Invalid signature'}), 401
-        
         # Parse webhook payload
-        payload = request.get_json()
-        
-        if not payload:
-            print("❌ No JSON payload received")
-            return jsonify({'error': 'No payload'}), 400
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            log.warning("❌ Webhook body is not JSON", extra={'payload': body[:500]})
+            webhook_errors.labels('invalid_json').inc()
+            return
         
-        # Log the full payload structure
-        print(f"📋 Full payload structure: {json.dumps(payload, indent=2)}")
+        if not payload or not isinstance(payload, dict):
+            log.warning("❌ No JSON payload received")
+            webhook_errors.labels('no_payload').inc()
+            return
         
-        # Log webhook event
-        event_type = payload.get('event', {}).get('type', payload.get('type', 'unknown'))
-        print(f"📨 Event type: {event_type}")
+        # Only the fields we use are kept; the payload dict is dropped here
+        event_type, event = extract(payload, event_type)
+        del payload
+        if event is None:
+            record_unknown_event(event_type, body)
+            return
         
-        # Handle ANY message event (try different payload structures)
-        message_content = None
-        username = None
-        channel = None
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        # The same chat message can arrive in more than one delivery
+        if event.message_id is not None and not webhook_seen.add(f"message:{event.message_id}"):
+            webhook_duplicates.labels('message').inc()
+            return
         
-        # Try different payload structures
-        if 'event' in payload and 'data' in payload['event']:
-            data = payload['event']['data']
-            message_content = data.get('content', data.get('message', ''))
-            username = data.get('sender', {}).get('username', data.get('username', 'Unknown'))
-            channel = data.get('chatroom', {}).get('channel', {}).get('slug', data.get('channel', 'unknown'))
-        elif 'data' in payload:
-            data = payload['data']
-            message_content = data.get('content', data.get('message', ''))
-            username = data.get('username', data.get('user', {}).get('username', 'Unknown'))
-            channel = data.get('channel', 'unknown')
-        else:
-            # Log any webhook we receive, even if structure is unexpected
-            message_content = str(payload)
-            username = 'WEBHOOK_DATA'
-            channel = 'system'
+        if event.is_chat and event.message:
+            webhook_messages.inc()
+            fired = check_triggers(event.message, event.username, event.channel, event.user_id)
+            analytics.record(event.channel, event.username, fired)
+            if chat_archive is not None:
+                chat_archive.append(event.channel, json.dumps(event.to_dict()))
         
-        # Store ALL messages for debugging
-        if message_content:
-            chat_entry = {
-                'timestamp': timestamp,
-                'username': username,
-                'message': message_content,
-                'channel': channel,
-                'event_type': event_type,
-                'full_payload': payload
-            }
-            
-            all_chat_messages.append(chat_entry)
-            
-            # Keep only last 50 messages
-            if len(all_chat_messages) > 50:
-                all_chat_messages.pop(0)
-            
-            print(f"💬 CHAT CAPTURED!")
-            print(f"   Channel: {channel}")
-            print(f"   User: {username}")
-            print(f"   Message: {message_content}")
-            print(f"   Event: {event_type}")
-            print("-" * 40)
+        # Recent events of every known type, for the dashboard and /status
+        all_chat_messages.append(event)
+        del all_chat_messages[:-50]
         
-        return jsonify({'status': 'success', 'received': True}), 200
+        log.debug("💬 Chat captured", extra={
+            'channel': event.channel, 'username': event.username, 'event_type': event_type
+        })
     
-    except Exception as e:
-        print(f"❌ Webhook error: {e}")
-        print(f"❌ Request data: {request.get_data()}")
-        return jsonify({'error': str(e)}), 500
+    except Exception:
+        log.exception("❌ Webhook error", extra={'payload': body[:500]})
+        webhook_errors.labels('exception').inc()
+
+def record_unknown_event(event_type, body):
+    """Keep a sample of event types we have no extractor for, at most one per type per minute"""
+    webhook_unknown_events.inc()
+    if unknown_event_gate.add(event_type):
+        unknown_events.append({
+            'event_type': event_type,
+            'received': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'payload': body[:1000].decode('utf-8', 'replace')
+        })
+        log.info("❔ Unhandled webhook event type", extra={'event_type': event_type})
+
+# Payloads are processed off the request thread so /webhook answers right away
+webhook_queue = WebhookQueue(process_webhook, workers=WEBHOOK_WORKERS, maxsize=WEBHOOK_QUEUE_SIZE)
+metrics.callback('kick_webhook_queue_depth', "Webhooks waiting for a worker", lambda: len(webhook_queue))
+
+@app.route('/webhook', methods=['POST'])
+@webhook_seconds.time
+def webhook_handler():
+    """Acknowledge a webhook from Kick and queue it for processing"""
+    # Get signature header
+    signature_header = request.headers.get('X-Kick-Signature-256', '')
+    
+    # Raw bytes only: parsing happens on the worker threads
+    body = request.get_data()
+    
+    # Request dumps are debug-only (and rate limited) so they cost nothing normally
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("🔗 Webhook received", extra={
+            'headers': dict(request.headers),
+            'payload': body[:500].decode('utf-8', 'replace'),
+            'signed': bool(signature_header)
+        })
+    
+    # Without a secret nothing can be verified, so nothing is accepted (unless opted out)
+    if not webhook_verifier.enabled and not WEBHOOK_INSECURE:
+        webhook_errors.labels('no_secret').inc()
+        return jsonify({'error': 'Webhook secret not configured'}), 503
+    
+    # Unsigned or forged requests are turned away before anything is parsed or queued
+    if not verify_webhook_signature(body, signature_header):
+        webhook_errors.labels('bad_signature').inc()
+        return jsonify({'error': 'Invalid signature'}), 401
+    
+    if not body:
+        webhook_errors.labels('no_payload').inc()
+        return jsonify({'error': 'No payload'}), 400
+    
+    # A redelivery is acknowledged again (so Kick stops retrying) but not processed
+    event_id = request.headers.get('Kick-Event-Message-Id')
+    if event_id and not webhook_seen.add(f"event:{event_id}"):
+        webhook_duplicates.labels('event').inc()
+        return jsonify({'status': 'duplicate', 'received': True}), 200
+    
+    # Backpressure: refuse rather than queue without bound; Kick retries later
+    if not webhook_queue.accepting or not webhook_queue.submit((body, request.headers.get('Kick-Event-Type'))):
+        if event_id:
+            webhook_seen.pop(f"event:{event_id}")  # Not processed, so the retry must be
+        if not webhook_queue.accepting:
+            webhook_errors.labels('shutting_down').inc()
+            return jsonify({'error': 'Shutting down'}), 503
+        webhook_errors.labels('queue_full').inc()
+        return jsonify({'error': 'Busy, retry later'}), 429, {'Retry-After': '1'}
+    
+    return jsonify({'status': 'success', 'received': True}), 200
 
 @app.route('/status')
 def status():
     """Get current beef count and recent activity"""
     return jsonify({
-        'beef_count': beef_count,
+        'beef_count': counters.get(BEEF_KEY),
+        **channel_triggers(CHANNEL_NAME),
+        # Every channel that has fired a trigger, CHANNEL_NAME included
+        'channels': {channel: channel_triggers(channel)
+                     for channel in sorted({name.split('/', 1)[0] for name in counters.items() if '/' in name})},
+        'trigger_cooldown_suppressed': trigger_cooldowns.suppressed,
         'channel': CHANNEL_NAME,
         'recent_activity': chat_log[-10:] if chat_log else [],
-        'all_chat_messages': all_chat_messages[-20:] if all_chat_messages else [],
+        'all_chat_messages': [event.to_dict() for event in all_chat_messages[-20:]],
+        'unknown_events': list(unknown_events),
         'webhook_secret_configured': WEBHOOK_SECRET is not None,
         'total_webhooks_received': len(all_chat_messages),
+        'webhook_queue': webhook_queue.stats(),
+        'webhook_dedup': {
+            'tracked': len(webhook_seen),
+            'evicted': webhook_seen.evictions,
+            'duplicates_dropped': {key: webhook_duplicates.labels(key).value() for key in ('event', 'message')}
+        },
         'uptime': time.time()
     })
 
+@app.route('/api/stats')
+def chat_stats():
+    """Chat analytics for one channel (see app.py /api/stats)"""
+    k = max(1, min(request.args.get('k', 10, type=int), 100))
+    return jsonify(analytics.snapshot(request.args.get('room', CHANNEL_NAME), k, request.args.get('user')))
+
+@app.route('/api/history')
+def history():
+    """Archived chat for one channel as newline-delimited JSON (see app.py /api/history)"""
+    if chat_archive is None:
+        return jsonify({'error': 'Chat archive is disabled (ARCHIVE_MAX_MB=0)'}), 404
+    try:
+        start = parse_time(request.args.get('from'))
+        end = parse_time(request.args.get('to'))
+        archive = chat_archive.room(request.args.get('room', CHANNEL_NAME))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    lines = history_lines(chat_archive, archive.directory.name, start, end,
+                          request.args.get('after', None, type=int), min(request.args.get('limit', 1000, type=int), 10000))
+    return Response(lines, mimetype='application/x-ndjson')
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/reset', methods=['POST'])
 def reset_count():
     """Reset beef counter"""
-    global beef_count, chat_log
-    beef_count = 0
+    global chat_log
+    for name in counters.items():
+        counters.set(name, 0)
+    trigger_windows.clear()
+    trigger_users.clear()
+    analytics.clear()
     chat_log = []
-    save_beef_count()
-    print("🔄 Beef count reset to 0")
-    return jsonify({'status': 'reset', 'beef_count': beef_count})
+    log.info("🔄 Beef count reset to 0")
+    return jsonify({'status': 'reset', 'beef_count': counters.get(BEEF_KEY)})
 
 @app.route('/setup-webhook', methods=['POST'])
 def setup_webhook_route():
@@ -353,7 +398,7 @@ def setup_webhook_route():
     success = setup_webhook()
     return jsonify({
         'success': success,
-        'access_token': access_token is not None,
+        'access_token': kick_api.has_token,
         'webhook_secret': WEBHOOK_SECRET[:8] + "..." if WEBHOOK_SECRET else None
     })
 
@@ -389,7 +434,7 @@ def dashboard():
             <h1>🥩 Kick Chat Monitor</h1>
             <div class="status">
                 <strong>Channel:</strong> {CHANNEL_NAME}<br>
-                <strong>OAuth Token:</strong> {"✅ Active" if access_token else "❌ Not Set"}<br>
+                <strong>OAuth Token:</strong> {"✅ Active" if kick_api.has_token else "❌ Not Set"}<br>
                 <strong>Webhook Secret:</strong> {"✅ Configured" if WEBHOOK_SECRET else "❌ Not Set"}<br>
                 <strong>Server:</strong> Running on http://localhost:5000
             </div>
@@ -405,19 +450,19 @@ def dashboard():
                 <div id="setup-status" style="margin-top: 10px; padding: 10px; border-radius: 3px; display: none;"></div>
             </div>
             
-            <div class="count">{beef_count}</div>
+            <div class="count">{counters.get(BEEF_KEY)}</div>
             <div style="text-align: center; margin-bottom: 20px;">
                 <strong>Total $beef Messages Detected</strong>
             </div>
             
             <div class="log">
                 <h3>📨 All Webhook Messages ({len(all_chat_messages)} total):</h3>
-                {''.join([f'<div class="beef-entry"><strong>{entry["timestamp"]}</strong> - <span style="color: #00aa00;">{entry["username"]}</span> [{entry["channel"]}]: {entry["message"][:100]}{"..." if len(entry["message"]) > 100 else ""} <em>({entry["event_type"]})</em></div>' for entry in all_chat_messages[-15:]]) if all_chat_messages else '<p>❌ No webhooks received yet. Check webhook configuration!</p>'}
+                {''.join([f'<div class="beef-entry"><strong>{entry.timestamp}</strong> - <span style="color: #00aa00;">{entry.username}</span> [{entry.channel}]: {entry.message[:100]}{"..." if len(entry.message) > 100 else ""} <em>({entry.event_type})</em></div>' for entry in all_chat_messages[-15:]]) if all_chat_messages else '<p>❌ No webhooks received yet. Check webhook configuration!</p>'}
             </div>
             
             <div class="log" style="margin-top: 20px;">
-                <h3>🥩 Beef Activity:</h3>
-                {''.join([f'<div class="beef-entry"><strong>{entry["timestamp"]}</strong> - {entry["username"]}: {entry["message"]} (#{entry["beef_count"]})</div>' for entry in chat_log[-10:]]) if chat_log else '<p>No beef detected yet...</p>'}
+                <h3>🥩 Trigger Activity:</h3>
+                {''.join([f'<div class="beef-entry"><strong>{entry["timestamp"]}</strong> - {entry["username"]}: {entry["message"]} ({entry["trigger"]} #{entry["count"]})</div>' for entry in chat_log[-10:]]) if chat_log else '<p>No triggers detected yet...</p>'}
             </div>
             
             <div style="text-align: center; margin-top: 20px;">
@@ -500,5 +545,5 @@ if __name__ == '__main__':
     # Open dashboard in browser
     threading.Timer(1.5, lambda: webbrowser.open('http://localhost:5000')).start()
     
-    # Start Flask server
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Start Flask server (no reloader: its parent process would write the same counter and archive files)
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
\ No newline at end of file
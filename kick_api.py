@@ -0,0 +1,184 @@
+"""
+Kick Chat Monitor - Kick API Client
+Pooled HTTP session and a cached, self-refreshing OAuth app token
+
+Every request goes through one keep-alive Session. The client-credentials
+token is kept until shortly before it expires and saved to `cache_file`, so
+a restart reuses it instead of logging in again. Refreshes are single-flight:
+one caller fetches while the others wait for (or, if the old token is still
+valid, keep using) the result. The token endpoint that worked last is tried
+first next time.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from log_config import get_logger
+
+log = get_logger('kick-api')
+
+KICK_API_BASE = "https://api.kick.com/public/v1"
+# Tried in order until one answers; the one that works is remembered
+TOKEN_ENDPOINTS = (
+    "https://id.kick.com/oauth/token",
+    "https://kick.com/api/oauth/token",
+    "https://api.kick.com/oauth/token",
+    "https://kick.com/oauth/token",
+    "https://auth.kick.com/oauth/token",
+)
+
+
+class KickAPI:
+    """Kick public API client authenticated with the client-credentials flow"""
+
+    def __init__(self, client_id, client_secret, token_endpoints=TOKEN_ENDPOINTS, api_base=KICK_API_BASE,
+                 cache_file=None, refresh_margin=300, timeout=(3.05, 10), clock=time.time):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_endpoints = list(token_endpoints)
+        self.api_base = api_base.rstrip('/')
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.refresh_margin = refresh_margin  # Refresh this many seconds before expiry
+        self.timeout = timeout  # (connect, read): a dead endpoint fails fast
+        self.clock = clock
+        self.token_url = None  # Endpoint that issued the current token
+        self.refreshes = 0
+        self._token = None
+        self._expires_at = 0.0
+        self._attempts = 0      # Finished refresh attempts, successful or not
+        self._retry_at = 0.0    # After a failed early refresh, keep the old token until then
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Accept'] = 'application/json'
+        self._load_cache()
+
+    @property
+    def has_token(self):
+        return self._token is not None and self.clock() < self._expires_at
+
+    @property
+    def expires_in(self):
+        return max(0, round(self._expires_at - self.clock())) if self._token else None
+
+    def token(self, force=False):
+        """A valid access token, refreshed first if it is close to expiry; None if no endpoint works"""
+        seen = self._attempts
+        now = self.clock()
+        if not force and self._token and now < self._expires_at - self.refresh_margin:
+            return self._token
+        if not force and self._token and now < self._expires_at:
+            # Still usable: refresh if nobody else is, otherwise keep using it
+            if now < self._retry_at or not self._lock.acquire(blocking=False):
+                return self._token
+        else:
+            self._lock.acquire()
+        try:
+            if self._attempts != seen:
+                # Another caller refreshed (or failed to) while we waited
+                return self._token if self.has_token else None
+            try:
+                return self._refresh()
+            finally:
+                self._attempts += 1
+        finally:
+            self._lock.release()
+
+    def _refresh(self):
+        endpoints = self.token_endpoints
+        if self.token_url in endpoints:
+            endpoints = [self.token_url] + [url for url in endpoints if url != self.token_url]
+        data = {
+            'grant_type': 'client_credentials',
+            'client_id': self.client_id,
+            'client_secret': self.client_secret
+        }
+        for endpoint_url in endpoints:
+            try:
+                response = self.session.post(endpoint_url, data=data, timeout=self.timeout)
+            except requests.RequestException as e:
+                log.warning("OAuth connection error", extra={'endpoint': endpoint_url, 'error': str(e)})
+                continue
+            if response.status_code != 200:
+                level = log.info if response.status_code == 404 else log.warning
+                level("OAuth request failed", extra={
+                    'endpoint': endpoint_url, 'status': response.status_code, 'body': response.text[:200]
+                })
+                continue
+            try:
+                token_data = response.json()
+                token = token_data['access_token']
+                expires_in = float(token_data.get('expires_in', 3600))
+            except (ValueError, KeyError, TypeError):
+                log.warning("OAuth response has no token", extra={'endpoint': endpoint_url})
+                continue
+            self._token = token
+            self._expires_at = self.clock() + expires_in
+            self.token_url = endpoint_url
+            self.refreshes += 1
+            self._save_cache()
+            log.info("✅ OAuth token obtained", extra={'endpoint': endpoint_url, 'expires_in': expires_in})
+            return token
+        log.error("❌ All OAuth endpoints failed")
+        self._retry_at = self.clock() + 30
+        return self._token if self.has_token else None
+
+    def request(self, method, path, **kwargs):
+        """Authenticated API call; a 401 gets one retry with a fresh token"""
+        kwargs.setdefault('timeout', self.timeout)
+        url = f"{self.api_base}/{path.lstrip('/')}"
+        for attempt in range(2):
+            token = self.token(force=attempt > 0)
+            if token is None:
+                raise requests.HTTPError("No Kick API token available")
+            response = self.session.request(method, url, headers={'Authorization': f"Bearer {token}"}, **kwargs)
+            if response.status_code != 401:
+                break
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def _load_cache(self):
+        if self.cache_file is None or not self.cache_file.exists():
+            return
+        try:
+            cached = json.loads(self.cache_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            log.warning("⚠️ Ignoring unreadable token cache", extra={'path': str(self.cache_file), 'error': str(e)})
+            return
+        if cached.get('client_id') == self.client_id and cached.get('expires_at', 0) > self.clock():
+            self._token = cached.get('access_token')
+            self._expires_at = cached['expires_at']
+            self.token_url = cached.get('token_url')
+            log.info("🔐 Reusing cached OAuth token", extra={'expires_in': self.expires_in})
+
+    def _save_cache(self):
+        if self.cache_file is None:
+            return
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_file.with_suffix('.tmp')
+            # Owner-only: the file holds a live credential
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'client_id': self.client_id,
+                    'access_token': self._token,
+                    'expires_at': self._expires_at,
+                    'token_url': self.token_url
+                }, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            log.warning("⚠️ Could not save token cache", extra={'path': str(self.cache_file), 'error': str(e)})
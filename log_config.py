@@ -0,0 +1,138 @@
+"""
+Kick Chat Monitor - Logging
+Leveled, structured logging written to stdout from a background thread
+
+Environment:
+    LOG_LEVEL          DEBUG, INFO (default), WARNING, ERROR
+    LOG_FORMAT         json or text (default: text on a terminal, json otherwise)
+    LOG_DEBUG_RATE     max DEBUG records per second per message, rest are dropped (default 5)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with `extra=` fields as top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human readable line with `extra=` fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s', '%H:%M:%S')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = ' '.join(f"{key}={value}" for key, value in record.__dict__.items() if key not in _STANDARD_ATTRS)
+        return f"{line} {fields}" if fields else line
+
+
+class DebugRateLimit(logging.Filter):
+    """
+    Token bucket per message template for DEBUG records.
+
+    INFO and above always pass. A DEBUG record that gets through after some
+    were dropped carries `suppressed=<count>`.
+    """
+
+    def __init__(self, per_second=5.0):
+        super().__init__()
+        self.per_second = per_second
+        self._buckets = {}  # template -> [tokens, last_refill, suppressed]
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.per_second <= 0:
+            return True
+        now = time.monotonic()
+        bucket = self._buckets.get(record.msg)
+        if bucket is None:
+            if len(self._buckets) > 1000:
+                self._buckets.clear()
+            bucket = self._buckets[record.msg] = [self.per_second, now, 0]
+        bucket[0] = min(self.per_second, bucket[0] + (now - bucket[1]) * self.per_second)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1
+        if bucket[2]:
+            record.suppressed = bucket[2]
+            bucket[2] = 0
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the queue is full the record is dropped"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def setup_logging(level=None, fmt=None):
+    """
+    Route the `kick` loggers through a bounded queue to a stdout writer thread
+
+    Safe to call more than once; only the first call configures anything.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+        fmt = fmt or os.environ.get('LOG_FORMAT') or ('text' if sys.stdout.isatty() else 'json')
+
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+        handler = DroppingQueueHandler(queue.Queue(10000))
+        # Filter before enqueueing so dropped debug records cost nothing downstream
+        handler.addFilter(DebugRateLimit(float(os.environ.get('LOG_DEBUG_RATE', 5))))
+
+        root = logging.getLogger('kick')
+        root.setLevel(level)
+        root.addHandler(handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(handler.queue, output)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    """Logger under the `kick` namespace, e.g. get_logger('pusher') -> kick.pusher"""
+    setup_logging()
+    return logging.getLogger(f'kick.{name}')
@@ -0,0 +1,204 @@
+"""
+Kick Chat Monitor - Message Store
+Fixed-capacity ring buffer of chat messages with monotonic sequence IDs
+"""
+
+import threading
+
+from search_index import SearchIndex, tokenize, user_key, user_keys
+
+
+class ChatMessage:
+    """Compact chat message record"""
+
+    __slots__ = ('seq', 'timestamp', 'username', 'message', 'message_id', 'user_id', 'room', 'triggers', 'counted_at')
+
+    def __init__(self, timestamp, username, message, message_id='', user_id=0, room=None):
+        self.seq = 0  # Assigned by the store on append
+        self.timestamp = timestamp
+        self.username = username
+        self.message = message
+        self.message_id = message_id
+        self.user_id = user_id
+        self.room = room
+        self.triggers = ()  # Names of the triggers this message fired
+        self.counted_at = None  # Unix time its trigger hits were counted, to take them back
+
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'timestamp': self.timestamp,
+            'username': self.username,
+            'message': self.message,
+            'message_id': self.message_id,
+            'user_id': self.user_id,
+            'room': self.room,
+            'triggers': list(self.triggers)
+        }
+
+
+class MessageStore:
+    """
+    Bounded message store.
+
+    Every appended message gets the next sequence number (starting at 1).
+    Only the newest `capacity` messages are retained; older slots are
+    overwritten in place so memory stays flat no matter how long the
+    stream runs. An inverted index of the retained messages answers
+    search() without scanning them, and finds the messages to remove when
+    a user is banned; a message_id -> sequence map finds single deletions.
+    """
+
+    def __init__(self, capacity=5000):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._lock = threading.Lock()
+        self._new_message = threading.Condition(self._lock)
+        self._last_seq = 0    # Sequence of the newest message
+        self._first_seq = 1   # Sequence of the oldest retained message
+        self.index = SearchIndex(max(64, capacity // 16))
+        self._by_message_id = {}  # Kick message_id -> sequence number, retained messages only
+        self._removed = 0         # Retained sequence numbers whose message was removed
+
+    @property
+    def last_seq(self):
+        return self._last_seq
+
+    @property
+    def oldest_seq(self):
+        """Oldest retained sequence number (last_seq + 1 when empty)"""
+        return max(self._first_seq, self._last_seq - self.capacity + 1)
+
+    def __len__(self):
+        return self._last_seq - self.oldest_seq + 1 - self._removed
+
+    def append(self, msg):
+        """Store a message and return its sequence number"""
+        words = tokenize(msg.message)  # The costly part of indexing, done before taking the lock
+        with self._lock:
+            seq = self._last_seq + 1
+            msg.seq = seq
+            evicted = self._slots[seq % self.capacity]
+            if evicted is not None:
+                if evicted.message_id:
+                    self._by_message_id.pop(str(evicted.message_id), None)
+            elif seq - self.capacity >= self._first_seq:
+                self._removed -= 1  # A removed message's slot leaves the window
+            if msg.message_id:
+                self._by_message_id[str(msg.message_id)] = seq
+            self._slots[seq % self.capacity] = msg
+            self._last_seq = seq
+            self.index.add(msg, words)
+            self.index.evict(self.oldest_seq)
+            self._new_message.notify_all()
+        return seq
+
+    def wait_for_new(self, seq, timeout=None):
+        """Block until a message newer than `seq` arrives; return False on timeout"""
+        with self._lock:
+            return self._new_message.wait_for(lambda: self._last_seq > seq, timeout)
+
+    def since(self, seq, limit=None):
+        """
+        Return (messages, last_seq, truncated) for messages newer than `seq`.
+
+        `last_seq` is the cursor to pass on the next call. `truncated` is True
+        when the cursor has fallen out of the retention window, i.e. some
+        messages after `seq` were already overwritten. Cost is proportional
+        to the number of messages returned.
+        """
+        with self._lock:
+            last = self._last_seq
+            oldest = self.oldest_seq
+            start = max(seq + 1, oldest)
+            truncated = seq + 1 < oldest and seq < last
+            if limit is not None and limit >= 0:
+                start = max(start, last - limit + 1)
+            slots = self._slots
+            cap = self.capacity
+            messages = [slots[s % cap] for s in range(start, last + 1)]
+        # Removed messages leave empty slots
+        return [msg for msg in messages if msg is not None], last, truncated
+
+    def latest(self, count):
+        """Return up to `count` of the newest messages"""
+        messages, _, _ = self.since(0, limit=count)
+        return messages
+
+    def search(self, query='', user=None, limit=50):
+        """
+        Newest retained messages containing every word of `query`, sent by
+        `user` (a user_id or username) if given; at most `limit`
+
+        Only the posting lists of the rarest term are walked, newest first,
+        and only until `limit` messages are found. The walk is set up under
+        the lock but runs outside it, so appends are not held up while
+        candidates are checked against the other terms.
+        """
+        words = tokenize(query)
+        key = user_key(user) if user else None
+        if not words and key is None:
+            return []
+        with self._lock:
+            candidates = self.index.candidates(words, key)
+            slots = self._slots
+            oldest = self.oldest_seq
+        cap = self.capacity
+        results = []
+        for seq in candidates:
+            if seq < oldest or len(results) >= limit:
+                break
+            msg = slots[seq % cap]
+            # The slot may have been reused since the copy was taken
+            if msg is None or msg.seq != seq:
+                continue
+            if key is not None and key not in user_keys(msg):
+                continue
+            if words and (len(words) > 1 or key is not None) and not words <= tokenize(msg.message):
+                continue
+            results.append(msg)
+        return results
+
+    def remove(self, message_id):
+        """Remove one retained message by its Kick message_id; return it, or None if not retained"""
+        with self._lock:
+            seq = self._by_message_id.pop(str(message_id), None)
+            if seq is None or seq < self.oldest_seq:
+                return None
+            return self._take(seq)
+
+    def remove_user(self, user_id):
+        """Remove every retained message `user_id` sent; return them, newest first"""
+        with self._lock:
+            oldest = self.oldest_seq
+            removed = []
+            for seq in self.index.candidates((), int(user_id)):
+                if seq < oldest:
+                    break
+                msg = self._take(seq)
+                if msg is not None:
+                    if msg.message_id:
+                        self._by_message_id.pop(str(msg.message_id), None)
+                    removed.append(msg)
+            return removed
+
+    def _take(self, seq):
+        # Empties the slot; the index keeps the stale entry, which search skips
+        slot = seq % self.capacity
+        msg = self._slots[slot]
+        if msg is None or msg.seq != seq:
+            return None
+        self._slots[slot] = None
+        self._removed += 1
+        return msg
+
+    def clear(self):
+        """Drop all retained messages; sequence numbers keep increasing"""
+        with self._lock:
+            self._slots = [None] * self.capacity
+            self._first_seq = self._last_seq + 1
+            self.index.clear()
+            self._by_message_id.clear()
+            self._removed = 0
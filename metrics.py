@@ -0,0 +1,242 @@
+"""
+Kick Chat Monitor - Metrics
+Always-on counters and latency histograms, exported in Prometheus text format
+
+Recording never takes a lock: every thread gets its own cell (a small list)
+per series the first time it records, and only that thread ever writes it.
+A scrape sums the cells of every thread. Once a thread has exited its cell
+is folded into the series' base totals, so servers that start a thread per
+request don't pile up cells. Histograms use fixed buckets, so memory does
+not grow with traffic.
+
+Counter names end in _total, as Prometheus expects. Values the app already
+tracks (Pusher frame counts, queue depth, trigger totals) are exported with
+callbacks evaluated at scrape time instead.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# Seconds, from per-message work (tens of microseconds) to slow HTTP requests
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Series:
+    """One label combination: per-thread cells of `size` numbers"""
+
+    __slots__ = ('size', '_local', '_cells', '_base', '_lock')
+
+    def __init__(self, size):
+        self.size = size
+        self._local = threading.local()
+        self._cells = {}           # Thread -> its cell, live threads only (after a prune)
+        self._base = [0] * size    # Totals of threads that have exited
+        self._lock = threading.Lock()
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0] * self.size
+            with self._lock:
+                self._prune()
+                self._cells[threading.current_thread()] = cell
+            return cell
+
+    def _prune(self):
+        # A thread that is no longer alive will never write its cell again
+        for thread in [thread for thread in self._cells if not thread.is_alive()]:
+            for i, value in enumerate(self._cells.pop(thread)):
+                self._base[i] += value
+
+    def totals(self):
+        with self._lock:
+            self._prune()
+            cells = [list(self._base), *self._cells.values()]
+        return [sum(column) for column in zip(*cells)]
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self.labels()  # Exported as 0 before the first event
+
+    def labels(self, *values):
+        """The series for one label combination (cache it on hot paths)"""
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}")
+            with self._lock:
+                series = self._series.get(values)
+                if series is None:
+                    series = self._series[values] = self._new_series()
+        return series
+
+    def samples(self):
+        """(suffix, labels dict, value) for every exported sample"""
+        for values, series in list(self._series.items()):
+            yield from self._samples(dict(zip(self.label_names, values)), series.totals())
+
+
+class CounterSeries(_Series):
+    __slots__ = ()
+
+    def inc(self, amount=1):
+        self.cell()[0] += amount
+
+    def value(self):
+        return self.totals()[0]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_series(self):
+        return CounterSeries(1)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _samples(self, labels, totals):
+        yield '', labels, totals[0]
+
+
+class HistogramSeries(_Series):
+    __slots__ = ('buckets',)
+
+    def __init__(self, buckets):
+        super().__init__(len(buckets) + 2)  # Sum, then one count per bucket plus +Inf
+        self.buckets = buckets
+
+    def observe(self, value):
+        cell = self.cell()
+        cell[0] += value
+        cell[bisect_left(self.buckets, value) + 1] += 1
+
+    def time(self, func):
+        """Decorator recording how long each call takes"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - start)
+        return wrapper
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labels)
+
+    def _new_series(self):
+        return HistogramSeries(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self, func):
+        return self.labels().time(func)
+
+    def _samples(self, labels, totals):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), totals[1:]):
+            cumulative += count
+            yield '_bucket', {**labels, 'le': _format(bound)}, cumulative
+        yield '_sum', labels, totals[0]
+        yield '_count', labels, cumulative
+
+
+class Callback:
+    """Metric read at scrape time: `collect()` returns a number or {label values: number}"""
+
+    def __init__(self, name, help, collect, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.label_names = tuple(labels)
+        self.kind = kind
+
+    def samples(self):
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in values.items():
+            if not isinstance(label_values, tuple):
+                label_values = (label_values,)
+            yield '', dict(zip(self.label_names, label_values)), value
+
+
+class Registry:
+    """Named metrics; registering a name twice returns the existing metric"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name, help, collect, labels=(), kind='gauge'):
+        """Replaces any earlier callback of the same name (e.g. on re-import)"""
+        with self._lock:
+            self._metrics[name] = Callback(name, help, collect, labels, kind)
+
+    def render(self):
+        """Every metric in Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                lines.append(f"# {metric.name} failed: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{metric.name}{suffix}{{{label_text}}} {_format(value)}" if label_text
+                             else f"{metric.name}{suffix} {_format(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(int(value))
+
+
+# Process-wide registry used by every module and served at /metrics
+registry = Registry()
+counter = registry.counter
+histogram = registry.histogram
+callback = registry.callback
+render = registry.render
@@ -0,0 +1,322 @@
+"""
+Kick Chat Monitor - Pusher Ingest
+Asyncio engine that owns the Pusher WebSocket connection for the process
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+
+import metrics
+from log_config import get_logger
+from pusher_decoder import FrameDecoder
+
+log = get_logger('pusher')
+
+decode_seconds = metrics.histogram('kick_pusher_decode_seconds', "Time to decode one Pusher frame, filtered or not").labels()
+
+PUSHER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+
+class PusherClient:
+    """
+    Single Pusher connection running on its own event loop thread.
+
+    Frames flow through three stages connected by bounded queues:
+
+        receive (socket) -> parse (on_event) -> store (on_record)
+
+    `on_event(event, channel, data)` gets every non-protocol frame that the
+    `decoder` lets through, with `data` still JSON-encoded, and returns a
+    record to store or None.
+    `on_record(record)` is called with each record, in order. When a queue
+    fills up the stage before it waits, so a burst slows down reads from
+    the socket instead of growing memory.
+
+    The connection is supervised: when it drops (or goes quiet for longer
+    than Pusher's activity timeout and misses a ping) it is reopened with
+    jittered exponential backoff and every channel is resubscribed. Each
+    outage is recorded with its duration and an estimate of the messages
+    missed, based on each channel's rate before the drop.
+    """
+
+    def __init__(self, url, channels, on_event, on_record, queue_size=10000,
+                 backoff_base=1.0, backoff_max=60.0, pong_timeout=30.0,
+                 decoder=None, record_file=None):
+        self.url = url
+        self.channels = list(channels)
+        self.on_event = on_event
+        self.on_record = on_record
+        self.decoder = decoder or FrameDecoder()
+        self.record_file = record_file  # Optional text file receiving every raw frame
+        self.queue_size = queue_size
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pong_timeout = pong_timeout
+        self.activity_timeout = 120.0  # Replaced by the server's value on connect
+        self.status = "Disconnected"
+        self.socket_id = None
+        self.subscribed = set()  # Channels confirmed on the current socket
+        self.frames_received = 0
+        self.parse_errors = 0
+        self.reconnects = 0
+        self.outages = deque(maxlen=50)  # Most recent completed outages
+        self._outage = None              # Outage in progress
+        self._channel_events = Counter() # Records per channel on the current socket
+        self._connected_at = None
+        self._last_activity = 0.0
+        self._disconnect_reason = None
+        self._queues = ()                # Stage queues of the current socket
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loop = None
+        self._stop = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the connection thread; returns False if it is already running"""
+        with self._lock:
+            if self.running:
+                return False
+            self.status = "🔌 Connecting..."
+            self._loop = asyncio.new_event_loop()
+            self._stop = asyncio.Event()
+            self._thread = threading.Thread(target=self._run, name="pusher-ingest", daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self, timeout=5):
+        """Close the connection and wait for the ingest thread to finish"""
+        with self._lock:
+            thread, loop = self._thread, self._loop
+            if thread is None:
+                return
+            try:
+                loop.call_soon_threadsafe(self._stop.set)
+            except RuntimeError:
+                pass  # Loop already finished on its own
+            self._thread = None
+        thread.join(timeout)
+        self.status = "❌ Disconnected"
+        self.subscribed = set()
+
+    def _run(self):
+        loop = self._loop
+        try:
+            loop.run_until_complete(self._main())
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    async def _main(self):
+        attempt = 0
+        while not self._stop.is_set():
+            self._disconnect_reason = None
+            established = await self._connect_once()
+            if self._stop.is_set():
+                break
+            self._begin_outage(self._disconnect_reason or "connection closed")
+            
+            # A connection that got as far as subscribing resets the backoff
+            attempt = 0 if established else attempt + 1
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            self.status = f"🔄 Reconnecting in {delay:.1f}s (attempt {attempt + 1})"
+            log.info("🔄 Pusher reconnecting", extra={'delay': round(delay, 2), 'attempt': attempt + 1})
+            try:
+                await asyncio.wait_for(self._stop.wait(), delay)
+            except asyncio.TimeoutError:
+                self.reconnects += 1
+        self._outage = None
+
+    async def _connect_once(self):
+        """Run one connection until it closes; returns True if it was established"""
+        self.subscribed = set()
+        self._channel_events = Counter()
+        self._connected_at = None
+        try:
+            log.info("🔌 Connecting to Pusher", extra={'url': self.url})
+            async with connect(self.url, origin='https://kick.com',
+                               additional_headers=PUSHER_HEADERS) as ws:
+                self.status = "🔌 Connected, waiting for auth"
+                log.debug("🔌 Pusher WebSocket opened")
+                await self._pump(ws)
+        except (OSError, ConnectionClosed, asyncio.TimeoutError) as e:
+            self._disconnect_reason = self._disconnect_reason or str(e)
+            self.status = f"❌ Error: {e}"
+            log.warning("❌ Pusher WebSocket error", extra={'error': str(e)})
+        else:
+            self.status = "❌ Disconnected"
+            log.info("🔌 Pusher WebSocket closed")
+        self.subscribed = set()
+        return self._connected_at is not None
+
+    def _begin_outage(self, reason):
+        if self._outage is not None:
+            return  # Still in the same outage after a failed attempt
+        now = time.time()
+        uptime = max(1.0, now - self._connected_at) if self._connected_at else None
+        self._outage = {
+            'started': now,
+            'reason': reason,
+            # Messages per second on each channel before the drop
+            'rates': {channel: count / uptime for channel, count in self._channel_events.items()} if uptime else {}
+        }
+
+    def _end_outage(self):
+        outage, self._outage = self._outage, None
+        if outage is None:
+            return
+        duration = time.time() - outage['started']
+        missed = {channel: round(rate * duration) for channel, rate in outage['rates'].items()}
+        record = {
+            'started': datetime.fromtimestamp(outage['started']).isoformat(timespec='seconds'),
+            'duration_seconds': round(duration, 2),
+            'reason': outage['reason'],
+            'estimated_missed': sum(missed.values()),
+            'estimated_missed_by_channel': missed
+        }
+        self.outages.append(record)
+        log.info("✅ Pusher recovered", extra={'outage_seconds': record['duration_seconds'],
+                                              'estimated_missed': record['estimated_missed']})
+
+    def stats(self):
+        """Connection counters for health and metrics endpoints"""
+        return {
+            'status': self.status,
+            'running': self.running,
+            'channels': len(self.channels),
+            'subscribed': len(self.subscribed),
+            'frames_received': self.frames_received,
+            'parse_errors': self.parse_errors,
+            'frames_filtered': self.decoder.dropped,
+            'reconnects': self.reconnects,
+            'queued': sum(queue.qsize() for queue in self._queues),
+            'current_outage_seconds': round(time.time() - self._outage['started'], 2) if self._outage else None,
+            'outages': list(self.outages)
+        }
+
+    async def _pump(self, ws):
+        raw_frames = asyncio.Queue(self.queue_size)
+        records = asyncio.Queue(self.queue_size)
+        self._queues = (raw_frames, records)
+        self._last_activity = time.monotonic()
+        tasks = [
+            asyncio.create_task(self._receive(ws, raw_frames)),
+            asyncio.create_task(self._parse(ws, raw_frames, records)),
+            asyncio.create_task(self._store(records)),
+            asyncio.create_task(self._watchdog(ws)),
+        ]
+        stop_wait = asyncio.create_task(self._stop.wait())
+        try:
+            # Runs until the socket closes (store drains last) or stop() is called
+            await asyncio.wait([tasks[2], stop_wait], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks + [stop_wait]:
+                task.cancel()
+            await asyncio.gather(*tasks, stop_wait, return_exceptions=True)
+            self._queues = ()
+        # Surface a receive failure (e.g. abnormal close) to _main
+        receive = tasks[0]
+        if receive.done() and not receive.cancelled() and receive.exception():
+            raise receive.exception()
+
+    async def _receive(self, ws, raw_frames):
+        try:
+            async for frame in ws:
+                self.frames_received += 1
+                self._last_activity = time.monotonic()
+                if self.record_file is not None:
+                    self.record_file.write(frame + '\n')
+                await raw_frames.put(frame)
+        finally:
+            await raw_frames.put(None)
+
+    async def _parse(self, ws, raw_frames, records):
+        while True:
+            frame = await raw_frames.get()
+            if frame is None:
+                await records.put(None)
+                return
+            try:
+                start = time.perf_counter()
+                msg = self.decoder.decode(frame)
+                decode_seconds.observe(time.perf_counter() - start)
+                if msg is None:
+                    continue
+                event = msg.event
+                if event.startswith('pusher:') or event.startswith('pusher_internal:'):
+                    await self._handle_protocol(ws, event, msg)
+                    continue
+                record = self.on_event(event, msg.channel, msg.data)
+            except Exception as e:
+                self.parse_errors += 1
+                log.warning("❌ Error parsing Pusher message", extra={'error': str(e), 'frame': frame[:500]})
+                continue
+            if record is not None:
+                self._channel_events[msg.channel] += 1
+                await records.put(record)
+
+    async def _watchdog(self, ws):
+        """
+        Pusher keepalive: after `activity_timeout` seconds without any frame,
+        send pusher:ping; if nothing arrives within `pong_timeout`, the
+        connection is considered dead and closed so it can be reopened.
+        """
+        while True:
+            idle = time.monotonic() - self._last_activity
+            if idle < self.activity_timeout:
+                # Wake up at least every second: the timeout starts at our
+                # default and is only lowered once connection_established arrives
+                await asyncio.sleep(min(self.activity_timeout - idle, 1.0))
+                continue
+            await ws.send(json.dumps({"event": "pusher:ping", "data": {}}))
+            await asyncio.sleep(self.pong_timeout)
+            if time.monotonic() - self._last_activity >= self.activity_timeout + self.pong_timeout:
+                self._disconnect_reason = "idle timeout (no pong)"
+                log.warning("⏰ Pusher connection idle, no pong received - reconnecting")
+                await ws.close()
+                return
+
+    async def _store(self, records):
+        while True:
+            record = await records.get()
+            if record is None:
+                return
+            try:
+                self.on_record(record)
+            except Exception as e:
+                log.exception("❌ Error storing message")
+
+    async def _handle_protocol(self, ws, event, msg):
+        if event == 'pusher:connection_established':
+            connection_data = json.loads(msg.data or '{}')
+            self.socket_id = connection_data.get('socket_id')
+            self.activity_timeout = float(connection_data.get('activity_timeout') or self.activity_timeout)
+            self._connected_at = time.time()
+            self._end_outage()
+            self.status = "✅ Connected to Pusher"
+            log.info("🔌 Connected to Pusher", extra={'socket_id': self.socket_id})
+            for channel in self.channels:
+                await ws.send(json.dumps({"event": "pusher:subscribe", "data": {"channel": channel}}))
+                log.debug("📡 Subscribing to channel", extra={'channel': channel})
+        elif event == 'pusher_internal:subscription_succeeded' or event == 'pusher:subscription_succeeded':
+            channel = msg.channel
+            self.subscribed.add(channel)
+            self.status = f"✅ Subscribed to {len(self.subscribed)}/{len(self.channels)} channels"
+            log.info("✅ Subscribed to channel", extra={'channel': channel})
+        elif event == 'pusher:ping':
+            await ws.send(json.dumps({"event": "pusher:pong", "data": {}}))
+        elif event == 'pusher:error':
+            log.warning("❌ Pusher error", extra={'data': msg.data})
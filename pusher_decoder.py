@@ -0,0 +1,212 @@
+"""
+Kick Chat Monitor - Pusher Frame Decoder
+Fast path for turning raw Pusher frames into chat message records
+
+Uses msgspec or orjson when installed and falls back to the stdlib json
+module. Set PUSHER_JSON_BACKEND=json|orjson|msgspec to force one.
+"""
+
+import json
+import os
+
+from message_store import ChatMessage
+
+CHAT_MESSAGE_EVENT = 'App\\Events\\ChatMessageEvent'
+MESSAGE_DELETED_EVENT = 'App\\Events\\MessageDeletedEvent'
+USER_BANNED_EVENT = 'App\\Events\\UserBannedEvent'
+EVENT_KEY = '"event":"'
+FRAME_PREFIX = '{' + EVENT_KEY
+PREFIX_LEN = len(FRAME_PREFIX)
+
+
+class ModerationEvent:
+    """
+    A moderator removing chat: one message (`message_id`) or everything a
+    user sent (`user_id`, for bans and timeouts)
+    """
+
+    __slots__ = ('event', 'room', 'message_id', 'user_id', 'username')
+
+    def __init__(self, event, room, message_id=None, user_id=None, username=None):
+        self.event = event
+        self.room = room
+        self.message_id = message_id
+        self.user_id = user_id
+        self.username = username
+
+
+class PusherFrame:
+    """Outer Pusher envelope; `data` is still the JSON-encoded payload string"""
+
+    __slots__ = ('event', 'channel', 'data')
+
+    def __init__(self, event, channel, data):
+        self.event = event
+        self.channel = channel
+        self.data = data
+
+
+def _json_backend():
+    loads = json.loads
+
+    def decode_frame(raw):
+        msg = loads(raw)
+        return PusherFrame(msg.get('event', ''), msg.get('channel'), msg.get('data'))
+
+    def decode_chat(data):
+        msg = loads(data or '{}')
+        sender = msg.get('sender') or {}
+        return msg.get('id', ''), msg.get('content', ''), sender.get('id', 0), sender.get('username', 'Unknown')
+
+    return decode_frame, decode_chat
+
+
+def _orjson_backend():
+    import orjson
+    loads = orjson.loads
+
+    def decode_frame(raw):
+        msg = loads(raw)
+        return PusherFrame(msg.get('event', ''), msg.get('channel'), msg.get('data'))
+
+    def decode_chat(data):
+        msg = loads(data or '{}')
+        sender = msg.get('sender') or {}
+        return msg.get('id', ''), msg.get('content', ''), sender.get('id', 0), sender.get('username', 'Unknown')
+
+    return decode_frame, decode_chat
+
+
+def _msgspec_backend():
+    import msgspec
+
+    # Typed schemas let msgspec skip every field we don't read
+    class Frame(msgspec.Struct):
+        event: str = ''
+        channel: str | None = None
+        data: str | dict | None = None
+
+    # Kick sends null for some fields (e.g. content of a sticker-only message)
+    class Sender(msgspec.Struct):
+        id: int | str | None = 0
+        username: str | None = 'Unknown'
+
+    class ChatData(msgspec.Struct):
+        id: str | int | None = ''
+        content: str | None = ''
+        sender: Sender | None = msgspec.field(default_factory=Sender)
+
+    frame_decoder = msgspec.json.Decoder(Frame)
+    chat_decoder = msgspec.json.Decoder(ChatData)
+
+    def decode_frame(raw):
+        msg = frame_decoder.decode(raw)
+        return PusherFrame(msg.event, msg.channel, msg.data)
+
+    def decode_chat(data):
+        msg = chat_decoder.decode(data or '{}')
+        sender = msg.sender
+        if sender is None:
+            return msg.id, msg.content, 0, 'Unknown'
+        return msg.id, msg.content, sender.id, sender.username
+
+    return decode_frame, decode_chat
+
+
+BACKENDS = {
+    'msgspec': _msgspec_backend,
+    'orjson': _orjson_backend,
+    'json': _json_backend,
+}
+
+
+def load_backend(name=None):
+    """Return (name, decode_frame, decode_chat) for the requested or best available backend"""
+    name = name or os.environ.get('PUSHER_JSON_BACKEND')
+    if name and name not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    candidates = [name] if name else list(BACKENDS)
+    for candidate in candidates:
+        try:
+            return (candidate,) + BACKENDS[candidate]()
+        except ImportError:
+            continue
+    if name:
+        raise ValueError(f"JSON backend {name!r} is not available")
+    return ('json',) + _json_backend()
+
+
+class FrameDecoder:
+    """
+    Decodes raw Pusher frames, dropping unwanted events.
+
+    Only events listed in `events` (plus Pusher protocol events) are
+    returned; pass `events=None` to keep every frame. With the stdlib json
+    backend unwanted events are rejected by reading the event name straight
+    out of the raw text, before parsing. msgspec and orjson parse the
+    envelope faster than Python can slice the name out (the inner `data`
+    stays a string), so with those the frame is decoded first and then
+    dropped.
+    """
+
+    def __init__(self, events=None, backend=None):
+        self.backend, self._decode_frame, self._decode_chat = load_backend(backend)
+        self._events = None if events is None else frozenset(events)
+        # Compare against the event names as they appear escaped in raw JSON
+        self._wanted = None if events is None or self.backend != 'json' else {json.dumps(e)[1:-1] for e in events}
+        self.dropped = 0
+
+    def raw_event(self, raw):
+        """Event name as written in the frame, or None if it can't be found cheaply"""
+        start = raw.find(EVENT_KEY)
+        if start == -1:
+            return None
+        start += len(EVENT_KEY)
+        end = raw.find('"', start)
+        return raw[start:end] if end != -1 else None
+
+    def decode(self, raw):
+        """Return a PusherFrame, or None if the frame was filtered out"""
+        wanted = self._wanted
+        if wanted is not None and type(raw) is str:
+            # Pusher puts the event first, so this is usually a single slice
+            if raw.startswith(FRAME_PREFIX):
+                end = raw.find('"', PREFIX_LEN)
+                event = raw[PREFIX_LEN:end] if end != -1 else None
+            else:
+                event = self.raw_event(raw)
+            if event is not None and event not in wanted and not event.startswith('pusher'):
+                self.dropped += 1
+                return None
+            return self._decode_frame(raw)
+        frame = self._decode_frame(raw)
+        events = self._events
+        if events is not None and frame.event not in events and not frame.event.startswith('pusher'):
+            self.dropped += 1
+            return None
+        return frame
+
+    def decode_chat(self, data, timestamp, room=None):
+        """Decode a ChatMessageEvent payload straight into a ChatMessage; null fields get their defaults"""
+        message_id, content, user_id, username = self._decode_chat(data)
+        return ChatMessage(timestamp, username or 'Unknown', content or '', message_id or '', user_id or 0, room)
+
+    def decode_moderation(self, event, data, room=None):
+        """
+        Decode a MessageDeletedEvent or UserBannedEvent payload into a
+        ModerationEvent; None if it names no message or user
+
+        These are rare, so the stdlib parser is fine here.
+        """
+        payload = json.loads(data or '{}') if isinstance(data, (str, bytes)) else data
+        if not isinstance(payload, dict):
+            return None
+        if event == MESSAGE_DELETED_EVENT:
+            message = payload.get('message') or {}
+            message_id = message.get('id') if isinstance(message, dict) else None
+            return ModerationEvent(event, room, message_id=message_id) if message_id else None
+        user = payload.get('user') or {}
+        user_id = user.get('id') if isinstance(user, dict) else None
+        if not user_id:
+            return None
+        return ModerationEvent(event, room, user_id=user_id, username=user.get('username'))
@@ -0,0 +1,147 @@
+"""
+Kick Chat Monitor - Rolling Counters
+Sliding-window event counts ("10 $beef in the last 5 minutes") in constant memory
+
+Each window is a ring of fixed-width time buckets. Recording an event touches
+one bucket per window; a bucket is zeroed when its slot is reused for a new
+time span, so memory never grows however long the stream runs. A window's
+count covers the current, partially filled bucket plus the ones before it,
+i.e. the last (buckets - 1) to buckets full widths.
+
+EWMARate gives a smoothed events-per-second figure in two numbers per rate.
+"""
+
+import math
+import threading
+import time
+
+# (label, bucket width in seconds, number of buckets)
+DEFAULT_WINDOWS = (
+    ('10s', 1, 10),
+    ('1m', 5, 12),
+    ('5m', 10, 30),
+    ('1h', 60, 60),
+)
+
+
+class RollingCounter:
+    """Event count over the last `width * buckets` seconds"""
+
+    __slots__ = ('width', 'buckets', '_counts', '_spans')
+
+    def __init__(self, width, buckets):
+        self.width = width
+        self.buckets = buckets
+        self._counts = [0] * buckets
+        self._spans = [-1] * buckets  # Which time span each slot currently holds
+
+    def add(self, now, amount=1):
+        span = int(now // self.width)
+        slot = span % self.buckets
+        if self._spans[slot] != span:
+            self._spans[slot] = span
+            self._counts[slot] = 0
+        self._counts[slot] += amount
+
+    def remove(self, at, amount=1):
+        """Take back `amount` added at time `at`, if its bucket hasn't been reused since"""
+        span = int(at // self.width)
+        slot = span % self.buckets
+        if self._spans[slot] == span:
+            self._counts[slot] = max(0, self._counts[slot] - amount)
+
+    def total(self, now):
+        oldest = int(now // self.width) - self.buckets
+        return sum(count for count, span in zip(self._counts, self._spans) if span > oldest)
+
+    def series(self, now):
+        """Count per bucket, oldest first, ending with the current (partial) bucket"""
+        current = int(now // self.width)
+        return [self._counts[span % self.buckets] if self._spans[span % self.buckets] == span else 0
+                for span in range(current - self.buckets + 1, current + 1)]
+
+
+class EWMARate:
+    """
+    Exponentially weighted events per second, like a load average.
+
+    Events are tallied per `interval` and folded into the average once each
+    interval has passed, so recording one is just an addition. Intervals
+    older than `tau` seconds weigh 1/e as much as the newest one: tau=60
+    reacts within a minute, tau=300 smooths over bursts.
+    """
+
+    __slots__ = ('interval', '_alpha', '_rate', '_pending', '_next_tick')
+
+    def __init__(self, tau, interval=1.0):
+        self.interval = interval
+        self._alpha = 1 - math.exp(-interval / tau)
+        self._rate = 0.0
+        self._pending = 0
+        self._next_tick = None
+
+    def add(self, now, amount=1):
+        if self._next_tick is None or now >= self._next_tick:
+            self._tick(now)
+        self._pending += amount
+
+    def rate(self, now):
+        if self._next_tick is not None and now >= self._next_tick:
+            self._tick(now)
+        return self._rate
+
+    def _tick(self, now):
+        if self._next_tick is None:
+            self._next_tick = now + self.interval
+            return
+        self._rate += (self._pending / self.interval - self._rate) * self._alpha
+        self._pending = 0
+        # Intervals with no events at all only decay the rate
+        idle = int((now - self._next_tick) // self.interval)
+        if idle > 0:
+            self._rate *= (1 - self._alpha) ** idle
+        self._next_tick += (idle + 1) * self.interval
+
+
+class WindowedCounters:
+    """Thread-safe rolling counts at several window sizes for any number of named counters"""
+
+    def __init__(self, windows=DEFAULT_WINDOWS, clock=time.time):
+        self.windows = windows
+        self.clock = clock
+        self._counters = {}  # name -> [RollingCounter per window]
+        self._lock = threading.Lock()
+
+    def add(self, name, amount=1, at=None):
+        now = self.clock() if at is None else at
+        with self._lock:
+            counters = self._counters.get(name)
+            if counters is None:
+                counters = self._counters[name] = [RollingCounter(width, buckets) for _, width, buckets in self.windows]
+            for counter in counters:
+                counter.add(now, amount)
+
+    def remove(self, name, at, amount=1):
+        """Take back `amount` added at time `at` from every window that still holds it"""
+        with self._lock:
+            for counter in self._counters.get(name, ()):
+                counter.remove(at, amount)
+
+    def counts(self, name):
+        """{window label: count} for one counter"""
+        now = self.clock()
+        with self._lock:
+            counters = self._counters.get(name)
+            if counters is None:
+                return {label: 0 for label, _, _ in self.windows}
+            return {label: counter.total(now) for (label, _, _), counter in zip(self.windows, counters)}
+
+    def items(self, prefix=''):
+        """{name without prefix: {window label: count}} for counters whose name starts with `prefix`"""
+        with self._lock:
+            names = [name for name in self._counters if name.startswith(prefix)]
+        return {name[len(prefix):]: self.counts(name) for name in names}
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
@@ -0,0 +1,119 @@
+"""
+Kick Chat Monitor - Search Index
+Inverted index over the messages a MessageStore retains
+
+Every word of a message maps to the sequence numbers of the messages that
+contain it, and every user (by user_id and by lower-cased username) to the
+messages they sent. The index is split into segments covering consecutive
+sequence numbers; once the store has overwritten every message of the
+oldest segment, the whole segment is dropped. Eviction therefore never
+re-reads old messages, and at most one segment's worth of postings outlives
+the retention window.
+"""
+
+import re
+from collections import defaultdict, deque
+from itertools import chain
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Distinct lower-cased words of `text`"""
+    return set(_WORD.findall(text.lower())) if text else set()
+
+
+def user_keys(msg):
+    """Index keys for the sender of `msg`: user_id (int) and lower-cased username (str)"""
+    keys = [msg.username.lower()] if msg.username else []
+    if msg.user_id:
+        keys.append(int(msg.user_id))
+    return keys
+
+
+def user_key(user):
+    """Index key for a `user=` query: digits are a user_id, anything else a username"""
+    user = user.strip()
+    return int(user) if user.isdigit() else user.lower()
+
+
+class _Segment:
+    """Postings for sequence numbers first_seq .. first_seq + size - 1"""
+
+    __slots__ = ('first_seq', 'last_seq', 'words', 'users')
+
+    def __init__(self, first_seq):
+        self.first_seq = first_seq
+        self.last_seq = first_seq
+        self.words = defaultdict(list)  # word -> ascending sequence numbers
+        self.users = defaultdict(list)  # user key -> ascending sequence numbers
+
+
+class SearchIndex:
+    """
+    Word and user postings for one store; the store serialises access
+
+    `segment_size` trades memory (postings kept for up to that many evicted
+    messages) against how many segments a search visits.
+    """
+
+    def __init__(self, segment_size=1024):
+        self.segment_size = segment_size
+        self._segments = deque()
+
+    def add(self, msg, words=None):
+        """Index `msg`; pass `words` if it was already tokenized (e.g. outside the store's lock)"""
+        seq = msg.seq
+        segments = self._segments
+        if not segments or seq - segments[-1].first_seq >= self.segment_size:
+            segments.append(_Segment(seq))
+        segment = segments[-1]
+        segment.last_seq = seq
+        postings = segment.words
+        for word in tokenize(msg.message) if words is None else words:
+            postings[word].append(seq)
+        users = segment.users
+        for key in user_keys(msg):
+            users[key].append(seq)
+
+    def evict(self, oldest_seq):
+        """Drop segments whose messages are all older than `oldest_seq`"""
+        segments = self._segments
+        while segments and segments[0].last_seq < oldest_seq:
+            segments.popleft()
+
+    def candidates(self, words=(), user=None):
+        """
+        Sequence numbers that may match every word and the user, newest first
+
+        In each segment only the posting list of the rarest term is taken;
+        segments missing any term are skipped. The caller checks each
+        candidate message for the other terms and stops at the first one
+        older than the retention window.
+
+        Nothing is copied: the result lazily walks the chosen lists from the
+        end they had when this was called. Posting lists only ever grow, so
+        it may be consumed after the store's lock is released, and a caller
+        that stops at its limit never touches the rest.
+        """
+        if not words and user is None:
+            return iter(())
+        walks = []
+        for segment in reversed(self._segments):
+            lists = [segment.words.get(word, ()) for word in words]
+            if user is not None:
+                lists.append(segment.users.get(user, ()))
+            shortest = min(lists, key=len)
+            if shortest:
+                walks.append(reversed(shortest))
+        return chain.from_iterable(walks)
+
+    def clear(self):
+        self._segments.clear()
+
+    def stats(self):
+        return {
+            'segments': len(self._segments),
+            'words': sum(len(segment.words) for segment in self._segments),
+            'users': sum(len(segment.users) for segment in self._segments)
+        }
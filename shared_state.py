@@ -0,0 +1,526 @@
+"""
+Kick Chat Monitor - Shared State
+SQLite-backed message and counter stores that several worker processes can share
+
+With STATE_BACKEND=sqlite every gunicorn worker on the host opens the same
+database file in WAL mode, so readers never block the writer. IngestLeader
+elects the one worker that runs the Pusher connections; the rest only serve
+reads, which keeps counts identical whichever worker answers a request.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import metrics
+from file_lock import lock_owner, try_lock
+from log_config import get_logger
+from message_store import ChatMessage
+from search_index import tokenize, user_key
+from rolling_counters import DEFAULT_WINDOWS
+from sketches import HyperLogLog
+
+log = get_logger('state')
+
+# Same metric as CounterStore's file backend, under its own label
+counter_write_seconds = metrics.histogram('kick_counter_write_seconds', "Time to persist one counter change or batch",
+                                          ('backend',)).labels('sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rooms (
+    room TEXT PRIMARY KEY,
+    last_seq INTEGER NOT NULL,
+    first_seq INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    room TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp TEXT,
+    username TEXT,
+    message TEXT,
+    message_id TEXT,
+    user_id INTEGER,
+    triggers TEXT,
+    counted_at REAL,
+    PRIMARY KEY (room, seq)
+) WITHOUT ROWID;
+-- Retained sequence numbers whose message was removed by moderation (for len())
+CREATE TABLE IF NOT EXISTS removed_messages (
+    room TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (room, seq)
+) WITHOUT ROWID;
+-- Moderation: find a deleted message, or everything a banned user sent
+CREATE INDEX IF NOT EXISTS messages_by_message_id ON messages (room, message_id);
+CREATE INDEX IF NOT EXISTS messages_by_user_id ON messages (room, user_id);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS window_buckets (
+    name TEXT NOT NULL,
+    window TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    span INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (name, window, slot)
+) WITHOUT ROWID;
+-- JSON published by the ingest leader for the other workers, e.g. /api/stats
+CREATE TABLE IF NOT EXISTS snapshots (
+    name TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hll_registers (
+    name TEXT NOT NULL,
+    register INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    PRIMARY KEY (name, register)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteState:
+    """One SQLite database holding every room's messages and the trigger counters"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            # Databases created before messages recorded when their trigger hits were counted
+            if 'counted_at' not in {row[1] for row in conn.execute('PRAGMA table_info(messages)')}:
+                conn.execute('ALTER TABLE messages ADD COLUMN counted_at REAL')
+
+    def connection(self):
+        """This thread's connection (sqlite3 connections can't be shared between threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # WAL + NORMAL: commits survive a process crash, only an OS crash can lose the last few
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def message_store(self, room, capacity=5000):
+        return SQLiteMessageStore(self, room, capacity)
+
+    def counter_store(self):
+        return SQLiteCounterStore(self)
+
+    def windowed_counters(self, windows=DEFAULT_WINDOWS):
+        return SQLiteWindowedCounters(self, windows)
+
+    def unique_counters(self, precision=12):
+        return SQLiteUniqueCounters(self, precision)
+
+    def save_snapshot(self, name, data):
+        """Publish `data` (anything JSON-serialisable) under `name`, replacing the previous one"""
+        with self.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO snapshots (name, updated_at, body) VALUES (?, ?, ?)',
+                         (name, time.time(), json.dumps(data)))
+
+    def load_snapshot(self, name):
+        """(data, updated_at) last published under `name`, or (None, None)"""
+        row = self.connection().execute('SELECT body, updated_at FROM snapshots WHERE name = ?', (name,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (None, None)
+
+
+class SQLiteMessageStore:
+    """
+    MessageStore with the same interface, kept in the shared database.
+
+    Sequence numbers and the retention window behave exactly like the
+    in-memory ring buffer. Rows that fall out of the window are deleted in
+    batches. Waiters in other processes notice new messages by polling.
+    """
+
+    def __init__(self, state, room, capacity=5000, poll_interval=0.25):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.state = state
+        self.room = room
+        self.capacity = capacity
+        self.poll_interval = poll_interval
+        self._trim_every = max(1, capacity // 10)
+        self._new_message = threading.Condition()
+        with state.connection() as conn:
+            conn.execute('INSERT OR IGNORE INTO rooms (room, last_seq, first_seq) VALUES (?, 0, 1)', (room,))
+
+    def _bounds(self):
+        return self.state.connection().execute(
+            'SELECT last_seq, first_seq FROM rooms WHERE room = ?', (self.room,)
+        ).fetchone()
+
+    @property
+    def last_seq(self):
+        return self._bounds()[0]
+
+    @property
+    def oldest_seq(self):
+        """Oldest retained sequence number (last_seq + 1 when empty)"""
+        last, first = self._bounds()
+        return max(first, last - self.capacity + 1)
+
+    def __len__(self):
+        last, first = self._bounds()
+        oldest = max(first, last - self.capacity + 1)
+        removed = self.state.connection().execute(
+            'SELECT count(*) FROM removed_messages WHERE room = ? AND seq >= ?', (self.room, oldest)
+        ).fetchone()[0]
+        return last - oldest + 1 - removed
+
+    def append(self, msg):
+        """Store a message and return its sequence number"""
+        with self.state.connection() as conn:
+            seq = conn.execute(
+                'UPDATE rooms SET last_seq = last_seq + 1 WHERE room = ? RETURNING last_seq', (self.room,)
+            ).fetchone()[0]
+            msg.seq = seq
+            conn.execute(
+                'INSERT INTO messages (room, seq, timestamp, username, message, message_id, user_id, triggers, counted_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.room, seq, msg.timestamp, msg.username, msg.message, msg.message_id,
+                 msg.user_id, json.dumps(list(msg.triggers)), msg.counted_at)
+            )
+            if seq % self._trim_every == 0:
+                conn.execute('DELETE FROM messages WHERE room = ? AND seq <= ?', (self.room, seq - self.capacity))
+                conn.execute('DELETE FROM removed_messages WHERE room = ? AND seq <= ?', (self.room, seq - self.capacity))
+        with self._new_message:
+            self._new_message.notify_all()
+        return seq
+
+    def wait_for_new(self, seq, timeout=None):
+        """Block until a message newer than `seq` arrives; return False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.last_seq <= seq:
+            wait = self.poll_interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            # Woken at once by appends in this process, by polling for other processes
+            with self._new_message:
+                self._new_message.wait(wait)
+        return True
+
+    def since(self, seq, limit=None):
+        """Return (messages, last_seq, truncated) for messages newer than `seq`"""
+        last, first = self._bounds()
+        oldest = max(first, last - self.capacity + 1)
+        start = max(seq + 1, oldest)
+        truncated = seq + 1 < oldest and seq < last
+        if limit is not None and limit >= 0:
+            start = max(start, last - limit + 1)
+        rows = self.state.connection().execute(
+            'SELECT seq, timestamp, username, message, message_id, user_id, triggers FROM messages '
+            'WHERE room = ? AND seq BETWEEN ? AND ? ORDER BY seq',
+            (self.room, start, last)
+        ).fetchall()
+        messages = []
+        for seq_, timestamp, username, message, message_id, user_id, triggers in rows:
+            msg = ChatMessage(timestamp, username, message, message_id, user_id, self.room)
+            msg.seq = seq_
+            msg.triggers = tuple(json.loads(triggers))
+            messages.append(msg)
+        return messages, last, truncated
+
+    def latest(self, count):
+        """Return up to `count` of the newest messages"""
+        messages, _, _ = self.since(0, limit=count)
+        return messages
+
+    def search(self, query='', user=None, limit=50):
+        """
+        Same results as MessageStore.search, without the in-memory index
+
+        SQLite narrows the retained rows by user and by substring, newest
+        first; only rows that pass are tokenized to check for whole words.
+        """
+        words = tokenize(query)
+        key = user_key(user) if user else None
+        if not words and key is None:
+            return []
+        last, first = self._bounds()
+        sql = ('SELECT seq, timestamp, username, message, message_id, user_id, triggers FROM messages '
+               'WHERE room = ? AND seq BETWEEN ? AND ?')
+        params = [self.room, max(first, last - self.capacity + 1), last]
+        if isinstance(key, int):
+            sql += ' AND user_id = ?'
+            params.append(key)
+        elif key is not None:
+            sql += ' AND lower(username) = ?'
+            params.append(key)
+        # LIKE ignores case for ASCII only, so other words are left to tokenize()
+        for word in words:
+            if word.isascii():
+                sql += " AND message LIKE ? ESCAPE '\\'"
+                params.append('%' + word.replace('_', '\\_') + '%')
+        messages = []
+        for seq, timestamp, username, message, message_id, user_id, triggers in self.state.connection().execute(
+                sql + ' ORDER BY seq DESC', params):
+            if not words <= tokenize(message):
+                continue
+            msg = ChatMessage(timestamp, username, message, message_id, user_id, self.room)
+            msg.seq = seq
+            msg.triggers = tuple(json.loads(triggers))
+            messages.append(msg)
+            if len(messages) >= limit:
+                break
+        return messages
+
+    def remove(self, message_id):
+        """Remove one retained message by its Kick message_id; return it, or None if not retained"""
+        removed = self._remove('message_id = ?', str(message_id))
+        return removed[0] if removed else None
+
+    def remove_user(self, user_id):
+        """Remove every retained message `user_id` sent; return them, newest first"""
+        return self._remove('user_id = ?', int(user_id))
+
+    def _remove(self, condition, value):
+        with self.state.connection() as conn:
+            last, first = conn.execute(
+                'SELECT last_seq, first_seq FROM rooms WHERE room = ?', (self.room,)
+            ).fetchone()
+            rows = conn.execute(
+                'DELETE FROM messages WHERE room = ? AND seq >= ? AND ' + condition + ' '
+                'RETURNING seq, timestamp, username, message, message_id, user_id, triggers, counted_at',
+                (self.room, max(first, last - self.capacity + 1), value)
+            ).fetchall()
+            conn.executemany('INSERT OR IGNORE INTO removed_messages (room, seq) VALUES (?, ?)',
+                             [(self.room, row[0]) for row in rows])
+        messages = []
+        for seq, timestamp, username, message, message_id, user_id, triggers, counted_at in sorted(rows, reverse=True):
+            msg = ChatMessage(timestamp, username, message, message_id, user_id, self.room)
+            msg.seq = seq
+            msg.triggers = tuple(json.loads(triggers))
+            msg.counted_at = counted_at
+            messages.append(msg)
+        return messages
+
+    def clear(self):
+        """Drop all retained messages; sequence numbers keep increasing"""
+        with self.state.connection() as conn:
+            conn.execute('UPDATE rooms SET first_seq = last_seq + 1 WHERE room = ?', (self.room,))
+            conn.execute('DELETE FROM messages WHERE room = ?', (self.room,))
+            conn.execute('DELETE FROM removed_messages WHERE room = ?', (self.room,))
+
+
+class SQLiteCounterStore:
+    """CounterStore with the same interface; every change is written straight to the database"""
+
+    def __init__(self, state):
+        self.state = state
+
+    def load(self):
+        return self
+
+    def incr(self, name, amount=1):
+        """Add `amount` to a counter and return the new value"""
+        start = time.perf_counter()
+        with self.state.connection() as conn:
+            value = conn.execute(
+                'INSERT INTO counters (name, value) VALUES (?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value RETURNING value',
+                (name, amount)
+            ).fetchone()[0]
+        counter_write_seconds.observe(time.perf_counter() - start)
+        return value
+
+    def set(self, name, value):
+        """Overwrite a counter (e.g. reset to 0)"""
+        with self.state.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)', (name, value))
+
+    def get(self, name, default=0):
+        row = self.state.connection().execute('SELECT value FROM counters WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else default
+
+    def items(self, prefix=''):
+        """Counters whose name starts with `prefix`, with the prefix removed"""
+        rows = self.state.connection().execute(
+            'SELECT name, value FROM counters WHERE substr(name, 1, ?) = ?', (len(prefix), prefix)
+        ).fetchall()
+        return {name[len(prefix):]: value for name, value in rows}
+
+    def __contains__(self, name):
+        return self.state.connection().execute('SELECT 1 FROM counters WHERE name = ?', (name,)).fetchone() is not None
+
+    def flush(self):
+        return False  # Nothing is ever pending
+
+    def close(self):
+        pass
+
+
+class SQLiteWindowedCounters:
+    """WindowedCounters with the same interface; the bucket rings are rows in the database"""
+
+    def __init__(self, state, windows=DEFAULT_WINDOWS, clock=time.time):
+        self.state = state
+        self.windows = windows
+        self.clock = clock
+
+    def add(self, name, amount=1, at=None):
+        now = self.clock() if at is None else at
+        rows = []
+        for label, width, buckets in self.windows:
+            span = int(now // width)
+            rows.append((name, label, span % buckets, span, amount))
+        with self.state.connection() as conn:
+            # A slot holding an older span is reused: its count restarts
+            conn.executemany(
+                'INSERT INTO window_buckets (name, window, slot, span, count) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (name, window, slot) DO UPDATE SET '
+                'count = CASE WHEN span = excluded.span THEN count + excluded.count ELSE excluded.count END, '
+                'span = excluded.span',
+                rows
+            )
+
+    def remove(self, name, at, amount=1):
+        """Take back `amount` added at time `at` from every window that still holds it"""
+        rows = []
+        for label, width, buckets in self.windows:
+            span = int(at // width)
+            rows.append((amount, name, label, span % buckets, span))
+        with self.state.connection() as conn:
+            conn.executemany(
+                'UPDATE window_buckets SET count = max(0, count - ?) '
+                'WHERE name = ? AND window = ? AND slot = ? AND span = ?',
+                rows
+            )
+
+    def _totals(self, rows):
+        now = self.clock()
+        oldest = {label: int(now // width) - buckets for label, width, buckets in self.windows}
+        totals = {}
+        for name, label, span, count in rows:
+            counts = totals.setdefault(name, {label: 0 for label, _, _ in self.windows})
+            if label in oldest and span > oldest[label]:
+                counts[label] += count
+        return totals
+
+    def counts(self, name):
+        """{window label: count} for one counter"""
+        rows = self.state.connection().execute(
+            'SELECT name, window, span, count FROM window_buckets WHERE name = ?', (name,)
+        ).fetchall()
+        return self._totals(rows).get(name, {label: 0 for label, _, _ in self.windows})
+
+    def items(self, prefix=''):
+        """{name without prefix: {window label: count}} for counters whose name starts with `prefix`"""
+        rows = self.state.connection().execute(
+            'SELECT name, window, span, count FROM window_buckets WHERE substr(name, 1, ?) = ?', (len(prefix), prefix)
+        ).fetchall()
+        return {name[len(prefix):]: counts for name, counts in self._totals(rows).items()}
+
+    def clear(self):
+        with self.state.connection() as conn:
+            conn.execute('DELETE FROM window_buckets')
+
+
+class SQLiteUniqueCounters:
+    """UniqueCounters with the same interface; HyperLogLog registers are rows in the database"""
+
+    def __init__(self, state, precision=12):
+        self.state = state
+        self.precision = precision
+        self._known = {}  # (name, register) -> rank already written by this process
+
+    def add(self, name, item):
+        register, rank = HyperLogLog.position(item, self.precision)
+        if self._known.get((name, register), 0) >= rank:
+            return False  # Most adds end here once the sketch has warmed up
+        self._known[(name, register)] = rank
+        with self.state.connection() as conn:
+            conn.execute(
+                'INSERT INTO hll_registers (name, register, rank) VALUES (?, ?, ?) '
+                'ON CONFLICT (name, register) DO UPDATE SET rank = max(rank, excluded.rank)',
+                (name, register, rank)
+            )
+        return True
+
+    def _estimates(self, rows):
+        sketches = {}
+        for name, register, rank in rows:
+            sketches.setdefault(name, bytearray(1 << self.precision))[register] = rank
+        return {name: HyperLogLog.estimate(registers) for name, registers in sketches.items()}
+
+    def count(self, name):
+        rows = self.state.connection().execute(
+            'SELECT name, register, rank FROM hll_registers WHERE name = ?', (name,)
+        ).fetchall()
+        return self._estimates(rows).get(name, 0)
+
+    def items(self, prefix=''):
+        """{name without prefix: estimate} for counters whose name starts with `prefix`"""
+        rows = self.state.connection().execute(
+            'SELECT name, register, rank FROM hll_registers WHERE substr(name, 1, ?) = ?', (len(prefix), prefix)
+        ).fetchall()
+        return {name[len(prefix):]: estimate for name, estimate in self._estimates(rows).items()}
+
+    def clear(self):
+        self._known.clear()
+        with self.state.connection() as conn:
+            conn.execute('DELETE FROM hll_registers')
+
+
+class IngestLeader:
+    """
+    Elects the one process on the host that owns Pusher ingest.
+
+    Leadership is an exclusive lock on `path`. The OS releases it when the
+    leader exits, and a waiting process takes over on its next retry, at
+    which point `on_elected` runs in that process.
+    """
+
+    def __init__(self, path, on_elected, retry_interval=5.0):
+        self.path = Path(path)
+        self.on_elected = on_elected
+        self.retry_interval = retry_interval
+        self.is_leader = False
+        self._file = None
+        self._thread = None
+        self._closed = False
+
+    def start(self):
+        """Try to become leader now, and keep retrying in the background if not"""
+        if self._try_acquire():
+            return True
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ingest-election", daemon=True)
+            self._thread.start()
+        return False
+
+    def _try_acquire(self):
+        f = try_lock(self.path)
+        if f is None:
+            return False
+        self._file = f  # Held open for the life of the process
+        self.is_leader = True
+        log.info("👑 Elected Pusher ingest leader", extra={'pid': os.getpid()})
+        self.on_elected()
+        return True
+
+    def _run(self):
+        while not self._closed and not self._try_acquire():
+            time.sleep(self.retry_interval)
+
+    def close(self):
+        """Hand leadership to a waiting process, or stop waiting for it"""
+        self._closed = True
+        self.is_leader = False
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def owner(self):
+        """PID of the current leader, if known"""
+        return lock_owner(self.path)
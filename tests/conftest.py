@@ -0,0 +1,54 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+# The modules live flat in the repository root
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def _loader(filename, tmp_path, monkeypatch, loaded, unset=()):
+    def load(**env):
+        monkeypatch.setenv('DATA_DIR', str(tmp_path / f"data{len(loaded)}"))
+        for name in unset:
+            monkeypatch.delenv(name, raising=False)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        spec = importlib.util.spec_from_file_location(f"{Path(filename).stem.replace('-', '_')}_{len(loaded)}", ROOT / filename)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        loaded.append(module)
+        return module
+    return load
+
+
+@pytest.fixture
+def webhook_server(tmp_path, monkeypatch):
+    """Loader for a fresh kick-webhook-server.py module with its own DATA_DIR under `tmp_path`"""
+    monkeypatch.chdir(tmp_path)  # Keeps beef_count.txt and friends out of the repository
+    loaded = []
+    yield _loader('kick-webhook-server.py', tmp_path, monkeypatch, loaded,
+                  unset=('KICK_WEBHOOK_SECRET', 'KICK_WEBHOOK_INSECURE'))
+    for module in loaded:
+        module.webhook_queue.close()
+        if module.chat_archive is not None:
+            module.chat_archive.close()
+
+
+@pytest.fixture
+def chat_app(tmp_path, monkeypatch):
+    """Loader for a fresh app.py module with its own DATA_DIR under `tmp_path`"""
+    monkeypatch.chdir(tmp_path)
+    loaded = []
+    yield _loader('app.py', tmp_path, monkeypatch, loaded,
+                  unset=('STATE_BACKEND', 'KICK_CHATROOMS', 'PUSHER_WS_URL', 'TRIGGERS_FILE', 'TRIGGER_COOLDOWN'))
+    for module in loaded:
+        for client in module.pushers:
+            client.stop()
+        if module.ingest_leader is not None:
+            module.ingest_leader.close()
+        if module.chat_archive is not None:
+            module.chat_archive.close()
+        module.counters.close()
@@ -0,0 +1,50 @@
+from analytics import ChatAnalytics
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_snapshot_ranks_chatters_and_trigger_users():
+    analytics = ChatAnalytics(capacity=10, clock=Clock(600))
+    for username, triggers in [('alice', ['beef']), ('alice', ['beef', 'gg']), ('bob', ['beef']),
+                               ('alice', []), ('carol', ['gg'])]:
+        analytics.record('sam', username, triggers)
+    stats = analytics.snapshot('sam', k=2, user='bob')
+    assert stats['messages'] == 5
+    assert stats['top_chatters'] == [{'username': 'alice', 'count': 3, 'error': 0},
+                                     {'username': 'bob', 'count': 1, 'error': 0}]
+    assert [(entry['trigger'], entry['count']) for entry in stats['top_triggers']] == [('beef', 3), ('gg', 2)]
+    assert stats['top_triggers'][0]['top_users'][0] == {'username': 'alice', 'count': 2, 'error': 0}
+    assert stats['user'] == {'username': 'bob', 'messages_estimate': 1}
+
+
+def test_messages_per_minute_and_rates_follow_the_clock():
+    clock = Clock(6000)
+    analytics = ChatAnalytics(clock=clock)
+    for second in range(120):
+        clock.now = 6000 + second
+        analytics.record('sam', 'alice')
+        analytics.record('sam', 'bob')
+    clock.now = 6120
+    stats = analytics.snapshot('sam')
+    assert stats['messages_per_minute'][-3:] == [120, 120, 0]
+    assert len(stats['messages_per_minute']) == 60
+    assert 1.0 < stats['rate_per_second']['1m'] <= 2.0
+    assert stats['rate_per_second']['5m'] < stats['rate_per_second']['1m']
+
+
+def test_rooms_are_separate_and_clearable():
+    analytics = ChatAnalytics()
+    analytics.record('sam', 'alice')
+    analytics.record('other', 'bob')
+    assert sorted(analytics.rooms()) == ['other', 'sam']
+    analytics.clear('sam')
+    assert analytics.snapshot('sam')['messages'] == 0
+    assert analytics.snapshot('other')['top_chatters'][0]['username'] == 'bob'
+    analytics.clear()
+    assert analytics.rooms() == []
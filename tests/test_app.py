@@ -0,0 +1,144 @@
+import json
+import time
+
+import pytest
+
+from message_store import ChatMessage
+from pusher_decoder import MESSAGE_DELETED_EVENT, USER_BANNED_EVENT
+
+
+def chat(app, text, message_id, user_id, room='sam'):
+    msg = ChatMessage('00:00:00', f"User{user_id}", text, message_id, user_id, room)
+    msg.triggers = app.trigger_engine.match(text, room)
+    app.store_message(msg)
+    return msg
+
+
+class CountingCounters:
+    """Wraps a counter store and counts the reads beef_status_body makes"""
+
+    def __init__(self, counters):
+        self.counters = counters
+        self.reads = 0
+
+    def get(self, name, default=0):
+        self.reads += 1
+        return self.counters.get(name, default)
+
+    def __getattr__(self, name):
+        return getattr(self.counters, name)
+
+
+def test_beef_status_is_recounted_only_after_a_hit(chat_app):
+    app = chat_app()
+    client = app.app.test_client()
+    room = app.rooms[0]
+    room.counters = CountingCounters(room.counters)
+
+    first = client.get('/api/beef-status')
+    etag = first.headers['ETag']
+    for _ in range(20):
+        assert client.get('/api/beef-status', headers={'If-None-Match': etag}).status_code == 304
+    assert room.counters.reads <= 2  # Once, plus once more if a window tick passed meanwhile
+
+    chat(app, '$beef', 'm1', 1)
+    chat(app, '$beef pls', 'm2', 2)
+    response = client.get('/api/beef-status', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    body = json.loads(response.data)
+    assert (body['beef_count'], body['windows']['1m'], body['unique_users']) == (2, 2, 2)
+
+
+def test_beef_status_etag_is_stable_across_window_ticks_without_changes(chat_app):
+    app = chat_app()
+    room = app.rooms[0]
+    etag, body = app.beef_status_body(room)
+    app.beef_status_cache[room.slug] = ((room.version - 1, 0),) + app.beef_status_cache[room.slug][1:]
+    assert app.beef_status_body(room) == (etag, body)
+
+
+def test_other_workers_serve_the_leaders_published_beef_status(chat_app, tmp_path):
+    shared = dict(STATE_BACKEND='sqlite', DATA_DIR=str(tmp_path / 'shared'), PUSHER_WS_URL='ws://127.0.0.1:9/app/test')
+    leader, follower = chat_app(**shared), chat_app(**shared)
+    assert leader.ingest_leader.is_leader and not follower.ingest_leader.is_leader
+    room = follower.rooms[0]
+    room.counters = CountingCounters(room.counters)
+    chat(leader, '$beef', 'm1', 1)
+
+    client = follower.app.test_client()
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        body = json.loads(client.get('/api/beef-status').data)
+        if body['beef_count'] == 1:
+            break
+        time.sleep(0.05)
+    assert body['beef_count'] == 1 and body['unique_users'] == 1
+    assert room.counters.reads == 0
+
+
+def moderate(app, event, data, room='sam'):
+    """Feed a moderation frame through the parse and store stages like the ingest does"""
+    record = app.on_pusher_message(event, app.rooms_by_slug[room].channel, data)
+    if record is not None:
+        app.store_message(record)
+    return record
+
+
+def beef_counts(app, room='sam'):
+    room = app.rooms_by_slug[room]
+    return room.counters.get(f"{room.slug}/beef", 0), room.windows.counts(f"{room.slug}/beef")['1m']
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_deleted_message_is_removed_and_uncounted(chat_app, tmp_path, backend):
+    env = dict(STATE_BACKEND=backend, DATA_DIR=str(tmp_path / 'state'))
+    app = chat_app(**env)
+    chat(app, '$beef', 'm1', 1)
+    chat(app, '$beef', 'm2', 2)
+    chat(app, 'hello', 'm3', 3)
+    assert beef_counts(app) == (2, 2)
+
+    moderate(app, MESSAGE_DELETED_EVENT, json.dumps({'id': 'd1', 'message': {'id': 'm1'}}))
+    assert [msg.message_id for msg in app.rooms[0].store.since(0)[0]] == ['m2', 'm3']
+    assert beef_counts(app) == (1, 1)
+
+    # The decrement is what gets persisted
+    app.counters.close()
+    assert beef_counts(chat_app(**env))[0] == 1
+
+
+def test_banned_user_messages_are_removed_and_uncounted(chat_app):
+    app = chat_app()
+    chat(app, '$beef', 'm1', 1)
+    chat(app, '$beef again', 'm2', 1)
+    chat(app, '$beef', 'm3', 2)
+    moderate(app, USER_BANNED_EVENT, json.dumps({'user': {'id': 1, 'username': 'User1'}}))
+    assert [msg.message_id for msg in app.rooms[0].store.since(0)[0]] == ['m3']
+    assert beef_counts(app) == (1, 1)
+
+
+def test_unknown_ids_leave_everything_alone(chat_app):
+    app = chat_app()
+    chat(app, '$beef', 'm1', 1)
+    moderate(app, MESSAGE_DELETED_EVENT, json.dumps({'message': {'id': 'missing'}}))
+    moderate(app, USER_BANNED_EVENT, json.dumps({'user': {'id': 99, 'username': 'nobody'}}))
+    assert [msg.message_id for msg in app.rooms[0].store.since(0)[0]] == ['m1']
+    assert beef_counts(app) == (1, 1)
+
+
+def test_moderation_payloads_already_decoded_or_null(chat_app):
+    app = chat_app()
+    chat(app, '$beef', 'm1', 1)
+    chat(app, '$beef', 'm2', 2)
+    # Some relays hand the data over as an object rather than a JSON string
+    moderate(app, MESSAGE_DELETED_EVENT, {'message': {'id': 'm1'}})
+    moderate(app, USER_BANNED_EVENT, {'user': {'id': 2}})
+    assert app.rooms[0].store.since(0)[0] == []
+    assert beef_counts(app) == (0, 0)
+
+    chat(app, '$beef', 'm3', 3)
+    for event in (MESSAGE_DELETED_EVENT, USER_BANNED_EVENT):
+        for data in (None, {}, '', 'null', {'message': None, 'user': 'x'}):
+            assert moderate(app, event, data) is None
+    assert beef_counts(app) == (1, 1)
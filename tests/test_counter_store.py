@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from counter_store import CounterStore
+
+
+def open_store(directory, **kwargs):
+    # A long interval keeps the background flusher out of the way; tests flush explicitly
+    return CounterStore(directory, flush_interval=60, **kwargs).load()
+
+
+def test_counts_survive_a_restart(tmp_path):
+    store = open_store(tmp_path)
+    store.incr('sam/beef')
+    store.incr('sam/beef', 2)
+    store.set('sam/gg', 10)
+    store.incr('sam/gg')
+    store.close()
+    assert open_store(tmp_path).items('sam/') == {'beef': 3, 'gg': 11}
+
+
+def test_torn_log_line_is_cut_off(tmp_path):
+    store = open_store(tmp_path)
+    store.incr('beef', 5)
+    store.flush()
+    store.close()
+    with open(tmp_path / 'counters.log', 'a', encoding='utf-8') as f:
+        f.write('{"id":2,"incr":{"be')  # Crash mid-write
+
+    store = open_store(tmp_path)
+    assert store.get('beef') == 5
+    store.incr('beef')
+    store.close()  # Appends a batch where the torn line was
+
+    lines = (tmp_path / 'counters.log').read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)['id'] for line in lines] == [1, 2]
+    assert open_store(tmp_path).get('beef') == 6
+
+
+def test_compaction_folds_the_log_into_the_snapshot(tmp_path):
+    store = open_store(tmp_path, compact_every=3)
+    for _ in range(7):
+        store.incr('beef')
+        store.flush()
+    store.close()
+    snapshot = json.loads((tmp_path / 'counters.json').read_text(encoding='utf-8'))
+    assert snapshot == {'batch': 6, 'counts': {'beef': 6}}
+    assert len((tmp_path / 'counters.log').read_text(encoding='utf-8').splitlines()) == 1
+    assert open_store(tmp_path).get('beef') == 7
+
+
+def test_crash_between_snapshot_and_log_truncation_counts_nothing_twice(tmp_path):
+    store = open_store(tmp_path)
+    for _ in range(3):
+        store.incr('beef')
+        store.flush()
+    old_log = (tmp_path / 'counters.log').read_text(encoding='utf-8')
+    store._compact()
+    store.incr('beef')
+    store.set('gg', 4)
+    store.flush()
+    store.close()
+    # As if the process died before emptying the log: old batches precede the new one
+    new_log = (tmp_path / 'counters.log').read_text(encoding='utf-8')
+    (tmp_path / 'counters.log').write_text(old_log + new_log, encoding='utf-8')
+
+    assert open_store(tmp_path).items() == {'beef': 4, 'gg': 4}
+
+
+def test_second_writer_is_refused(tmp_path):
+    store = open_store(tmp_path)
+    with pytest.raises(RuntimeError, match='in use'):
+        open_store(tmp_path)
+    store.close()
+    open_store(tmp_path).close()
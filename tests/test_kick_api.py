@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from kick_api import KickAPI
+from token_server import TokenServer
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def server():
+    with TokenServer(delay=0.2) as server:
+        yield server
+
+
+def make_api(server, **kwargs):
+    kwargs.setdefault('token_endpoints', [f"{server.url}/oauth/token"])
+    return KickAPI('client', 'secret', api_base=f"{server.url}/public/v1", **kwargs)
+
+
+def run_concurrently(func, callers=20):
+    barrier = threading.Barrier(callers)
+    results = [None] * callers
+
+    def call(i):
+        barrier.wait()
+        results[i] = func()
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def test_concurrent_callers_share_one_refresh(server):
+    api = make_api(server)
+    assert run_concurrently(api.token) == ['token-1'] * 20
+    assert server.token_requests == ['/oauth/token']
+
+
+def test_early_refresh_does_not_block_other_callers(server):
+    clock = Clock()
+    api = make_api(server, clock=clock, refresh_margin=300)
+    assert api.token() == 'token-1'
+    clock.now += 3600 - 100  # Inside the refresh margin, not yet expired
+    results = run_concurrently(api.token)
+    assert sorted(set(results)) == ['token-1', 'token-2']
+    assert results.count('token-2') == 1  # Only the refreshing caller waited
+    assert len(server.token_requests) == 2
+    assert api.token() == 'token-2'
+
+
+def test_token_is_reused_from_the_cache_file(server, tmp_path):
+    cache_file = tmp_path / 'token.json'
+    assert make_api(server, cache_file=cache_file).token() == 'token-1'
+    restarted = make_api(server, cache_file=cache_file)
+    assert restarted.has_token
+    assert restarted.token() == 'token-1'
+    assert len(server.token_requests) == 1
+
+
+def test_working_endpoint_is_tried_first(server):
+    api = make_api(server, token_endpoints=[f"{server.url}/missing", f"{server.url}/oauth/token"])
+    assert api.token() == 'token-1'
+    assert api.token(force=True) == 'token-2'
+    assert server.token_requests == ['/missing', '/oauth/token', '/oauth/token']
+
+
+def test_request_retries_once_with_a_fresh_token_after_401(server):
+    api = make_api(server)
+    assert api.token() == 'token-1'
+    server.issued += 1  # The server revokes token-1
+    response = api.get('channels')
+    assert response.status_code == 200
+    assert response.json() == {'path': '/public/v1/channels'}
+    assert api.refreshes == 2
+
+
+def test_failed_refresh_returns_none(server):
+    api = make_api(server, token_endpoints=[f"{server.url}/missing"])
+    assert api.token() is None
+    assert run_concurrently(api.token, callers=5) == [None] * 5
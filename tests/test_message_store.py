@@ -0,0 +1,71 @@
+import random
+import threading
+
+from message_store import ChatMessage, MessageStore
+from search_index import tokenize
+
+WORDS = ['beef', 'kekw', 'gg', 'pog', 'lol', 'w', 'sam', 'hello']
+
+
+def chat(rng, i):
+    user_id = rng.randint(1, 20)
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+    return ChatMessage('00:00:00', f"User{user_id}", text, f"m{i}", user_id, 'sam')
+
+
+def brute_force(store, words, user_id=None, limit=50):
+    found = [msg for msg in reversed(store.latest(store.capacity))
+             if words <= tokenize(msg.message) and (user_id is None or msg.user_id == user_id)]
+    return found[:limit]
+
+
+def test_search_matches_a_scan_of_the_retained_messages():
+    rng = random.Random(5)
+    store = MessageStore(capacity=500)
+    for i in range(2000):
+        store.append(chat(rng, i))
+        if i % 97 == 0:
+            store.remove(f"m{rng.randint(0, i)}")
+    store.remove_user(7)
+    for query, user in [('beef', None), ('beef kekw', None), ('GG', '3'), ('', 'user4'), ('pog lol w', None)]:
+        user_id = int(user) if user and user.isdigit() else (int(user[4:]) if user else None)
+        expected = brute_force(store, tokenize(query), user_id, limit=25)
+        assert store.search(query, user, limit=25) == expected
+    assert store.search('', '7') == []
+    assert store.search('missing') == []
+
+
+def test_len_leaves_out_removed_messages():
+    store = MessageStore(capacity=10)
+    for i in range(15):
+        store.append(ChatMessage('t', 'u', 'hi', f"m{i}", i % 2 + 1, 'sam'))
+    store.remove('m14')
+    store.remove_user(1)
+    assert len(store) == len(store.latest(10)) == 5
+    for i in range(15, 25):
+        store.append(ChatMessage('t', 'u', 'hi', f"m{i}", 1, 'sam'))
+    assert len(store) == 10
+
+
+def test_search_during_appends_only_returns_retained_matches():
+    store = MessageStore(capacity=300)
+    rng = random.Random(6)
+    stop = threading.Event()
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            store.append(chat(rng, i))
+            i += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(200):
+            results = store.search('beef gg', limit=20)
+            seqs = [msg.seq for msg in results]
+            assert seqs == sorted(seqs, reverse=True)
+            assert all({'beef', 'gg'} <= tokenize(msg.message) for msg in results)
+    finally:
+        stop.set()
+        thread.join()
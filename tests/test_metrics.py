@@ -0,0 +1,51 @@
+import threading
+
+import metrics
+
+
+def run_threads(func, count, at_once=10):
+    for start in range(0, count, at_once):
+        threads = [threading.Thread(target=func) for _ in range(min(at_once, count - start))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def test_exited_threads_cells_are_folded_into_the_totals():
+    registry = metrics.Registry()
+    requests = registry.counter('test_requests_total', "Requests").labels()
+    latency = registry.histogram('test_seconds', "Latency", buckets=(0.1, 1.0)).labels()
+
+    def handle_request():
+        requests.inc()
+        latency.observe(0.5)
+
+    run_threads(handle_request, 2000)
+    assert len(requests._cells) <= 10
+    assert len(latency._cells) <= 10
+    assert requests.value() == 2000
+    assert latency.totals() == [1000.0, 0, 2000, 0]
+    assert len(requests._cells) == 0  # The scrape pruned the last batch
+
+
+def test_live_threads_keep_counting_into_their_own_cell():
+    counter = metrics.Registry().counter('test_total', "Test").labels()
+    counter.inc(5)
+    run_threads(lambda: counter.inc(2), 50)
+    counter.inc()
+    assert counter.value() == 106
+    assert list(counter._cells) == [threading.current_thread()]
+
+
+def test_render_exports_counters_histograms_and_callbacks():
+    registry = metrics.Registry()
+    registry.counter('test_events_total', "Events", ('kind',)).labels('chat').inc(3)
+    registry.histogram('test_latency_seconds', "Latency", buckets=(1.0,)).observe(0.5)
+    registry.callback('test_depth', "Depth", lambda: {('a',): 1}, ('queue',))
+    text = registry.render()
+    assert 'test_events_total{kind="chat"} 3' in text
+    assert 'test_latency_seconds_bucket{le="1.0"} 1' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 1' in text
+    assert 'test_latency_seconds_sum 0.5' in text
+    assert 'test_depth{queue="a"} 1' in text
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from fake_pusher import FakePusherServer, chat_frame
+from pusher_client import PusherClient
+
+CHANNEL = 'chatrooms.1.v2'
+
+
+class ServerThread:
+    """FakePusherServer running on its own event loop thread"""
+
+    def __init__(self, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.server = self.call(FakePusherServer(port=0, **kwargs).start())
+
+    def call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(5)
+
+    def close(self):
+        self.call(self.server.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def fake_pusher():
+    servers = []
+
+    def start(**kwargs):
+        servers.append(ServerThread(**kwargs))
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def client(fake_pusher):
+    clients = []
+
+    def start(server, **kwargs):
+        records = []
+        client = PusherClient(server.server.url, [CHANNEL],
+                              on_event=lambda event, channel, data: data,
+                              on_record=records.append,
+                              backoff_base=0.05, **kwargs)
+        client.records = records
+        client.start()
+        clients.append(client)
+        return client
+    yield start
+    for client in clients:
+        client.stop()
+
+
+def test_reconnects_and_resubscribes_after_a_drop(fake_pusher, client):
+    server = fake_pusher()
+    pusher = client(server)
+    wait_for(lambda: pusher.subscribed == {CHANNEL})
+    first_socket = pusher.socket_id
+
+    server.call(server.server.disconnect_all())
+    wait_for(lambda: pusher.reconnects == 1 and pusher.subscribed == {CHANNEL})
+    assert pusher.socket_id != first_socket
+
+    # The new socket receives frames on the resubscribed channel
+    server.call(server.server.broadcast(CHANNEL, chat_frame(CHANNEL, 'm1', 'alice', 1, 'hi')))
+    wait_for(lambda: len(pusher.records) == 1)
+
+
+def test_outage_is_recorded_with_its_duration(fake_pusher, client):
+    server = fake_pusher()
+    pusher = client(server, backoff_max=0.05)
+    wait_for(lambda: pusher.subscribed == {CHANNEL})
+    for n in range(5):
+        server.call(server.server.broadcast(CHANNEL, chat_frame(CHANNEL, f"m{n}", 'alice', 1, 'hi')))
+    wait_for(lambda: len(pusher.records) == 5)
+
+    # Keep the server down for a while so the outage has a measurable length
+    port = server.server.port
+    server.call(server.server.disconnect_all())
+    server.call(server.server.stop())
+    wait_for(lambda: pusher._outage is not None)
+    time.sleep(0.3)
+    assert pusher.stats()['current_outage_seconds'] >= 0.3
+    server.server.port = port
+    server.call(server.server.start())
+
+    wait_for(lambda: len(pusher.outages) == 1)
+    outage = pusher.outages[0]
+    assert 0.3 <= outage['duration_seconds'] < 5
+    assert outage['reason']
+    assert set(outage['estimated_missed_by_channel']) == {CHANNEL}
+    assert pusher.stats()['current_outage_seconds'] is None
+
+
+def test_missing_pong_closes_and_reopens_the_connection(fake_pusher, client):
+    server = fake_pusher(activity_timeout=0.2, answer_pings=False)
+    pusher = client(server, pong_timeout=0.2)
+    wait_for(lambda: pusher.subscribed == {CHANNEL})
+    assert pusher.activity_timeout == 0.2  # Taken from connection_established
+
+    wait_for(lambda: pusher.reconnects >= 1)
+    wait_for(lambda: pusher.outages)
+    assert pusher.outages[0]['reason'] == "idle timeout (no pong)"
+
+
+def test_answered_pings_keep_the_connection_open(fake_pusher, client):
+    server = fake_pusher(activity_timeout=0.2)
+    pusher = client(server, pong_timeout=0.2)
+    wait_for(lambda: pusher.subscribed == {CHANNEL})
+    time.sleep(1)
+    assert pusher.reconnects == 0
+    assert pusher.subscribed == {CHANNEL}
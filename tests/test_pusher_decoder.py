@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+import pusher_decoder
+from fake_pusher import COMPACT, chat_frame
+from pusher_decoder import BACKENDS, CHAT_MESSAGE_EVENT, FrameDecoder, load_backend
+
+CHANNEL = 'chatrooms.1.v2'
+OTHER_EVENT = 'App\\Events\\ChatroomUpdatedEvent'
+
+
+def available_backends():
+    names = []
+    for name in BACKENDS:
+        try:
+            load_backend(name)
+        except ValueError:
+            continue
+        names.append(name)
+    return names
+
+
+@pytest.fixture(params=available_backends())
+def backend(request):
+    return request.param
+
+
+def frame(event, data, channel=CHANNEL):
+    return json.dumps({'event': event, 'channel': channel, 'data': data}, separators=COMPACT)
+
+
+def test_chat_frame_round_trip(backend):
+    decoder = FrameDecoder({CHAT_MESSAGE_EVENT}, backend)
+    msg = decoder.decode(chat_frame(CHANNEL, 'm1', 'alice', 7, '$beef "quoted" \\ ünïcode'))
+    assert (msg.event, msg.channel) == (CHAT_MESSAGE_EVENT, CHANNEL)
+    assert isinstance(msg.data, str)  # Kick double-encodes: data is a JSON string inside the frame
+    chat = decoder.decode_chat(msg.data, '00:00:00', 'sam')
+    assert (chat.message_id, chat.username, chat.user_id, chat.message, chat.room) == \
+        ('m1', 'alice', 7, '$beef "quoted" \\ ünïcode', 'sam')
+
+
+@pytest.mark.parametrize('data', [
+    {'id': 'm1', 'content': None, 'sender': {'id': 7, 'username': 'alice'}},
+    {'id': 'm1', 'content': 'hi', 'sender': None},
+    {'id': 'm1', 'content': 'hi', 'sender': {'id': None, 'username': None}},
+    {'id': None},
+    {},
+])
+def test_null_fields_get_defaults(backend, data):
+    chat = FrameDecoder(None, backend).decode_chat(json.dumps(data), '00:00:00')
+    assert chat.message_id == (data.get('id') or '')
+    assert chat.message == ((data.get('content') if 'content' in data else '') or '')
+    sender = data.get('sender') or {}
+    assert chat.username == (sender.get('username') or 'Unknown')
+    assert chat.user_id == (sender.get('id') or 0)
+
+
+def test_empty_chat_data(backend):
+    for data in (None, ''):
+        chat = FrameDecoder(None, backend).decode_chat(data, '00:00:00')
+        assert (chat.message_id, chat.username, chat.user_id, chat.message) == ('', 'Unknown', 0, '')
+
+
+def test_unwanted_events_are_dropped_and_counted(backend):
+    decoder = FrameDecoder({CHAT_MESSAGE_EVENT}, backend)
+    assert decoder.decode(frame(OTHER_EVENT, '{"id":1}')) is None
+    assert decoder.decode(frame('pusher:ping', {})).event == 'pusher:ping'
+    assert decoder.decode(frame('pusher_internal:subscription_succeeded', '{}')) is not None
+    # The event name need not come first
+    reordered = json.dumps({'channel': CHANNEL, 'data': '{}', 'event': OTHER_EVENT}, separators=COMPACT)
+    assert decoder.decode(reordered) is None
+    assert decoder.dropped == 2
+    assert FrameDecoder(None, backend).decode(frame(OTHER_EVENT, '{}')).event == OTHER_EVENT
+
+
+def test_escaped_event_names_are_matched(backend):
+    decoder = FrameDecoder({CHAT_MESSAGE_EVENT}, backend)
+    raw = frame(CHAT_MESSAGE_EVENT, '{}')
+    assert '\\\\' in raw  # The backslashes in the name are escaped in the frame
+    assert decoder.decode(raw).event == CHAT_MESSAGE_EVENT
+    assert decoder.decode(raw.encode()).event == CHAT_MESSAGE_EVENT
+
+
+def test_raw_text_prefilter_only_for_the_stdlib_backend(backend):
+    decoder = FrameDecoder({CHAT_MESSAGE_EVENT}, backend)
+    assert (decoder._wanted is not None) == (backend == 'json')
+
+
+def test_backend_fallback_order(monkeypatch):
+    def missing():
+        raise ImportError("not installed")
+
+    monkeypatch.setattr(pusher_decoder, 'BACKENDS', {**BACKENDS, 'msgspec': missing})
+    monkeypatch.delenv('PUSHER_JSON_BACKEND', raising=False)
+    expected = 'orjson' if 'orjson' in available_backends() else 'json'
+    assert load_backend()[0] == expected
+    assert FrameDecoder().backend == expected
+
+    monkeypatch.setattr(pusher_decoder, 'BACKENDS', {'msgspec': missing, 'orjson': missing, 'json': BACKENDS['json']})
+    assert load_backend()[0] == 'json'
+    with pytest.raises(ValueError, match="not available"):
+        load_backend('msgspec')
+
+
+def test_backend_is_chosen_by_name_or_environment(monkeypatch, backend):
+    monkeypatch.setenv('PUSHER_JSON_BACKEND', backend)
+    assert load_backend()[0] == backend
+    assert load_backend('json')[0] == 'json'
+    with pytest.raises(ValueError, match="Unknown JSON backend"):
+        load_backend('simdjson')
@@ -0,0 +1,112 @@
+import pytest
+
+from rolling_counters import EWMARate, RollingCounter, WindowedCounters
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+WINDOWS = (('10s', 1, 10), ('1m', 5, 12))
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def counters(clock):
+    return WindowedCounters(WINDOWS, clock)
+
+
+def test_counts_rotate_across_bucket_boundaries(clock, counters):
+    for _ in range(3):
+        counters.add('beef')
+        clock.now += 1
+    assert counters.counts('beef') == {'10s': 3, '1m': 3}
+
+    # 1003..1009 are still inside the 10s window, 1010 drops the hit at 1000
+    clock.now = 1009.5
+    assert counters.counts('beef') == {'10s': 3, '1m': 3}
+    clock.now = 1010
+    assert counters.counts('beef') == {'10s': 2, '1m': 3}
+    clock.now = 1012
+    assert counters.counts('beef') == {'10s': 0, '1m': 3}
+
+
+def test_counts_expire_after_the_window(clock, counters):
+    counters.add('beef', 5)
+    clock.now += 60
+    assert counters.counts('beef') == {'10s': 0, '1m': 0}
+    assert counters.counts('never-added') == {'10s': 0, '1m': 0}
+
+
+def test_reused_slot_starts_from_zero():
+    counter = RollingCounter(width=1, buckets=10)
+    counter.add(1000, 4)
+    counter.add(1010)  # Same slot, ten seconds later
+    assert counter.total(1010) == 1
+    assert counter.series(1010)[-1] == 1
+
+
+def test_remove_takes_back_a_hit_in_every_window(clock, counters):
+    counters.add('beef', at=1000)
+    counters.add('beef', at=1005)
+    clock.now = 1006
+    counters.remove('beef', at=1000)
+    assert counters.counts('beef') == {'10s': 1, '1m': 1}
+    counters.remove('beef', at=1000)  # Never goes negative
+    counters.remove('missing', at=1000)
+    assert counters.counts('beef') == {'10s': 1, '1m': 1}
+
+
+def test_removing_an_expired_hit_is_a_no_op(clock, counters):
+    counters.add('beef', at=1000)
+    clock.now = 1012
+    counters.add('beef')
+    # The 10s window no longer holds 1000 and the 1m window still does
+    counters.remove('beef', at=1000)
+    assert counters.counts('beef') == {'10s': 1, '1m': 1}
+
+    # Once the slot of the expired hit is reused, newer hits in it are left alone
+    clock.now = 1070
+    counters.add('beef')
+    counters.remove('beef', at=1010)
+    assert counters.counts('beef') == {'10s': 1, '1m': 1}
+
+
+def test_series_length_and_alignment():
+    counter = RollingCounter(width=5, buckets=4)
+    counter.add(1000)         # span 200
+    counter.add(1007, 2)      # span 201
+    counter.add(1019, 3)      # span 203
+    assert counter.series(1019) == [1, 2, 0, 3]
+    assert len(counter.series(1019)) == counter.buckets
+    # One bucket later everything shifts left and the oldest falls off
+    assert counter.series(1020) == [2, 0, 3, 0]
+    assert counter.series(1040) == [0, 0, 0, 0]
+    assert sum(counter.series(1019)) == counter.total(1019)
+
+
+def test_items_strips_the_prefix(counters):
+    counters.add('trigger:sam:beef', 2)
+    counters.add('trigger:ice:beef')
+    counters.add('other')
+    assert counters.items('trigger:sam:') == {'beef': {'10s': 2, '1m': 2}}
+    counters.clear()
+    assert counters.items() == {}
+
+
+def test_ewma_rate_converges_and_decays():
+    rate = EWMARate(tau=5)
+    now = 0.0
+    for _ in range(100):
+        rate.add(now, 10)
+        now += 1
+    assert rate.rate(now) == pytest.approx(10, rel=0.01)
+    assert rate.rate(now + 30) < 0.1
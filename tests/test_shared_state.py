@@ -0,0 +1,145 @@
+import random
+import threading
+import time
+
+import pytest
+
+from message_store import ChatMessage, MessageStore
+from shared_state import IngestLeader, SQLiteState
+
+WORDS = ['beef', 'kekw', 'gg', 'pog', 'lol', 'w', 'sam', 'hello', 'wait']
+
+
+@pytest.fixture
+def state(tmp_path):
+    return SQLiteState(tmp_path / 'state.db')
+
+
+def fields(messages):
+    return [(msg.seq, msg.username, msg.message, msg.message_id, msg.user_id) for msg in messages]
+
+
+def chat(rng, i):
+    user_id = rng.randint(1, 12)
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+    return ChatMessage('00:00:00', f"User{user_id}", text, f"m{i}", user_id, 'sam')
+
+
+def assert_same(memory, sqlite):
+    assert (memory.last_seq, memory.oldest_seq, len(memory)) == (sqlite.last_seq, sqlite.oldest_seq, len(sqlite))
+    for seq in (0, memory.oldest_seq - 2, memory.oldest_seq - 1, memory.last_seq - 5, memory.last_seq):
+        for limit in (None, 3):
+            a, b = memory.since(seq, limit), sqlite.since(seq, limit)
+            assert fields(a[0]) == fields(b[0])
+            assert a[1:] == b[1:]
+    for query, user in [('beef', None), ('gg w', None), ('', '3'), ('kekw', 'user5'), ('WAIT', None)]:
+        assert fields(memory.search(query, user, limit=15)) == fields(sqlite.search(query, user, limit=15))
+
+
+def test_sqlite_message_store_matches_the_ring_buffer(state):
+    rng = random.Random(7)
+    memory, sqlite = MessageStore(capacity=60), state.message_store('sam', capacity=60)
+    for i in range(400):
+        msg = chat(rng, i)
+        copy = ChatMessage(msg.timestamp, msg.username, msg.message, msg.message_id, msg.user_id, 'sam')
+        assert memory.append(msg) == sqlite.append(copy)
+        if i % 23 == 0:
+            message_id = f"m{rng.randint(max(0, i - 80), i)}"
+            assert fields([m for m in [memory.remove(message_id)] if m]) == \
+                fields([m for m in [sqlite.remove(message_id)] if m])
+        if i % 71 == 0:
+            user_id = rng.randint(1, 12)
+            assert fields(memory.remove_user(user_id)) == fields(sqlite.remove_user(user_id))
+        if i % 50 == 0:
+            assert_same(memory, sqlite)
+    assert_same(memory, sqlite)
+    memory.clear()
+    sqlite.clear()
+    assert_same(memory, sqlite)
+    memory.append(chat(rng, 400))
+    sqlite.append(chat(rng, 400))
+    assert (len(memory), len(sqlite)) == (1, 1)
+
+
+def test_trimming_keeps_only_the_retention_window(state):
+    store = state.message_store('sam', capacity=20)
+    for i in range(105):
+        store.append(ChatMessage('t', 'u', 'hi', f"m{i}", 1, 'sam'))
+    rows = state.connection().execute('SELECT min(seq), count(*) FROM messages WHERE room = ?', ('sam',)).fetchone()
+    assert rows[0] >= 105 - 20 - store._trim_every + 1
+    assert rows[1] <= 20 + store._trim_every
+    messages, last, truncated = store.since(10)
+    assert (len(messages), last, truncated) == (20, 105, True)
+
+
+def test_rooms_are_kept_apart(state):
+    sam, other = state.message_store('sam', 10), state.message_store('other', 10)
+    sam.append(ChatMessage('t', 'a', 'beef', 'm1', 1, 'sam'))
+    assert (sam.last_seq, other.last_seq) == (1, 0)
+    assert other.search('beef') == [] and other.remove('m1') is None
+
+
+def test_counters_are_shared_between_connections(tmp_path):
+    first = SQLiteState(tmp_path / 'state.db').counter_store()
+    second = SQLiteState(tmp_path / 'state.db').counter_store()
+    assert first.incr('sam/beef') == 1
+    assert second.incr('sam/beef', 2) == 3
+    second.set('sam/gg', 10)
+    assert first.incr('sam/gg') == 11
+    assert first.items('sam/') == second.items('sam/') == {'beef': 3, 'gg': 11}
+    assert 'sam/gg' in second and 'sam/missing' not in second
+
+
+def test_counter_increments_from_many_threads_are_not_lost(tmp_path):
+    counters = SQLiteState(tmp_path / 'state.db').counter_store()
+
+    def work():
+        for _ in range(50):
+            counters.incr('beef')
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counters.get('beef') == 200
+
+
+def test_windows_and_uniques_are_shared(tmp_path):
+    now = [1000.0]
+    first, second = SQLiteState(tmp_path / 'state.db'), SQLiteState(tmp_path / 'state.db')
+    windows = first.windowed_counters()
+    windows.clock = lambda: now[0]
+    windows.add('sam/beef', at=995)
+    second.windowed_counters().add('sam/beef', at=999)
+    assert windows.counts('sam/beef') == {'10s': 2, '1m': 2, '5m': 2, '1h': 2}
+    windows.remove('sam/beef', 995)
+    assert windows.counts('sam/beef')['1m'] == 1
+    first.unique_counters().add('sam/beef', 1)
+    second.unique_counters().add('sam/beef', 2)
+    second.unique_counters().add('sam/beef', 2)
+    assert first.unique_counters().count('sam/beef') == 2
+
+
+def test_snapshots_round_trip(state):
+    assert state.load_snapshot('stats/sam') == (None, None)
+    state.save_snapshot('stats/sam', {'messages': 3})
+    data, updated_at = state.load_snapshot('stats/sam')
+    assert data == {'messages': 3} and updated_at <= time.time()
+
+
+def test_leadership_passes_to_a_waiting_process(tmp_path):
+    elected = []
+    first = IngestLeader(tmp_path / 'ingest.lock', lambda: elected.append('first'), retry_interval=0.02)
+    second = IngestLeader(tmp_path / 'ingest.lock', lambda: elected.append('second'), retry_interval=0.02)
+    assert first.start()
+    assert not second.start()
+    time.sleep(0.1)
+    assert (first.is_leader, second.is_leader, elected) == (True, False, ['first'])
+    first.close()
+    deadline = time.monotonic() + 5
+    while not second.is_leader and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert second.is_leader and not first.is_leader
+    assert elected == ['first', 'second']
+    second.close()
@@ -0,0 +1,123 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from sketches import CountMinSketch, HyperLogLog, LRUCache, SpaceSaving, UniqueCounters
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize('distinct', [10, 1000, 20000, 200000])
+def test_hyperloglog_is_within_its_error_bound(distinct):
+    sketch = HyperLogLog()
+    for i in range(distinct):
+        sketch.add(f"user{i}")
+        sketch.add(f"user{i}")  # Repeats don't count
+    # Standard error at precision 12 is 1.6%; allow three of them
+    assert abs(sketch.count() - distinct) <= max(1, 0.05 * distinct)
+
+
+def test_hyperloglog_is_deterministic_across_instances():
+    a, b = HyperLogLog(), HyperLogLog()
+    for i in range(500):
+        a.add(i)
+        b.add(str(i))  # Items are hashed by their str()
+    assert a.registers == b.registers
+
+
+def test_unique_counters_per_name_and_prefix():
+    uniques = UniqueCounters()
+    for user in range(50):
+        uniques.add('sam/beef', user)
+        uniques.add('sam/beef', user)
+    for user in range(5):
+        uniques.add('sam/gg', user)
+        uniques.add('other/gg', user)
+    assert uniques.count('sam/beef') == 50
+    assert uniques.count('missing') == 0
+    assert uniques.items('sam/') == {'beef': 50, 'gg': 5}
+    uniques.clear()
+    assert uniques.items() == {}
+
+
+def test_lru_cache_expires_entries_after_ttl():
+    clock = Clock()
+    cache = LRUCache(10, ttl=30, clock=clock)
+    assert cache.add('alice')
+    assert not cache.add('alice')
+    clock.now = 29.9
+    assert 'alice' in cache
+    clock.now = 30
+    assert 'alice' not in cache
+    assert cache.add('alice')
+
+
+def test_lru_cache_evicts_the_oldest_write_when_full():
+    cache = LRUCache(3)
+    for key in 'abcd':
+        cache.set(key, key.upper())
+    assert 'a' not in cache
+    assert [cache.get(key) for key in 'bcd'] == ['B', 'C', 'D']
+    assert cache.evictions == 1
+    assert len(cache) == 3
+
+
+def zipf_stream(keys, length, seed=1):
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, keys + 1)]
+    return rng.choices([f"user{i}" for i in range(keys)], weights, k=length)
+
+
+@pytest.mark.parametrize('amounts', [False, True])
+def test_space_saving_bounds_every_count(amounts):
+    rng = random.Random(2)
+    sketch, exact = SpaceSaving(100), Counter()
+    for key in zipf_stream(5000, 50000):
+        amount = rng.randint(1, 3) if amounts else 1
+        sketch.add(key, amount)
+        exact[key] += amount
+    assert sketch.total == sum(exact.values())
+    assert len(sketch) == 100
+    for key, count, error in sketch.top(100):
+        assert count - error <= exact[key] <= count
+    # Every key more frequent than total / capacity is tracked
+    tracked = {key for key, _, _ in sketch.top(100)}
+    assert {key for key, count in exact.items() if count > sketch.total / 100} <= tracked
+
+
+def test_space_saving_finds_the_exact_top_k_of_a_skewed_stream():
+    sketch, exact = SpaceSaving(200), Counter()
+    for key in zipf_stream(10000, 100000, seed=3):
+        sketch.add(key)
+        exact[key] += 1
+    assert [key for key, _, _ in sketch.top(10)] == [key for key, _ in exact.most_common(10)]
+
+
+def test_space_saving_is_exact_below_capacity():
+    sketch = SpaceSaving(10)
+    for key in 'aaabbc':
+        sketch.add(key)
+    assert sketch.top(2) == [('a', 3, 0), ('b', 2, 0)]
+    sketch.clear()
+    assert sketch.top() == [] and sketch.total == 0
+
+
+def test_count_min_never_undercounts_and_stays_within_its_bound():
+    sketch, exact = CountMinSketch(), Counter()
+    for key in zipf_stream(20000, 100000, seed=4):
+        sketch.add(key)
+        exact[key] += 1
+    bound = sketch.total * math.e / sketch.width
+    overs = [sketch.count(key) - count for key, count in exact.items()]
+    assert min(overs) >= 0
+    # The bound holds with 98% probability per key
+    assert sum(over > bound for over in overs) <= 0.02 * len(overs)
+    assert sketch.count('never seen') <= bound
@@ -0,0 +1,111 @@
+import random
+
+import pytest
+
+from benchmarks.bench_triggers import make_messages, make_rules, naive_matcher
+from triggers import TriggerEngine, TriggerRule
+
+
+def naive(rules, room=None):
+    """The per-rule loop from the benchmark, plus the room limits it leaves out"""
+    match = naive_matcher(rules)
+    rooms = {r['name']: set(r['rooms']) for r in rules if r.get('rooms')}
+
+    def match_in_room(message):
+        return {name for name in match(message) if name not in rooms or room in rooms[name]}
+    return match_in_room
+
+
+def assert_agrees(rules, messages, room=None):
+    engine = TriggerEngine(rules)
+    reference = naive(rules, room)
+    for message in messages:
+        assert engine.match(message, room) == reference(message), message
+
+
+def keyword(name, pattern=None, **kwargs):
+    return {'name': name, 'type': 'keyword', 'pattern': pattern or name, **kwargs}
+
+
+def command(name, pattern=None, **kwargs):
+    return {'name': name, 'type': 'command', 'pattern': pattern or name, **kwargs}
+
+
+def regex(name, pattern, **kwargs):
+    return {'name': name, 'type': 'regex', 'pattern': pattern, **kwargs}
+
+
+def test_keywords_sharing_prefixes_all_fire():
+    rules = [keyword('kek'), keyword('kekw'), keyword('kek w', 'kek w'), keyword('pog'), keyword('pogchamp')]
+    engine = TriggerEngine(rules)
+    assert engine.match("lol kekw") == {'kekw'}
+    assert engine.match("kek w") == {'kek', 'kek w'}
+    assert engine.match("pogchamp pog") == {'pog', 'pogchamp'}
+    assert engine.match("pogchampion") == set()
+    assert_agrees(rules, ["kek", "kekw", "kek w", "kekwait", "kek-w", "pog.pogchamp", "kekkek", "a kek w kekw"])
+
+
+def test_commands_sharing_prefixes_all_fire():
+    rules = [command('bee'), command('beef'), command('beefy')]
+    engine = TriggerEngine(rules)
+    assert engine.match("$beefy") == {'bee', 'beef', 'beefy'}
+    assert engine.match("$ bee") == {'bee'}
+    assert engine.match("beef") == set()
+    assert_agrees(rules, ["$beef", "$ BEEF pls", "  $bee", "beefy", "$be ef", "x $beef"])
+
+
+def test_keywords_match_whole_words_commands_match_substrings():
+    rules = [keyword('kekw'), command('beef')]
+    engine = TriggerEngine(rules)
+    assert engine.match("KEKWait") == set()
+    assert engine.match("(KEKW)") == {'kekw'}
+    assert engine.match("$roastbeefs") == {'beef'}
+    assert_agrees(rules, ["KEKWait", "xkekw", "kekw_", "kekw!", "$roastbeefs", "$beef kekw"])
+
+
+def test_matching_folds_case():
+    rules = [keyword('kekw', 'KEKW'), command('beef', 'Beef'), regex('gg', r'g+g')]
+    engine = TriggerEngine(rules)
+    assert engine.match("$BEEF Kekw GGG") == {'beef', 'kekw', 'gg'}
+    assert_agrees(rules, ["$BEEF Kekw GGG", "kEkW", "$bEeF", "Gg", "nothing"])
+
+
+def test_room_limited_rules():
+    rules = [keyword('kekw', rooms=['sam']), command('beef', rooms=['sam', 'ice']), keyword('pog')]
+    engine = TriggerEngine(rules)
+    assert engine.match("$beef kekw pog", 'sam') == {'beef', 'kekw', 'pog'}
+    assert engine.match("$beef kekw pog", 'ice') == {'beef', 'pog'}
+    assert engine.match("$beef kekw pog") == {'pog'}
+    for room in ('sam', 'ice', 'other', None):
+        assert_agrees(rules, ["$beef kekw pog", "kekw", "$beef"], room)
+
+
+def test_regexes_that_cannot_share_the_alternation():
+    rules = [
+        regex('repeat', r'(\w)\1{3}'),       # Capturing group with a backreference
+        regex('flagged', r'(?i)ratio'),      # Global flag only allowed at the start
+        regex('digits', r'\bw+\d+'),
+    ]
+    engine = TriggerEngine(rules)
+    assert [TriggerRule(**r).combinable for r in rules] == [False, False, True]
+    assert engine.match("aaaa") == {'repeat'}
+    assert engine.match("RATIO www99") == {'flagged', 'digits'}
+    assert_agrees(rules, ["aaaa", "abab", "RATIO", "www99", "w1 zzzz ratio", "nothing here"])
+
+
+@pytest.mark.parametrize('count', [1, 10, 100, 300])
+def test_agrees_with_the_per_rule_loop(count):
+    rng = random.Random(count)
+    rules = make_rules(count, rng)
+    assert_agrees(rules, make_messages(2000, rules, rng))
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError, match="unknown type"):
+        TriggerRule('x', 'emote', 'kekw')
+    with pytest.raises(ValueError, match="empty pattern"):
+        TriggerRule('x', 'keyword', '')
+    with pytest.raises(ValueError, match="invalid regex"):
+        TriggerRule('x', 'regex', '(')
+    with pytest.raises(ValueError, match="unique"):
+        TriggerEngine([keyword('x'), command('x')])
@@ -0,0 +1,68 @@
+import json
+import threading
+import time
+
+
+def chat_body(module, message_id, content='$beef'):
+    return json.dumps({'content': content, 'id': message_id, 'channel': module.CHANNEL_NAME,
+                       'sender': {'username': 'alice', 'user_id': 1}})
+
+
+def post(client, body, event_id=None):
+    headers = {'Kick-Event-Message-Id': event_id} if event_id else {}
+    return client.post('/webhook', data=body, headers=headers)
+
+
+def test_redelivered_event_is_acknowledged_but_processed_once(webhook_server):
+    module = webhook_server(KICK_WEBHOOK_INSECURE='1')
+    client = module.app.test_client()
+    body = chat_body(module, 'm1')
+    assert post(client, body, 'e1').get_json()['status'] == 'success'
+    response = post(client, body, 'e1')
+    assert response.status_code == 200 and response.get_json()['status'] == 'duplicate'
+    module.webhook_queue.close()
+    assert module.counters.get(module.BEEF_KEY) == 1
+
+
+def test_same_message_in_two_deliveries_is_counted_once(webhook_server):
+    module = webhook_server(KICK_WEBHOOK_INSECURE='1')
+    client = module.app.test_client()
+    assert post(client, chat_body(module, 'm1'), 'e1').status_code == 200
+    assert post(client, chat_body(module, 'm1'), 'e2').status_code == 200
+    assert post(client, chat_body(module, 'm2'), 'e3').status_code == 200
+    module.webhook_queue.close()
+    assert module.counters.get(module.BEEF_KEY) == 2
+
+
+def test_event_rejected_by_a_full_queue_is_processed_on_retry(webhook_server):
+    module = webhook_server(KICK_WEBHOOK_INSECURE='1', WEBHOOK_WORKERS='1', WEBHOOK_QUEUE_SIZE='1')
+    process = module.webhook_queue.process
+    started, release = threading.Event(), threading.Event()
+
+    def blocked(item):
+        started.set()
+        release.wait(5)
+        process(item)
+
+    module.webhook_queue.process = blocked
+    client = module.app.test_client()
+    assert post(client, chat_body(module, 'm1'), 'e1').status_code == 200
+    assert started.wait(5)
+    assert post(client, chat_body(module, 'm2'), 'e2').status_code == 200
+    assert post(client, chat_body(module, 'm3'), 'e3').status_code == 429
+    assert 'event:e3' not in module.webhook_seen
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while len(module.webhook_queue) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert post(client, chat_body(module, 'm3'), 'e3').get_json()['status'] == 'success'
+    module.webhook_queue.close()
+    assert module.counters.get(module.BEEF_KEY) == 3
+
+
+def test_event_rejected_while_shutting_down_is_not_remembered(webhook_server):
+    module = webhook_server(KICK_WEBHOOK_INSECURE='1')
+    module.webhook_queue.close()
+    assert post(module.app.test_client(), chat_body(module, 'm1'), 'e1').status_code == 503
+    assert 'event:e1' not in module.webhook_seen
@@ -0,0 +1,94 @@
+import pytest
+
+from webhook_events import CHAT_MESSAGE_SENT, EXTRACTORS, WebhookEvent, extract, extractor
+
+BROADCASTER = {'broadcaster': {'username': 'Sam', 'user_id': 7, 'channel_slug': 'sam'}}
+
+
+def test_chat_message():
+    event_type, event = extract({
+        **BROADCASTER,
+        'message_id': 'm1',
+        'sender': {'username': 'alice', 'user_id': 1},
+        'content': '$beef'
+    }, CHAT_MESSAGE_SENT)
+    assert event_type == CHAT_MESSAGE_SENT and event.is_chat
+    assert (event.channel, event.username, event.user_id, event.message_id, event.message) == ('sam', 'alice', 1, 'm1', '$beef')
+
+
+@pytest.mark.parametrize('payload', [
+    {'content': '$beef', 'id': 'm1', 'sender': {'username': 'alice'}, 'chatroom': {'channel': {'slug': 'sam'}}},
+    {'message': '$beef', 'id': 'm1', 'user': {'username': 'alice'}, 'channel': 'sam'},
+    {'event': {'type': CHAT_MESSAGE_SENT, 'data': {'content': '$beef', 'id': 'm1', 'username': 'alice', 'channel': 'sam'}}},
+    {'type': CHAT_MESSAGE_SENT, 'data': {'content': '$beef', 'id': 'm1', 'username': 'alice', 'channel': 'sam'}},
+])
+def test_untyped_and_enveloped_chat(payload):
+    event_type, event = extract(payload)
+    assert event_type == CHAT_MESSAGE_SENT
+    assert (event.channel, event.username, event.message_id, event.message) == ('sam', 'alice', 'm1', '$beef')
+
+
+def test_follow():
+    event_type, event = extract({**BROADCASTER, 'follower': {'username': 'bob', 'user_id': 2}}, 'channel.followed')
+    assert (event.channel, event.username, event.user_id, event.message) == ('sam', 'bob', 2, 'followed')
+    assert not event.is_chat
+
+
+@pytest.mark.parametrize('event_type', ['channel.subscription.new', 'channel.subscription.renewal'])
+def test_subscription(event_type):
+    _, event = extract({**BROADCASTER, 'subscriber': {'username': 'carol', 'user_id': 3}, 'duration': 3}, event_type)
+    assert (event.event_type, event.username, event.user_id, event.message) == (event_type, 'carol', 3, 'subscribed (3 months)')
+    _, event = extract({**BROADCASTER, 'subscriber': {'username': 'carol'}}, event_type)
+    assert event.message == 'subscribed'
+
+
+def test_gifted_subscriptions():
+    _, event = extract({**BROADCASTER, 'gifter': {'username': 'dave', 'user_id': 4},
+                        'giftees': [{'username': 'a'}, {'username': 'b'}]}, 'channel.subscription.gifts')
+    assert (event.username, event.user_id, event.message) == ('dave', 4, 'gifted 2 subscriptions')
+    # Anonymous gifts come with a null gifter
+    _, event = extract({**BROADCASTER, 'gifter': None, 'giftees': None}, 'channel.subscription.gifts')
+    assert (event.username, event.message) == ('Anonymous', 'gifted 0 subscriptions')
+
+
+def test_header_type_wins_over_the_payload():
+    event_type, event = extract({'type': CHAT_MESSAGE_SENT, 'data': {'follower': {'username': 'bob'}}}, 'channel.followed')
+    assert event_type == 'channel.followed' and event.message == 'followed'
+
+
+def test_unknown_types_are_left_to_the_caller():
+    assert extract({'something': 1}, 'livestream.status.updated') == ('livestream.status.updated', None)
+    assert extract({'something': 1}) == ('unknown', None)
+
+
+def test_missing_or_malformed_fields_fall_back():
+    _, event = extract({'content': 'hi', 'sender': 'not a dict', 'channel': {'slug': 'x'}})
+    assert (event.channel, event.username, event.user_id, event.message_id) == ('unknown', 'Unknown', None, None)
+
+
+def test_registering_an_extractor(monkeypatch):
+    monkeypatch.setattr('webhook_events.EXTRACTORS', dict(EXTRACTORS))
+
+    @extractor('kicks.gifted')
+    def kicks(event_type, data):
+        return WebhookEvent(event_type, 'sam', data['sender']['username'], f"gifted {data['amount']} kicks")
+
+    _, event = extract({'sender': {'username': 'erin'}, 'amount': 5}, 'kicks.gifted')
+    assert event.message == 'gifted 5 kicks'
+
+
+def test_events_do_not_keep_the_payload():
+    payload = {**BROADCASTER, 'content': '$beef', 'emotes': [{'id': 1}] * 100}
+    _, event = extract(payload, CHAT_MESSAGE_SENT)
+    assert not hasattr(event, '__dict__')
+    assert sorted(event.to_dict()) == ['channel', 'event_type', 'message', 'message_id', 'timestamp', 'user_id', 'username']
+
+
+def test_webhook_server_samples_unknown_types(webhook_server):
+    module = webhook_server(KICK_WEBHOOK_INSECURE='1')
+    client = module.app.test_client()
+    for _ in range(3):
+        client.post('/webhook', data=b'{"x": 1}', headers={'Kick-Event-Type': 'livestream.status.updated'})
+    module.webhook_queue.close()
+    assert [sample['event_type'] for sample in module.unknown_events] == ['livestream.status.updated']
+    assert module.all_chat_messages == []
@@ -0,0 +1,92 @@
+import threading
+
+from webhook_queue import WebhookQueue
+
+
+class Blocked:
+    """process() that holds each item until released"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.done = []
+
+    def __call__(self, item):
+        self.started.set()
+        self.release.wait(5)
+        self.done.append(item)
+
+
+def test_full_queue_refuses_without_blocking():
+    process = Blocked()
+    queue = WebhookQueue(process, workers=1, maxsize=2)
+    assert queue.submit(1)
+    assert process.started.wait(5)  # The worker holds 1, the queue has room for 2 more
+    assert queue.submit(2) and queue.submit(3)
+    assert not queue.submit(4)
+    assert queue.rejected == 1
+    assert queue.stats() == {'queued': 2, 'capacity': 2, 'workers': 1, 'rejected': 1}
+    process.release.set()
+    queue.close()
+    assert process.done == [1, 2, 3]
+
+
+def test_close_drains_queued_items_then_refuses():
+    done = []
+    queue = WebhookQueue(done.append, workers=2, maxsize=100)
+    for n in range(50):
+        assert queue.submit(n)
+    queue.close()
+    assert sorted(done) == list(range(50))
+    assert not queue.accepting
+    assert not queue.submit(50)
+    assert queue.rejected == 0  # Refusals after close aren't backpressure
+    queue.close()  # Closing twice is harmless
+
+
+def test_a_failing_item_does_not_stop_the_worker():
+    done = []
+
+    def process(item):
+        if item == 'bad':
+            raise ValueError(item)
+        done.append(item)
+
+    queue = WebhookQueue(process, workers=1)
+    for item in ('bad', 'good'):
+        queue.submit(item)
+    queue.close()
+    assert done == ['good']
+
+
+def test_webhook_endpoint_answers_429_when_the_queue_is_full(webhook_server):
+    module = webhook_server(KICK_WEBHOOK_INSECURE='1', WEBHOOK_WORKERS='1', WEBHOOK_QUEUE_SIZE='1')
+    process = module.webhook_queue.process = Blocked()
+    client = module.app.test_client()
+    assert client.post('/webhook', data=b'{}').status_code == 200
+    assert process.started.wait(5)
+    assert client.post('/webhook', data=b'{}').status_code == 200
+
+    response = client.post('/webhook', data=b'{}')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    process.release.set()
+
+
+def test_webhook_endpoint_answers_503_once_closed(webhook_server):
+    module = webhook_server(KICK_WEBHOOK_INSECURE='1')
+    module.webhook_queue.close()
+    response = module.app.test_client().post('/webhook', data=b'{}')
+    assert response.status_code == 503
+    assert response.get_json() == {'error': 'Shutting down'}
+
+
+def test_queued_webhooks_are_processed_before_shutdown(webhook_server):
+    module = webhook_server(KICK_WEBHOOK_INSECURE='1')
+    client = module.app.test_client()
+    for n in range(20):
+        body = f'{{"content": "$beef", "id": "m{n}", "channel": "{module.CHANNEL_NAME}", "sender": {{"username": "u{n}"}}}}'
+        assert client.post('/webhook', data=body).status_code == 200
+    module.webhook_queue.close()
+    assert len(module.webhook_queue) == 0
+    assert module.counters.get(module.BEEF_KEY) == 20
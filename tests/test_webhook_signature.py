@@ -0,0 +1,75 @@
+import hashlib
+import hmac
+
+import pytest
+
+from webhook_signature import MAX_SECRETS, SignatureVerifier
+
+BODY = b'{"message": {"content": "$beef"}}'
+
+
+def sign(secret, body=BODY):
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def test_valid_signature_is_accepted():
+    verifier = SignatureVerifier(['current'])
+    assert verifier.enabled
+    assert verifier.verify(BODY, sign('current'))
+    assert not verifier.verify(BODY + b' ', sign('current'))
+    assert not verifier.verify(BODY, sign('other'))
+
+
+def test_rotated_secrets_are_all_accepted_until_removed():
+    verifier = SignatureVerifier(['new', 'old'])
+    assert verifier.verify(BODY, sign('new'))
+    assert verifier.verify(BODY, sign('old'))
+    verifier.remove_secret('old')
+    assert not verifier.verify(BODY, sign('old'))
+    assert verifier.verify(BODY, sign('new'))
+
+
+@pytest.mark.parametrize('header', [
+    None,
+    '',
+    sign('current')[len('sha256='):],                    # No prefix
+    'sha1=' + sign('current')[len('sha256='):],
+    'sha256=' + 'zz' * 32,                                # Not hex
+    sign('current')[:-2],                                 # Too short
+    sign('current') + '00',                               # Too long
+])
+def test_malformed_headers_are_rejected(header):
+    assert not SignatureVerifier(['current']).verify(BODY, header)
+
+
+def test_no_secrets_verifies_nothing():
+    verifier = SignatureVerifier()
+    assert not verifier.enabled
+    assert not verifier.verify(BODY, sign('anything'))
+
+
+def test_number_of_active_secrets_is_capped():
+    verifier = SignatureVerifier([f"secret{i}" for i in range(MAX_SECRETS)])
+    with pytest.raises(ValueError):
+        verifier.add_secret('one too many')
+    verifier.add_secret('secret0')  # Already active: not an addition
+    verifier.remove_secret('secret0')
+    verifier.add_secret('one too many')
+    assert verifier.verify(BODY, sign('one too many'))
+
+
+def test_webhook_endpoint_refuses_everything_without_a_secret(webhook_server):
+    client = webhook_server().app.test_client()
+    assert client.post('/webhook', data=BODY).status_code == 503
+
+
+def test_webhook_endpoint_accepts_unsigned_requests_only_when_opted_out(webhook_server):
+    client = webhook_server(KICK_WEBHOOK_INSECURE='1').app.test_client()
+    assert client.post('/webhook', data=BODY).status_code == 200
+
+
+def test_webhook_endpoint_checks_signatures(webhook_server):
+    client = webhook_server(KICK_WEBHOOK_SECRET='current').app.test_client()
+    assert client.post('/webhook', data=BODY).status_code == 401
+    assert client.post('/webhook', data=BODY, headers={'X-Kick-Signature-256': sign('other')}).status_code == 401
+    assert client.post('/webhook', data=BODY, headers={'X-Kick-Signature-256': sign('current')}).status_code == 200
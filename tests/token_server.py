@@ -0,0 +1,69 @@
+"""
+Stub Kick OAuth server for tests
+
+Answers POST /oauth/token with a fresh token ("token-1", "token-2", ...)
+after `delay` seconds, 404s any other token path, and serves
+GET /public/v1/<path> which 401s unless the bearer token is the newest one.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TokenServer:
+    def __init__(self, delay=0.0, expires_in=3600):
+        self.delay = delay
+        self.expires_in = expires_in
+        self.token_requests = []  # Paths of every token request, in arrival order
+        self.issued = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with stub._lock:
+                    stub.token_requests.append(self.path)
+                if self.path != '/oauth/token':
+                    return self._reply(404, {'error': 'not found'})
+                time.sleep(stub.delay)
+                with stub._lock:
+                    stub.issued += 1
+                    token = f"token-{stub.issued}"
+                self._reply(200, {'access_token': token, 'expires_in': stub.expires_in})
+
+            def do_GET(self):
+                if self.headers.get('Authorization') != f"Bearer token-{stub.issued}":
+                    return self._reply(401, {'error': 'unauthorized'})
+                self._reply(200, {'path': self.path})
+
+        return Handler
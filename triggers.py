@@ -0,0 +1,227 @@
+"""
+Kick Chat Monitor - Trigger Matching
+Compiles every configured command/keyword/regex trigger into one matcher
+
+Rule types:
+    command   message starts with "$" and contains the word ("$beef", "$ BEEF pls")
+    keyword   word or emote appears anywhere in the message as a whole word
+              ("KEKW" fires on "lol KEKW", not on "KEKWait")
+    regex     custom regular expression, searched case-insensitively
+
+Rules are loaded from the JSON file named by TRIGGERS_FILE, a list like:
+    [{"name": "beef", "type": "command", "pattern": "beef"},
+     {"name": "kekw", "type": "keyword", "pattern": "kekw", "rooms": ["sam"]}]
+
+TRIGGER_COOLDOWN (seconds) stops one user from counting the same trigger
+again until the cooldown has passed.
+"""
+
+import json
+import os
+import re
+
+from sketches import LRUCache
+
+REGEX_FLAGS = re.IGNORECASE | re.DOTALL
+
+COMMAND_PREFIX = '$'
+_WORD_CHAR = re.compile(r'\w')
+RULE_TYPES = ('command', 'keyword', 'regex')
+DEFAULT_RULES = [{'name': 'beef', 'type': 'command', 'pattern': 'beef'}]
+
+
+class TriggerRule:
+    """One named trigger; `rooms` limits it to those room slugs (None = all)"""
+
+    __slots__ = ('name', 'type', 'pattern', 'rooms', 'regex')
+
+    def __init__(self, name, type, pattern, rooms=None):
+        if type not in RULE_TYPES:
+            raise ValueError(f"Trigger {name!r}: unknown type {type!r}, expected one of {', '.join(RULE_TYPES)}")
+        if not pattern:
+            raise ValueError(f"Trigger {name!r}: empty pattern")
+        self.name = name
+        self.type = type
+        self.pattern = pattern if type == 'regex' else pattern.lower()
+        self.rooms = frozenset(rooms) if rooms else None
+        self.regex = None
+        if type == 'regex':
+            try:
+                self.regex = re.compile(pattern, REGEX_FLAGS)
+            except re.error as e:
+                raise ValueError(f"Trigger {name!r}: invalid regex {pattern!r}: {e}") from None
+
+    @property
+    def combinable(self):
+        """
+        Whether this regex can share one alternation with others: no
+        capturing groups (their numbers would shift, breaking backreferences)
+        and no inline global flags (only allowed at the very start)
+        """
+        if self.regex is None or self.regex.groups:
+            return False
+        try:
+            re.compile(f'(?:{self.pattern})', REGEX_FLAGS)
+        except re.error:
+            return False
+        return True
+
+
+def _trie_regex(words):
+    """
+    Regex source matching any of `words`, structured as a trie.
+
+    An alternation of hundreds of literals makes the regex engine try each
+    one at every position; a trie only branches on the next character, so
+    the cost per position depends on the alphabet, not the word count.
+    Longer words are tried first so the longest match wins.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        end = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if end else body
+
+    return build(trie)
+
+
+class TriggerEngine:
+    """
+    Evaluates all rules against a message in a single pass per rule type.
+
+    Command and keyword rules are compiled into trie-shaped patterns, so
+    their cost stays roughly flat as rules are added. Regex rules are each
+    searched on their own, behind one shared alternation that rules most
+    messages out in a single search; each still adds work at every
+    position, so keep them few.
+
+    `match(message, room)` returns the names of the rules that fired (each
+    rule at most once per message).
+    """
+
+    def __init__(self, rules):
+        self.rules = [rule if isinstance(rule, TriggerRule) else TriggerRule(**rule) for rule in rules]
+        names = [rule.name for rule in self.rules]
+        if len(names) != len(set(names)):
+            raise ValueError("Trigger names must be unique")
+        self._room_limited = {rule.name: rule.rooms for rule in self.rules if rule.rooms}
+        self._commands = self._compile_literals([r for r in self.rules if r.type == 'command'])
+        self._keywords = self._compile_literals([r for r in self.rules if r.type == 'keyword'], whole_words=True)
+
+        regex_rules = [r for r in self.rules if r.type == 'regex']
+        # Rules that can share the prefilter are only searched when it matches;
+        # the others are searched for every message
+        self._regex_combined = [(rule.name, rule.regex) for rule in regex_rules if rule.combinable]
+        self._regex_always = [(rule.name, rule.regex) for rule in regex_rules if not rule.combinable]
+        if self._regex_combined:
+            source = '|'.join(f'(?:{rule.pattern})' for rule in regex_rules if rule.combinable)
+            self._regex_prefilter = re.compile(source, REGEX_FLAGS)
+        else:
+            self._regex_prefilter = None
+
+    @staticmethod
+    def _compile_literals(rules, whole_words=False):
+        """
+        Return (pattern, literal -> names of the rules that fire when it matches)
+
+        A match on a literal also fires every literal that prefixes it, which
+        for whole words means prefixes that end where a word does.
+        """
+        if not rules:
+            return None, {}
+        by_literal = {}
+        for rule in rules:
+            by_literal.setdefault(rule.pattern, []).append(rule.name)
+
+        def fires(literal, other):
+            if not literal.startswith(other):
+                return False
+            return not whole_words or len(other) == len(literal) or not _WORD_CHAR.match(literal[len(other)])
+
+        closure = {
+            literal: [name for other, names in by_literal.items() if fires(literal, other) for name in names]
+            for literal in by_literal
+        }
+        if whole_words:
+            pattern = re.compile(rf'(?<!\w)(?=({_trie_regex(by_literal)})(?!\w))', re.DOTALL)
+        else:
+            pattern = re.compile(f'(?=({_trie_regex(by_literal)}))', re.DOTALL)
+        return pattern, closure
+
+    def match(self, message, room=None):
+        """Names of the triggers that fire for `message` in `room`"""
+        text = message.lower()
+        fired = set()
+
+        keywords, keyword_names = self._keywords
+        if keywords is not None:
+            for m in keywords.finditer(text):
+                fired.update(keyword_names[m.group(1)])
+
+        commands, command_names = self._commands
+        if commands is not None and text.lstrip().startswith(COMMAND_PREFIX):
+            for m in commands.finditer(text):
+                fired.update(command_names[m.group(1)])
+
+        if self._regex_prefilter is not None and self._regex_prefilter.search(text):
+            for name, regex in self._regex_combined:
+                if regex.search(text):
+                    fired.add(name)
+        for name, regex in self._regex_always:
+            if regex.search(text):
+                fired.add(name)
+
+        if self._room_limited and fired:
+            fired = {name for name in fired
+                     if name not in self._room_limited or room in self._room_limited[name]}
+        return fired
+
+
+class TriggerCooldowns:
+    """
+    Per-user cooldown on trigger hits.
+
+    A user's repeat hits on a trigger within `seconds` of their last counted
+    one are dropped. At most `max_entries` (room, user, trigger) entries are
+    kept; past that the oldest are forgotten early, so memory stays bounded
+    however many users chat.
+    """
+
+    def __init__(self, seconds=0, max_entries=100000):
+        self.seconds = seconds
+        self._recent = LRUCache(max_entries, ttl=seconds) if seconds > 0 else None
+        self.suppressed = 0
+
+    def filter(self, fired, user, room=None):
+        """The triggers in `fired` that `user` is allowed to count now"""
+        if self._recent is None or user is None or not fired:
+            return fired
+        allowed = {name for name in fired if self._recent.add((room, user, name))}
+        self.suppressed += len(fired) - len(allowed)
+        return allowed
+
+
+def load_trigger_cooldowns():
+    """Cooldowns configured by TRIGGER_COOLDOWN and TRIGGER_COOLDOWN_USERS (off by default)"""
+    return TriggerCooldowns(
+        float(os.environ.get('TRIGGER_COOLDOWN', 0)),
+        int(os.environ.get('TRIGGER_COOLDOWN_USERS', 100000))
+    )
+
+
+def load_trigger_rules(path=None):
+    """Rules from the TRIGGERS_FILE JSON file, or the default $beef command"""
+    path = path or os.environ.get('TRIGGERS_FILE')
+    if not path:
+        return list(DEFAULT_RULES)
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
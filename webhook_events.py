@@ -0,0 +1,133 @@
+"""
+Kick Chat Monitor - Webhook Events
+Kick webhook payloads turned into compact records by per-event-type extractors
+
+Each extractor reads only the fields it needs from the parsed payload and
+returns a WebhookEvent, so nothing keeps a reference to the payload dict.
+Register one for a new event type with:
+
+    @extractor('channel.something')
+    def something(event_type, data):
+        return WebhookEvent(event_type, ...)
+
+Event types without an extractor are left to the caller (see extract()).
+"""
+
+from datetime import datetime
+
+CHAT_MESSAGE_SENT = 'chat.message.sent'
+
+EXTRACTORS = {}  # Kick event type -> extractor(event_type, data) -> WebhookEvent
+
+
+class WebhookEvent:
+    """Compact webhook record; `message` is the chat text or a short description"""
+
+    __slots__ = ('event_type', 'timestamp', 'channel', 'username', 'user_id', 'message_id', 'message')
+
+    def __init__(self, event_type, channel, username, message, user_id=None, message_id=None):
+        self.event_type = event_type
+        self.timestamp = datetime.now().strftime("%H:%M:%S")
+        self.channel = channel
+        self.username = username
+        self.user_id = user_id
+        self.message_id = message_id
+        self.message = message
+
+    @property
+    def is_chat(self):
+        return self.event_type == CHAT_MESSAGE_SENT
+
+    def to_dict(self):
+        return {
+            'timestamp': self.timestamp,
+            'username': self.username,
+            'user_id': self.user_id,
+            'message_id': self.message_id,
+            'message': self.message,
+            'channel': self.channel,
+            'event_type': self.event_type
+        }
+
+
+def extractor(*event_types):
+    """Decorator registering a function as the extractor for `event_types`"""
+    def register(func):
+        for event_type in event_types:
+            EXTRACTORS[event_type] = func
+        return func
+    return register
+
+
+def extract(payload, event_type=None):
+    """
+    (event type, WebhookEvent or None) for one parsed payload
+
+    The type comes from the Kick-Event-Type header when given, else from the
+    payload. Both the official flat body and the older {"event": {"type",
+    "data"}} / {"type", "data"} envelopes are accepted. None means no
+    extractor is registered for the type.
+    """
+    data = payload
+    if isinstance(payload.get('event'), dict) and 'data' in payload['event']:
+        event_type = event_type or payload['event'].get('type')
+        data = payload['event']['data']
+    elif isinstance(payload.get('data'), dict):
+        event_type = event_type or payload.get('type')
+        data = payload['data']
+    if not event_type and ('content' in data or 'message' in data):
+        event_type = CHAT_MESSAGE_SENT  # Untyped chat bodies from older senders
+    event_type = event_type or 'unknown'
+    func = EXTRACTORS.get(event_type)
+    return event_type, (func(event_type, data) if func is not None else None)
+
+
+def _user(data, key):
+    user = data.get(key)
+    return user if isinstance(user, dict) else {}
+
+
+def _channel(data):
+    """Channel slug from whichever field the payload carries it in"""
+    slug = _user(_user(data, 'chatroom'), 'channel').get('slug') or _user(data, 'broadcaster').get('channel_slug')
+    if slug:
+        return slug
+    channel = data.get('channel', 'unknown')
+    return channel if isinstance(channel, str) else 'unknown'
+
+
+@extractor(CHAT_MESSAGE_SENT)
+def chat_message(event_type, data):
+    sender = _user(data, 'sender') or _user(data, 'user')
+    return WebhookEvent(
+        event_type,
+        _channel(data),
+        sender.get('username', data.get('username', 'Unknown')),
+        str(data.get('content', data.get('message', ''))),
+        user_id=sender.get('user_id'),
+        message_id=data.get('message_id', data.get('id'))
+    )
+
+
+@extractor('channel.followed')
+def follow(event_type, data):
+    follower = _user(data, 'follower')
+    return WebhookEvent(event_type, _channel(data), follower.get('username', 'Unknown'), "followed",
+                        user_id=follower.get('user_id'))
+
+
+@extractor('channel.subscription.new', 'channel.subscription.renewal')
+def subscription(event_type, data):
+    subscriber = _user(data, 'subscriber')
+    months = data.get('duration')
+    return WebhookEvent(event_type, _channel(data), subscriber.get('username', 'Unknown'),
+                        f"subscribed ({months} months)" if months else "subscribed",
+                        user_id=subscriber.get('user_id'))
+
+
+@extractor('channel.subscription.gifts')
+def gifted_subscriptions(event_type, data):
+    gifter = _user(data, 'gifter')
+    giftees = data.get('giftees') or []
+    return WebhookEvent(event_type, _channel(data), gifter.get('username', 'Anonymous'),
+                        f"gifted {len(giftees)} subscriptions", user_id=gifter.get('user_id'))
@@ -0,0 +1,97 @@
+"""
+Kick Chat Monitor - Webhook Queue
+Bounded hand-off between the /webhook endpoint and the threads that process payloads
+
+The endpoint only queues the raw request body and answers; a small pool of
+worker threads parses, matches and stores. When the queue is full `submit`
+refuses instead of blocking, so the endpoint can answer 429 right away and
+Kick retries later, rather than every request timing out together.
+"""
+
+import atexit
+import queue
+import threading
+
+from log_config import get_logger
+
+log = get_logger('webhook')
+
+_STOP = object()
+
+
+class WebhookQueue:
+    """Fixed-size queue drained by `workers` threads calling `process(item)`"""
+
+    def __init__(self, process, workers=2, maxsize=10000):
+        self.process = process
+        self.workers = workers
+        self.maxsize = maxsize
+        self.rejected = 0  # Items refused because the queue was full
+        self._queue = queue.Queue(maxsize)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    @property
+    def accepting(self):
+        return not self._closed
+
+    def submit(self, item):
+        """Queue one item without blocking; False if the queue is full or closed"""
+        if self._closed:
+            return False
+        if not self._threads:
+            self._start()
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+    def stats(self):
+        return {
+            'queued': len(self),
+            'capacity': self.maxsize,
+            'workers': self.workers,
+            'rejected': self.rejected
+        }
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"webhook-worker-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            try:
+                self.process(item)
+            except Exception:
+                log.exception("❌ Webhook processing failed")
+
+    def close(self, timeout=5.0):
+        """Stop accepting, let the workers finish what is queued, then stop them"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(timeout)
+        if len(self):
+            log.warning("⚠️ Webhooks still queued at shutdown", extra={'queued': len(self)})
@@ -0,0 +1,57 @@
+"""
+Kick Chat Monitor - Webhook Signatures
+HMAC-SHA256 verification of raw webhook bodies against one or more secrets
+
+Each secret is keyed into an HMAC object once; a request copies that state
+instead of hashing the key again, so a check costs one pass over the body.
+Several secrets can be active at once, so a new one can be rolled out
+before the old one is retired. Malformed or missing signature headers are
+rejected before any hashing.
+"""
+
+import hashlib
+import hmac
+import threading
+
+SIGNATURE_PREFIX = 'sha256='
+MAX_SECRETS = 4  # Every active secret is tried on a bad signature
+
+
+class SignatureVerifier:
+    """Checks "sha256=<hex>" signature headers against every active secret"""
+
+    def __init__(self, secrets=()):
+        self._keys = {}  # secret -> pre-keyed HMAC
+        self._lock = threading.Lock()
+        for secret in secrets:
+            self.add_secret(secret)
+
+    @property
+    def enabled(self):
+        return bool(self._keys)
+
+    def add_secret(self, secret):
+        if secret:
+            with self._lock:
+                if secret not in self._keys and len(self._keys) >= MAX_SECRETS:
+                    raise ValueError(f"At most {MAX_SECRETS} webhook secrets can be active at once")
+                self._keys = {**self._keys, secret: hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256)}
+
+    def remove_secret(self, secret):
+        with self._lock:
+            self._keys = {key: mac for key, mac in self._keys.items() if key != secret}
+
+    def verify(self, body, header):
+        """True if `header` is a valid signature of the raw `body` bytes"""
+        if not header or not header.startswith(SIGNATURE_PREFIX) or len(header) != len(SIGNATURE_PREFIX) + 64:
+            return False
+        try:
+            expected = bytes.fromhex(header[len(SIGNATURE_PREFIX):])
+        except ValueError:
+            return False
+        for keyed in self._keys.values():
+            mac = keyed.copy()
+            mac.update(body)
+            if hmac.compare_digest(mac.digest(), expected):
+                return True
+        return False